@@ -0,0 +1,58 @@
+"""Общие части бенчмарков: запуск uvicorn в отдельном процессе и сводка задержек."""
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def start_server(port: int, **env):
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, **env},
+    )
+
+
+def stop_server(server):
+    server.terminate()
+    server.wait()
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 30, interval: float = 0.2) -> float:
+    """Ждет 200 от /readyz; возвращает секунды ожидания."""
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        try:
+            if (await client.get("/readyz")).status_code == 200:
+                return time.monotonic() - started
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(interval)
+    raise RuntimeError("server did not become ready")
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    """Перцентиль методом ближайшего ранга по отсортированному списку."""
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(latencies_ms: list[float], duration: float, errors: int, sli_ms: float = 300) -> dict:
+    ordered = sorted(latencies_ms)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "rps": round(len(ordered) / duration, 1) if duration else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(ordered, 50), 2),
+            "p95": round(percentile(ordered, 95), 2),
+            "p99": round(percentile(ordered, 99), 2),
+            "max": round(ordered[-1], 2) if ordered else 0.0,
+        },
+        # Доля запросов, уложившихся в SLI времени ответа из задания
+        "within_sli": round(sum(1 for v in ordered if v <= sli_ms) / len(ordered), 4) if ordered else None,
+    }
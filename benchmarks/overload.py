@@ -0,0 +1,98 @@
+"""
+Бенчмарк перегрузки: --heavy клиентов без пауз гоняют массовый /team/sync
+(по 3 команды из 200 участников), а --critical клиентов создают PR каждые 50 мс.
+Замеряются задержки /pullRequest/create и коды ответов. Прогон выполняется дважды:
+без лимитов параллельности (ROUTE_CONCURRENCY и DB_CONCURRENCY заведомо больше
+числа клиентов) и с лимитами по умолчанию из src/limits.py.
+
+Запуск:
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.overload --duration 8
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from src import database, migrations
+
+from . import harness
+
+SYNC_TEAMS = 3
+SYNC_MEMBERS = 200
+
+
+async def heavy(client: httpx.AsyncClient, number: int, stop: float, codes: dict):
+    teams = [
+        {"team_name": f"heavy-{number}-{j}", "members": [
+            {"user_id": f"heavy-{number}-{j}-{i}", "username": f"H{i}", "is_active": True} for i in range(SYNC_MEMBERS)
+        ]}
+        for j in range(SYNC_TEAMS)
+    ]
+    while time.monotonic() < stop:
+        response = await client.post("/team/sync", json={"teams": teams})
+        key = f"team/sync {response.status_code}"
+        codes[key] = codes.get(key, 0) + 1
+
+
+async def critical(client: httpx.AsyncClient, number: int, stop: float, codes: dict, latencies: list):
+    sequence = 0
+    while time.monotonic() < stop:
+        sequence += 1
+        started = time.perf_counter()
+        response = await client.post("/pullRequest/create", json={
+            "pull_request_id": f"overload-{number}-{sequence}-{time.time_ns()}",
+            "pull_request_name": "Overload", "author_id": "core-0",
+        })
+        latencies.append((time.perf_counter() - started) * 1000)
+        key = f"pullRequest/create {response.status_code}"
+        codes[key] = codes.get(key, 0) + 1
+        await asyncio.sleep(0.05)
+
+
+async def run(url: str, heavy_clients: int, critical_clients: int, duration: float) -> dict:
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        await harness.wait_ready(client)
+        await client.post("/team/add", json={"team_name": "core", "members": [
+            {"user_id": f"core-{i}", "username": f"C{i}", "is_active": True} for i in range(10)
+        ]})
+        stop = time.monotonic() + duration
+        codes, latencies = {}, []
+        await asyncio.gather(
+            *(heavy(client, i, stop, codes) for i in range(heavy_clients)),
+            *(critical(client, i, stop, codes, latencies) for i in range(critical_clients)),
+        )
+    errors = sum(n for key, n in codes.items() if key.startswith("pullRequest/create") and not key.endswith("201"))
+    return {"create": harness.summarize(latencies, duration, errors), "codes": dict(sorted(codes.items()))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--heavy", type=int, default=30)
+    parser.add_argument("--critical", type=int, default=3)
+    parser.add_argument("--duration", type=float, default=8)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    unlimited = str(10 * (args.heavy + args.critical))
+    modes = {
+        "no_limits": {"ROUTE_CONCURRENCY": f"/team/sync={unlimited}", "DB_CONCURRENCY": unlimited},
+        "limits": {},
+    }
+    engine = database.get_engine()
+    results = {}
+    for mode, env in modes.items():
+        # Каждый прогон — на пустой базе
+        database.Base.metadata.drop_all(bind=engine)
+        migrations.upgrade(engine)
+        server = harness.start_server(args.port, QUERY_BUDGET_MODE="off", **env)
+        try:
+            results[mode] = asyncio.run(run(f"http://127.0.0.1:{args.port}", args.heavy, args.critical, args.duration))
+        finally:
+            harness.stop_server(server)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
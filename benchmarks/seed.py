@@ -0,0 +1,162 @@
+"""
+Синтетическая организация для бенчмарков: команды, участники, PR в статусах
+OPEN и MERGED с ревьюерами из команды автора. Данные пишутся напрямую в БД
+многострочными INSERT, поэтому 100 000 PR заполняются за секунды.
+
+ВНИМАНИЕ: seed() удаляет все таблицы в DATABASE_URL.
+
+Запуск отдельно:
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.seed --scale large
+"""
+import argparse
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select
+
+from src import database, migrations
+
+# teams, участников в команде, PR
+SCALES = {
+    "small": (20, 10, 10_000),
+    "medium": (200, 10, 50_000),
+    "large": (2_000, 10, 100_000),
+}
+
+CHUNK = 5_000
+
+
+@dataclass
+class Org:
+    members: dict[str, list[str]] = field(default_factory=dict)
+    # Открытые PR: pr_id -> (author_id, [reviewer_id, ...])
+    open_prs: dict[str, tuple[str, list[str]]] = field(default_factory=dict)
+    merged_prs: int = 0
+
+    @property
+    def team_names(self) -> list[str]:
+        return list(self.members)
+
+    @property
+    def user_ids(self) -> list[str]:
+        return [user_id for users in self.members.values() for user_id in users]
+
+
+def _insert_chunked(conn, model, rows: list[dict]):
+    for start in range(0, len(rows), CHUNK):
+        conn.execute(insert(model), rows[start:start + CHUNK])
+
+
+def seed(engine, teams: int, members_per_team: int, prs: int, merged_share: float = 0.5,
+         history_days: int = 90, rng: random.Random | None = None) -> Org:
+    rng = rng or random.Random(42)
+    database.Base.metadata.drop_all(bind=engine)
+    migrations.upgrade(engine)
+
+    org = Org()
+    user_rows = []
+    for t in range(teams):
+        team_name = f"team-{t}"
+        org.members[team_name] = []
+        for m in range(members_per_team):
+            user_id = f"u{t}-{m}"
+            org.members[team_name].append(user_id)
+            user_rows.append({"user_id": user_id, "username": f"User {t}-{m}", "is_active": True, "team_name": team_name})
+
+    now = datetime.utcnow()
+    team_names = org.team_names
+    pr_rows, reviewer_rows = [], []
+    for i in range(prs):
+        team_name = team_names[i % teams]
+        author_id = rng.choice(org.members[team_name])
+        pr_id = f"pr-{i}"
+        created_at = now - timedelta(seconds=rng.uniform(0, history_days * 86400))
+        merged = rng.random() < merged_share
+        pr_status = "MERGED" if merged else "OPEN"
+        candidates = [m for m in org.members[team_name] if m != author_id]
+        reviewers = rng.sample(candidates, min(2, len(candidates)))
+        pr_rows.append({
+            "pull_request_id": pr_id, "pull_request_name": f"PR {i}", "author_id": author_id, "status": pr_status,
+            "created_at": created_at, "merged_at": created_at + timedelta(hours=rng.uniform(1, 72)) if merged else None,
+        })
+        reviewer_rows.extend(
+            {"pull_request_id": pr_id, "user_id": user_id, "status": pr_status,
+             "assigned_at": created_at, "pr_created_at": created_at}
+            for user_id in reviewers
+        )
+        if merged:
+            org.merged_prs += 1
+        else:
+            org.open_prs[pr_id] = (author_id, reviewers)
+
+    with engine.begin() as conn:
+        conn.execute(insert(database.Team), [{"team_name": name} for name in team_names])
+        _insert_chunked(conn, database.User, user_rows)
+        _insert_chunked(conn, database.PullRequest, pr_rows)
+        _insert_chunked(conn, database.PullRequestReviewer, reviewer_rows)
+        # Счетчики статистики заполняются тем же шагом, что и при миграции существующей БД
+        migrations.backfill_assignment_counters(conn)
+    return org
+
+
+def load_org(engine) -> Org:
+    """Org по уже заполненной БД (для повторных прогонов без seed)."""
+    Reviewer = database.PullRequestReviewer
+    org = Org()
+    with engine.connect() as conn:
+        for team_name, user_id in conn.execute(
+            select(database.User.team_name, database.User.user_id)
+            .where(database.User.team_name.is_not(None))
+            .order_by(database.User.team_name, database.User.user_id)
+        ):
+            org.members.setdefault(team_name, []).append(user_id)
+        for pr_id, author_id, user_id in conn.execute(
+            select(database.PullRequest.pull_request_id, database.PullRequest.author_id, Reviewer.user_id)
+            .outerjoin(Reviewer, Reviewer.pull_request_id == database.PullRequest.pull_request_id)
+            .where(database.PullRequest.status == "OPEN")
+        ):
+            reviewers = org.open_prs.setdefault(pr_id, (author_id, []))[1]
+            if user_id is not None:
+                reviewers.append(user_id)
+        org.merged_prs = conn.execute(
+            select(func.count()).where(database.PullRequest.status == "MERGED")
+        ).scalar_one()
+    return org
+
+
+def add_scale_arguments(parser: argparse.ArgumentParser, default: str = "small"):
+    parser.add_argument("--scale", choices=sorted(SCALES), default=default,
+                        help="пресет: " + ", ".join(f"{k}={v[0]} команд/{v[2]} PR" for k, v in SCALES.items()))
+    parser.add_argument("--teams", type=int, help="переопределяет число команд из пресета")
+    parser.add_argument("--members", type=int, help="переопределяет число участников в команде")
+    parser.add_argument("--prs", type=int, help="переопределяет число PR")
+    parser.add_argument("--merged-share", type=float, default=0.5, help="доля замерженных PR")
+
+
+def scale_from_args(args) -> tuple[int, int, int]:
+    teams, members, prs = SCALES[args.scale]
+    return args.teams or teams, args.members or members, args.prs if args.prs is not None else prs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+    teams, members, prs = scale_from_args(args)
+
+    started = time.perf_counter()
+    org = seed(database.engine, teams, members, prs, args.merged_share)
+    print(json.dumps({
+        "teams": teams,
+        "users": teams * members,
+        "open_prs": len(org.open_prs),
+        "merged_prs": org.merged_prs,
+        "seed_s": round(time.perf_counter() - started, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
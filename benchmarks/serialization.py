@@ -0,0 +1,140 @@
+"""
+Микробенчмарк сериализации ответов, без БД и HTTP: прежний путь (модели
+schemas в обработчике, затем валидация response_model и dump_json в FastAPI)
+против src/serializers.py (dict из строк + orjson). Для каждого ответа сначала
+проверяется, что оба пути дают одинаковые байты.
+
+Запуск:
+    python -m benchmarks.serialization --size 1000 --repeat 200
+"""
+import argparse
+import json
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from fastapi.routing import APIRoute
+
+from src import crud, schemas, serializers
+from src.cache import MemberSnapshot, TeamSnapshot
+from src.main import app
+from src.memory_store import PullRequestRecord, UserStatsRow
+
+ReviewRow = namedtuple("ReviewRow", ("pull_request_id", "pull_request_name", "author_id", "status"))
+
+
+def make_data(size: int) -> dict:
+    started = datetime(2024, 1, 1)
+    prs = [
+        PullRequestRecord(
+            pull_request_id=f"pr-{i}", pull_request_name=f"Feature {i}", author_id=f"u{i % 50}",
+            status="MERGED" if i % 2 else "OPEN", reviewers=(f"u{(i + 1) % 50}", f"u{(i + 2) % 50}"),
+            created_at=started + timedelta(seconds=i, microseconds=i),
+            merged_at=started + timedelta(hours=1, seconds=i) if i % 2 else None,
+        )
+        for i in range(size)
+    ]
+    return {
+        "team": TeamSnapshot("backend", tuple(MemberSnapshot(f"u{i}", f"User {i}", i % 7 != 0) for i in range(size))),
+        "reviews": [ReviewRow(pr.pull_request_id, pr.pull_request_name, pr.author_id, pr.status) for pr in prs],
+        "prs": prs,
+        "stats": [UserStatsRow(f"u{i}", "backend", *([i] * len(crud.COUNTER_FIELDS))) for i in range(size)],
+    }
+
+
+# --- Прежний путь: модели schemas, как их строили обработчики ---
+
+def schema_pr(row) -> schemas.PullRequest:
+    return schemas.PullRequest(
+        pull_request_id=row.pull_request_id,
+        pull_request_name=row.pull_request_name,
+        author_id=row.author_id,
+        status=row.status,
+        assigned_reviewers=row.reviewer_ids,
+        createdAt=row.created_at,
+        mergedAt=row.merged_at,
+    )
+
+
+CASES = {
+    # эндпоинт: (прежний результат обработчика, словарь для ORJSONResponse)
+    "/team/get": (
+        lambda d: schemas.Team.from_orm(d["team"]),
+        lambda d: serializers.team(d["team"]),
+    ),
+    "/users/getReview": (
+        lambda d: schemas.UserReviewResponse(user_id="u1", next_cursor="abc", pull_requests=[
+            schemas.PullRequestShort(pull_request_id=r.pull_request_id, pull_request_name=r.pull_request_name,
+                                     author_id=r.author_id, status=r.status)
+            for r in d["reviews"]
+        ]),
+        lambda d: {"user_id": "u1", "pull_requests": [serializers.pull_request_short(r) for r in d["reviews"]],
+                   "next_cursor": "abc"},
+    ),
+    "/pullRequest/mergeBatch": (
+        lambda d: schemas.PullRequestBatchResponse(results=[
+            schemas.PullRequestBatchResult(pull_request_id=pr.pull_request_id, pr=schema_pr(pr)) for pr in d["prs"]
+        ]),
+        lambda d: {"results": [serializers.batch_result(pr.pull_request_id, pr) for pr in d["prs"]]},
+    ),
+    "/stats/assignments": (
+        lambda d: schemas.AssignmentStatsResponse(
+            team_name="backend", users=[schemas.UserAssignmentStats.from_orm(row) for row in d["stats"]],
+        ),
+        lambda d: {"team_name": "backend", "date_from": None, "date_to": None,
+                   "users": [serializers.user_stats(row) for row in d["stats"]]},
+    ),
+}
+
+
+def response_fields() -> dict:
+    return {route.path: route.response_field for route in app.routes if isinstance(route, APIRoute)}
+
+
+def schema_path(field, build, data) -> bytes:
+    # То же, что fastapi.routing.serialize_response(dump_json=True)
+    value, errors = field.validate(build(data), {}, loc=("response",))
+    assert not errors, errors
+    return field.serialize_json(value, by_alias=True)
+
+
+def fast_path(build, data) -> bytes:
+    return serializers.ORJSONResponse(build(data)).body
+
+
+def timed(fn, repeat: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1000, help="участников команды / строк в списках")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    data = make_data(args.size)
+    fields = response_fields()
+    report = {}
+    for path, (old, new) in CASES.items():
+        field = fields[path]
+        old_body = schema_path(field, old, data)
+        new_body = fast_path(new, data)
+        if old_body != new_body:
+            raise SystemExit(f"{path}: serializers output differs from schemas")
+        old_s = timed(lambda: schema_path(field, old, data), args.repeat)
+        new_s = timed(lambda: fast_path(new, data), args.repeat)
+        report[path] = {
+            "bytes": len(new_body),
+            "schemas_ms": round(old_s * 1000, 3),
+            "serializers_ms": round(new_s * 1000, 3),
+            "speedup": round(old_s / new_s, 1),
+        }
+    print(json.dumps({"size": args.size, "repeat": args.repeat, "results": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Потоковые /export и /import на большом объеме: заполняет исходную базу
+(benchmarks/seed.py), выгружает ее через /export в файл, затем загружает файл
+через /import в пустую базу --target-url. Во время каждого шага раз в 0.1 с
+снимается RSS процесса uvicorn (/proc/<pid>/status, только Linux); в отчете
+время, строки в секунду и прирост RSS относительно состояния до запроса.
+
+ВНИМАНИЕ: таблицы в DATABASE_URL и --target-url пересоздаются.
+
+Запуск:
+    DATABASE_URL=sqlite:///source.db python -m benchmarks.transfer --target-url sqlite:///target.db --prs 1000000
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+import httpx
+from sqlalchemy import create_engine
+
+from src import database, migrations
+
+from . import harness
+from .seed import add_scale_arguments, scale_from_args, seed
+
+READ_CHUNK = 64 * 1024
+
+
+def rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class RssSampler(threading.Thread):
+    def __init__(self, pid: int, interval: float = 0.1):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.baseline = rss_mb(pid)
+        self.peak = self.baseline
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.peak = max(self.peak, rss_mb(self.pid))
+
+    def stop(self) -> dict:
+        self._stopped.set()
+        self.join()
+        return {"baseline_mb": round(self.baseline, 1), "peak_mb": round(self.peak, 1),
+                "growth_mb": round(self.peak - self.baseline, 1)}
+
+
+def run_step(port: int, env: dict, request) -> dict:
+    server = harness.start_server(port, **env)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=None) as client:
+            deadline = time.monotonic() + 60
+            while time.monotonic() < deadline:
+                try:
+                    if client.get("/readyz").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.1)
+            sampler = RssSampler(server.pid)
+            sampler.start()
+            started = time.perf_counter()
+            result = request(client)
+            elapsed = time.perf_counter() - started
+            return {"seconds": round(elapsed, 2), **result, "server_rss": sampler.stop()}
+    finally:
+        harness.stop_server(server)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_scale_arguments(parser)
+    parser.add_argument("--target-url", required=True, help="пустая база для /import")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--file", help="куда сохранить выгрузку (по умолчанию временный файл)")
+    args = parser.parse_args()
+    teams, members, prs = scale_from_args(args)
+
+    started = time.perf_counter()
+    seed(database.engine, teams, members, prs, args.merged_share)
+    seed_s = round(time.perf_counter() - started, 2)
+    target = create_engine(args.target_url)
+    database.Base.metadata.drop_all(bind=target)
+    migrations.upgrade(target)
+    target.dispose()
+
+    path = args.file or os.path.join(tempfile.gettempdir(), "avito-export.ndjson")
+
+    def export(client):
+        lines = 0
+        with open(path, "wb") as f, client.stream("GET", "/export") as response:
+            response.raise_for_status()
+            for chunk in response.iter_bytes():
+                f.write(chunk)
+                lines += chunk.count(b"\n")
+        return {"rows": lines, "bytes": os.path.getsize(path)}
+
+    def import_(client):
+        def body():
+            with open(path, "rb") as f:
+                while chunk := f.read(READ_CHUNK):
+                    yield chunk
+        response = client.post("/import", content=body())
+        response.raise_for_status()
+        return {"rows": sum(response.json()["imported"].values())}
+
+    exported = run_step(args.port, {}, export)
+    imported = run_step(args.port, {"DATABASE_URL": args.target_url, "DATABASE_PUBLIC_URL": ""}, import_)
+    for step in (exported, imported):
+        step["rows_per_s"] = round(step["rows"] / step["seconds"]) if step["seconds"] else None
+    print(json.dumps({
+        "database": database.engine.dialect.name,
+        "prs": prs,
+        "seed_s": seed_s,
+        "export": exported,
+        "import": imported,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+from datetime import date
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from . import cache, crud, database, schemas, storage
+
+# --- Асинхронные версии функций crud ---
+# Запросы описаны один раз в crud.py. С AsyncSession они выполняются через
+# run_sync поверх asyncpg без блокировки event loop, с обычной Session
+# (DB_ASYNC=false) — в пуле потоков, как раньше выполнялись sync-эндпоинты.
+# Возвращаемые объекты загружены полностью: ленивые загрузки после выхода
+# из run_sync невозможны. При STORAGE_BACKEND=memory вместо сессии приходит
+# MemoryStore, и вызывается его одноименный метод: имена и параметры функций
+# crud и методов хранилища сверяются с storage.Storage при импорте.
+
+async def run(db, fn, *args, **kwargs):
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    if isinstance(db, storage.Storage):
+        # Методы хранилища берут блокировки (изменений, PR, команд) и могут ждать
+        # снимок или запись WAL, поэтому тоже выполняются в пуле потоков
+        return await run_in_threadpool(getattr(db, fn.__name__), *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+# --- Team ---
+
+async def get_team_by_name(db, team_name: str):
+    return await run(db, crud.get_team_by_name, team_name)
+
+async def create_team_with_members(db, team_data: schemas.TeamAddRequest):
+    return await run(db, crud.create_team_with_members, team_data)
+
+async def add_team_members(db, db_team: cache.TeamSnapshot, members: list[schemas.TeamMember]):
+    return await run(db, crud.add_team_members, db_team, members)
+
+async def sync_teams(db, teams: list[schemas.TeamAddRequest]):
+    return await run(db, crud.sync_teams, teams)
+
+# --- User ---
+
+async def get_user_by_id(db, user_id: str):
+    return await run(db, crud.get_user_by_id, user_id)
+
+async def choose_reviewers(db, team_name: str, exclude: set[str], k: int = 2):
+    return await run(db, crud.choose_reviewers, team_name, exclude, k)
+
+async def set_user_active(db, user_id: str, is_active: bool):
+    return await run(db, crud.set_user_active, user_id, is_active)
+
+# --- PullRequest ---
+
+async def get_pr_by_id(db, pr_id: str):
+    return await run(db, crud.get_pr_by_id, pr_id)
+
+async def create_pr(db, pr_data: schemas.PullRequestCreateRequest, reviewer_ids: list[str]):
+    return await run(db, crud.create_pr, pr_data, reviewer_ids)
+
+async def create_prs_batch(db, items: list[schemas.PullRequestCreateRequest]):
+    return await run(db, crud.create_prs_batch, items)
+
+async def merge_pr(db, pr_id: str):
+    return await run(db, crud.merge_pr, pr_id)
+
+async def merge_prs_batch(db, pr_ids: list[str]):
+    return await run(db, crud.merge_prs_batch, pr_ids)
+
+async def replace_reviewer(db, db_pr: database.PullRequest, old_user_id: str, new_user_id: str):
+    return await run(db, crud.replace_reviewer, db_pr, old_user_id, new_user_id)
+
+async def get_reviews_for_user(db, user_id: str, status: str | None, limit: int, after):
+    return await run(db, crud.get_reviews_for_user, user_id, status, limit, after)
+
+# --- Статистика ---
+
+async def get_assignment_stats(db, team_name: str | None, date_from: date | None, date_to: date | None):
+    return await run(db, crud.get_assignment_stats, team_name, date_from, date_to)
+
+async def get_team_stats(db, team_name: str | None, date_from: date | None, date_to: date | None):
+    return await run(db, crud.get_team_stats, team_name, date_from, date_to)
+
+# --- Журнал событий PR ---
+
+async def get_pr_events(db, pr_id: str):
+    return await run(db, crud.get_pr_events, pr_id)
+
+async def get_time_to_merge(db, team_name: str | None, date_from: date | None, date_to: date | None):
+    return await run(db, crud.get_time_to_merge, team_name, date_from, date_to)
+
+async def get_reassignment_rates(db, team_name: str | None, date_from: date | None, date_to: date | None):
+    return await run(db, crud.get_reassignment_rates, team_name, date_from, date_to)
+
+# --- Массовая деактивация ---
+
+async def deactivate_and_reassign(db, team: cache.TeamSnapshot, user_ids: list[str]):
+    return await run(db, crud.deactivate_and_reassign, team, user_ids)
+
+# --- Фоновые задания ---
+
+async def enqueue_deactivation(db, team: cache.TeamSnapshot, user_ids: list[str]):
+    return await run(db, crud.enqueue_deactivation, team, user_ids)
+
+async def get_job(db, job_id: str):
+    return await run(db, crud.get_job, job_id)
+
+# --- Импорт ---
+
+async def import_rows(db, table_name: str, rows: list[dict]):
+    return await run(db, crud.import_rows, table_name, rows)
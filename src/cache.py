@@ -0,0 +1,220 @@
+import json
+import logging
+import os
+import re
+import select
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# --- Кэш команд и пользователей ---
+# Read-through кэш неизменяемых снимков в памяти процесса с TTL и LRU-вытеснением.
+# Сбрасывается путями записи в crud после коммита. На PostgreSQL изменения по
+# умолчанию рассылаются через NOTIFY в канал CACHE_NOTIFY_CHANNEL, и остальные
+# воркеры uvicorn сбрасывают у себя те же записи; пустое значение отключает рассылку.
+
+CACHE_TTL = float(os.getenv("CACHE_TTL", "30"))
+CACHE_MAXSIZE = int(os.getenv("CACHE_MAXSIZE", "1024"))
+CACHE_NOTIFY_CHANNEL = os.getenv("CACHE_NOTIFY_CHANNEL", "avito_cache")
+
+# Ограничение PostgreSQL на размер payload у NOTIFY — 8000 байт
+_NOTIFY_PAYLOAD_LIMIT = 7900
+
+
+@dataclass(frozen=True, slots=True)
+class MemberSnapshot:
+    user_id: str
+    username: str
+    is_active: bool
+
+
+@dataclass(frozen=True, slots=True)
+class TeamSnapshot:
+    team_name: str
+    members: tuple[MemberSnapshot, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class UserSnapshot:
+    user_id: str
+    username: str
+    team_name: str | None
+    is_active: bool
+
+
+class LRUCache:
+    def __init__(self, maxsize: int = CACHE_MAXSIZE, ttl: float = CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Увеличивается при каждой инвалидации: снимок, прочитанный до неё, не попадет в кэш
+        self.generation = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, generation: int | None = None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            self.generation += 1
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+teams = LRUCache()
+users = LRUCache()
+
+
+def team_snapshot(db_team) -> TeamSnapshot:
+    return TeamSnapshot(
+        team_name=db_team.team_name,
+        members=tuple(MemberSnapshot(m.user_id, m.username, bool(m.is_active)) for m in db_team.members),
+    )
+
+
+def user_snapshot(db_user) -> UserSnapshot:
+    return UserSnapshot(db_user.user_id, db_user.username, db_user.team_name, bool(db_user.is_active))
+
+
+def stats() -> dict:
+    return {"teams": teams.stats(), "users": users.stats()}
+
+
+# --- Инвалидация ---
+
+_remote_subscribers = []
+
+
+def on_remote_invalidation(callback):
+    """
+    callback(team_names, user_ids) вызывается для инвалидаций, пришедших от других
+    воркеров через NOTIFY; (None, None) означает "сбросить всё".
+    """
+    _remote_subscribers.append(callback)
+
+
+def invalidate(team_names=(), user_ids=()):
+    for team_name in team_names:
+        teams.pop(team_name)
+    for user_id in user_ids:
+        users.pop(user_id)
+
+
+def _invalidate_remote(team_names, user_ids):
+    if team_names is None:
+        teams.clear()
+        users.clear()
+    else:
+        invalidate(team_names, user_ids)
+    for callback in _remote_subscribers:
+        callback(team_names, user_ids)
+
+
+def publish(db: Session, team_names=(), user_ids=()):
+    """
+    Рассылает инвалидацию остальным воркерам. Вызывается внутри транзакции записи:
+    PostgreSQL доставляет NOTIFY только после коммита.
+    """
+    if not CACHE_NOTIFY_CHANNEL or db.get_bind().dialect.name != "postgresql":
+        return
+    payload = json.dumps({"teams": sorted(set(team_names)), "users": sorted(set(user_ids))})
+    if len(payload) > _NOTIFY_PAYLOAD_LIMIT:
+        payload = json.dumps({"all": True})
+    # Служебный запрос: в бюджет эндпоинта (metrics.query_budget) не входит
+    db.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": CACHE_NOTIFY_CHANNEL, "payload": payload},
+        execution_options={"query_budget_exempt": True},
+    )
+
+
+def _apply_notification(payload: str):
+    message = json.loads(payload)
+    if message.get("all"):
+        _invalidate_remote(None, None)
+    else:
+        _invalidate_remote(message.get("teams", []), message.get("users", []))
+
+
+class NotifyListener(threading.Thread):
+    """Слушает LISTEN-канал на отдельном соединении psycopg2 и сбрасывает локальный кэш."""
+
+    def __init__(self, engine, channel: str = CACHE_NOTIFY_CHANNEL):
+        super().__init__(name="cache-notify-listener", daemon=True)
+        if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", channel):
+            raise ValueError(f"invalid CACHE_NOTIFY_CHANNEL {channel!r}")
+        self.engine = engine
+        self.channel = channel
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("cache listener failed, reconnecting")
+                self._stopped.wait(1.0)
+
+    def _listen(self):
+        raw = self.engine.raw_connection()
+        try:
+            conn = raw.driver_connection
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.channel}"')
+            # Уведомления до LISTEN (или во время переподключения) могли потеряться
+            _invalidate_remote(None, None)
+            while not self._stopped.is_set():
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    _apply_notification(conn.notifies.pop(0).payload)
+        finally:
+            raw.invalidate()
+
+
+def start_listener(engine):
+    if not CACHE_NOTIFY_CHANNEL or engine.dialect.name != "postgresql":
+        return None
+    listener = NotifyListener(engine)
+    listener.start()
+    return listener
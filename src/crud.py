@@ -1,92 +1,857 @@
-from sqlalchemy.orm import Session
-from . import database, schemas
-import random
+from sqlalchemy import Float, and_, bindparam, case, cast, delete, func, insert, or_, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
+from . import cache, database, reviewer_selection, schemas, storage
+import base64
+import heapq
+import json
+import sys
+import uuid
+from datetime import date, datetime, timedelta
+
+class AlreadyExists(Exception):
+    """Команда или PR с таким ключом уже созданы параллельным запросом после проверки."""
 
 # --- Функции для работы с Team ---
 
-def get_team_by_name(db: Session, team_name: str):
-    return db.query(database.Team).filter(database.Team.team_name == team_name).first()
+def get_team_by_name(db: Session, team_name: str) -> cache.TeamSnapshot | None:
+    snapshot = cache.teams.get(team_name)
+    if snapshot is None:
+        generation = cache.teams.generation
+        db_team = (
+            db.query(database.Team)
+            .options(joinedload(database.Team.members))
+            .filter(database.Team.team_name == team_name)
+            .first()
+        )
+        if db_team is None:
+            return None
+        snapshot = cache.team_snapshot(db_team)
+        cache.teams.put(team_name, snapshot, generation)
+    return snapshot
 
-def create_team_with_members(db: Session, team_data: schemas.TeamAddRequest):
-    db_team = database.Team(team_name=team_data.team_name)
-    db.add(db_team)
+def create_team_with_members(db: Session, team_data: schemas.TeamAddRequest) -> schemas.Team:
+    try:
+        db.execute(insert(database.Team).values(team_name=team_data.team_name))
+    except IntegrityError:
+        db.rollback()
+        raise AlreadyExists("team_name already exists") from None
+    [team], affected_teams, user_ids = _upsert_team_members(db, [(team_data.team_name, team_data.members)])
+    _commit_membership_change(db, affected_teams, user_ids)
+    return team
 
-    for member_data in team_data.members:
-        user = db.query(database.User).filter(database.User.user_id == member_data.user_id).first()
-        if user:
-            user.username = member_data.username
-            user.is_active = member_data.is_active
-            user.team = db_team
-        else:
-            user = database.User(
-                user_id=member_data.user_id,
-                username=member_data.username,
-                is_active=member_data.is_active,
-                team=db_team,
-            )
-        db.add(user)
-    
+def add_team_members(db: Session, db_team: cache.TeamSnapshot, members: list[schemas.TeamMember]) -> schemas.Team:
+    [team], affected_teams, user_ids = _upsert_team_members(db, [(db_team.team_name, members)])
+    _commit_membership_change(db, affected_teams, user_ids)
+    return team
+
+def sync_teams(db: Session, teams: list[schemas.TeamAddRequest]) -> list[schemas.Team]:
+    """
+    Создает недостающие команды одним запросом и синхронизирует участников всех
+    команд одним SELECT и одним upsert в одной транзакции: число запросов не
+    зависит от числа команд.
+    """
+    if not teams:
+        return []
+    stmt = _dialect_insert(db, database.Team).values([{"team_name": t.team_name} for t in teams])
+    db.execute(stmt.on_conflict_do_nothing(index_elements=[database.Team.team_name]))
+    result, affected_teams, user_ids = _upsert_team_members(db, [(t.team_name, t.members) for t in teams])
+    _commit_membership_change(db, affected_teams, user_ids)
+    return result
+
+def _commit_membership_change(db: Session, team_names: set[str], user_ids: set[str]):
+    cache.publish(db, team_names, user_ids)
     db.commit()
-    db.refresh(db_team)
-    return db_team
+    cache.invalidate(team_names, user_ids)
+    reviewer_selection.index.invalidate(team_names=team_names)
+
+def _upsert_team_members(db: Session, teams: list[tuple[str, list[schemas.TeamMember]]]):
+    """
+    Один SELECT (текущие составы команд и прежние команды добавляемых пользователей)
+    и один INSERT ... ON CONFLICT (user_id) DO UPDATE для всех команд.
+    Команды применяются по порядку: пользователь из нескольких команд запроса
+    остается в последней, а состав каждой команды в ответе — как после ее
+    шага. Ответ собирается в памяти, без повторной загрузки team.members.
+    """
+    User = database.User
+    team_names = {team_name for team_name, _ in teams}
+    user_ids = {m.user_id for _, members in teams for m in members}
+
+    current = db.execute(
+        select(User.user_id, User.username, User.is_active, User.team_name)
+        .where(or_(User.user_id.in_(user_ids), User.team_name.in_(team_names)))
+    ).all()
+    team_of = {row.user_id: row.team_name for row in current}
+    members_by_team = {team_name: {} for team_name in team_names}
+    for row in current:
+        if row.team_name in members_by_team:
+            members_by_team[row.team_name][row.user_id] = schemas.TeamMember(
+                user_id=row.user_id, username=row.username, is_active=row.is_active,
+            )
+    affected_teams = team_names | {row.team_name for row in current if row.user_id in user_ids and row.team_name}
+
+    result, upserts = [], {}
+    for team_name, members in teams:
+        team_members = members_by_team[team_name]
+        for member in members:
+            previous = team_of.get(member.user_id)
+            if previous != team_name and previous in members_by_team:
+                members_by_team[previous].pop(member.user_id, None)
+            team_of[member.user_id] = team_name
+            team_members[member.user_id] = schemas.TeamMember(
+                user_id=member.user_id, username=member.username, is_active=member.is_active,
+            )
+            # Одна строка на ключ: повторы в одном ON CONFLICT DO UPDATE недопустимы
+            upserts[member.user_id] = {
+                "user_id": member.user_id, "username": member.username,
+                "is_active": member.is_active, "team_name": team_name,
+            }
+        result.append(schemas.Team(team_name=team_name, members=list(team_members.values())))
+
+    if upserts:
+        stmt = _dialect_insert(db, User).values(list(upserts.values()))
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[User.user_id],
+            set_={
+                "username": stmt.excluded.username,
+                "is_active": stmt.excluded.is_active,
+                "team_name": stmt.excluded.team_name,
+            },
+        ))
+    return result, affected_teams, user_ids
+
+def _dialect_insert(db: Session, model):
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    return dialect_insert(model)
+
+def _sequence_resets(table) -> list:
+    """
+    setval для последовательностей автоинкрементных ключей PostgreSQL: строки с
+    явными ключами последовательность не двигают, и следующий INSERT без ключа
+    получил бы уже занятое значение.
+    """
+    return [
+        select(func.setval(
+            func.pg_get_serial_sequence(table.name, column.name),
+            select(func.max(column)).scalar_subquery(),
+        ))
+        for column in table.primary_key.columns
+        if column.autoincrement is True
+    ]
 
 # --- Функции для работы с User ---
 
-def get_user_by_id(db: Session, user_id: str):
-    return db.query(database.User).filter(database.User.user_id == user_id).first()
+def get_user_by_id(db: Session, user_id: str) -> cache.UserSnapshot | None:
+    snapshot = cache.users.get(user_id)
+    if snapshot is None:
+        generation = cache.users.generation
+        db_user = db.query(database.User).filter(database.User.user_id == user_id).first()
+        if db_user is None:
+            return None
+        snapshot = cache.user_snapshot(db_user)
+        cache.users.put(user_id, snapshot, generation)
+    return snapshot
 
-def set_user_active(db: Session, user_id: str, is_active: bool):
-    user = get_user_by_id(db, user_id)
-    if user:
-        user.is_active = is_active
-        db.commit()
-        db.refresh(user)
+def choose_reviewers(db: Session, team_name: str, exclude: set[str], k: int = 2) -> list[str]:
+    return reviewer_selection.index.choose(db, team_name, k=k, exclude=exclude)
+
+# --- Проверка кандидатов в транзакции записи ---
+# Индекс ревьюеров живет в памяти процесса и узнает об изменениях из других
+# воркеров с опозданием (NOTIFY или REVIEWER_INDEX_TTL). Поэтому выбранные им
+# кандидаты перед вставкой перечитываются из БД в той же транзакции: активен ли
+# пользователь и состоит ли он в команде автора (или снятого ревьюера). На
+# PostgreSQL строки читаются FOR SHARE: параллельная деактивация или перевод в
+# другую команду дождется коммита и увидит новое назначение. Устаревшие
+# кандидаты сбрасывают команду в индексе, замены выбираются из перечитанного
+# состава. Число открытых ревью в индексе по-прежнему приблизительное.
+
+def _current_users(db: Session, user_ids) -> dict[str, tuple[str | None, bool]]:
+    User = database.User
+    rows = db.execute(
+        select(User.user_id, User.team_name, User.is_active)
+        .where(User.user_id.in_(set(user_ids)))
+        .with_for_update(read=True)
+    ).all()
+    return {row.user_id: (row.team_name, bool(row.is_active)) for row in rows}
+
+def _confirm_reviewers(db: Session, picks: list[tuple[str, list[str]]], k: int = 2, reserve: bool = False) -> list[list[str]]:
+    """picks: (автор, выбранные индексом ревьюеры). Возвращает подтвержденные составы."""
+    picks = [(author_id, list(reviewer_ids)) for author_id, reviewer_ids in picks]
+    for attempt in range(VERSION_RETRIES):
+        users = _current_users(db, {user_id for author_id, reviewer_ids in picks for user_id in (author_id, *reviewer_ids)})
+        stale = []
+        for i, (author_id, reviewer_ids) in enumerate(picks):
+            team_name = users.get(author_id, (None, False))[0]
+            valid = [user_id for user_id in reviewer_ids if users.get(user_id) == (team_name, True)]
+            if len(valid) < len(reviewer_ids):
+                stale.append((i, team_name, set(reviewer_ids) - set(valid)))
+                picks[i] = (author_id, valid)
+        if not stale:
+            break
+        reviewer_selection.index.invalidate(
+            team_names={team_name for _, team_name, _ in stale if team_name},
+            user_ids={user_id for _, _, dropped in stale for user_id in dropped},
+        )
+        if attempt == VERSION_RETRIES - 1:
+            break
+        for i, team_name, _ in stale:
+            author_id, valid = picks[i]
+            if team_name:
+                more = reviewer_selection.index.choose_many(
+                    db, [(team_name, {author_id, *valid})], k=k - len(valid), reserve=reserve,
+                )[0]
+                picks[i] = (author_id, valid + more)
+    return [reviewer_ids for _, reviewer_ids in picks]
+
+def set_user_active(db: Session, user_id: str, is_active: bool) -> cache.UserSnapshot | None:
+    User = database.User
+    row = db.execute(
+        update(User)
+        .where(User.user_id == user_id)
+        .values(is_active=is_active)
+        .returning(User.user_id, User.username, User.team_name, User.is_active)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if row is None:
+        db.rollback()
+        return None
+    user = cache.UserSnapshot(row.user_id, row.username, row.team_name, bool(row.is_active))
+    team_names = [user.team_name] if user.team_name else []
+    cache.publish(db, team_names, [user_id])
+    db.commit()
+    cache.invalidate(team_names, [user_id])
+    reviewer_selection.index.user_activity_changed(user_id, is_active)
     return user
 
 # --- Функции для работы с PullRequest ---
 
 def get_pr_by_id(db: Session, pr_id: str):
-    return db.query(database.PullRequest).filter(database.PullRequest.pull_request_id == pr_id).first()
+    # Ревьюеры тем же запросом (JOIN), а не вторым SELECT из lazy="selectin"
+    return (
+        db.query(database.PullRequest)
+        .options(joinedload(database.PullRequest.reviewers))
+        .filter(database.PullRequest.pull_request_id == pr_id)
+        .first()
+    )
 
 def create_pr(db: Session, pr_data: schemas.PullRequestCreateRequest, reviewer_ids: list[str]):
-    db_pr = database.PullRequest(
-        pull_request_id=pr_data.pull_request_id,
-        pull_request_name=pr_data.pull_request_name,
-        author_id=pr_data.author_id,
-        reviewers=",".join(reviewer_ids)
+    """Два INSERT; ответ собирается из вставленных значений, как в create_prs_batch, без db.refresh."""
+    [reviewer_ids] = _confirm_reviewers(db, [(pr_data.author_id, reviewer_ids)])
+    now = datetime.utcnow()
+    pr_row = {
+        "pull_request_id": pr_data.pull_request_id,
+        "pull_request_name": pr_data.pull_request_name,
+        "author_id": pr_data.author_id,
+        "status": "OPEN",
+        "created_at": now,
+        "merged_at": None,
+        "version": 1,
+    }
+    links = [
+        {"pull_request_id": pr_data.pull_request_id, "user_id": r, "status": "OPEN", "assigned_at": now, "pr_created_at": now}
+        for r in reviewer_ids
+    ]
+    try:
+        db.execute(insert(database.PullRequest), [pr_row])
+    except IntegrityError:
+        db.rollback()
+        raise AlreadyExists("PR id already exists") from None
+    if links:
+        db.execute(insert(database.PullRequestReviewer), links)
+    _bump_counters(db, assignments=reviewer_ids, prs_created=[pr_data.author_id])
+    _record_events(db, _creation_events(pr_data.pull_request_id, pr_data.author_id, reviewer_ids, now))
+    db.commit()
+    reviewer_selection.index.pr_created(reviewer_ids)
+    return database.PullRequest(**pr_row, reviewers=[database.PullRequestReviewer(**link) for link in links])
+
+def create_prs_batch(db: Session, items: list[schemas.PullRequestCreateRequest]):
+    """
+    Пакетное создание PR: проверка дубликатов одним IN-запросом, авторы — одним
+    запросом, составы команд — одним запросом индекса ревьюеров, вставка —
+    многострочными INSERT в одной транзакции. Возвращает список
+    (pull_request_id, PullRequest | None, (code, message) | None) в порядке запроса.
+    """
+    pr_ids = [item.pull_request_id for item in items]
+    existing = set(db.scalars(
+        select(database.PullRequest.pull_request_id).where(database.PullRequest.pull_request_id.in_(pr_ids))
+    ))
+    author_teams = dict(db.execute(
+        select(database.User.user_id, database.User.team_name)
+        .where(database.User.user_id.in_({item.author_id for item in items}))
+    ).all())
+
+    results, accepted, seen = [], [], set()
+    for item in items:
+        if item.pull_request_id in existing or item.pull_request_id in seen:
+            results.append((item.pull_request_id, None, ("PR_EXISTS", "PR id already exists")))
+        elif not author_teams.get(item.author_id):
+            results.append((item.pull_request_id, None, ("NOT_FOUND", "author or author's team not found")))
+        else:
+            accepted.append((len(results), item))
+            results.append(None)
+        seen.add(item.pull_request_id)
+
+    if not accepted:
+        return results
+
+    reviewers = reviewer_selection.index.choose_many(
+        db, [(author_teams[item.author_id], {item.author_id}) for _, item in accepted], reserve=True
+    )
+    reviewers = _confirm_reviewers(
+        db, [(item.author_id, reviewer_ids) for (_, item), reviewer_ids in zip(accepted, reviewers)], reserve=True,
+    )
+    now = datetime.utcnow()
+    pr_rows, reviewer_rows = [], []
+    for (position, item), reviewer_ids in zip(accepted, reviewers):
+        db_pr = database.PullRequest(
+            pull_request_id=item.pull_request_id,
+            pull_request_name=item.pull_request_name,
+            author_id=item.author_id,
+            status="OPEN",
+            created_at=now,
+            reviewers=[database.PullRequestReviewer(user_id=r, status="OPEN", assigned_at=now, pr_created_at=now)
+                for r in reviewer_ids
+            ],
+        )
+        results[position] = (item.pull_request_id, db_pr, None)
+        pr_rows.append({
+            "pull_request_id": item.pull_request_id,
+            "pull_request_name": item.pull_request_name,
+            "author_id": item.author_id,
+            "status": "OPEN",
+            "created_at": now,
+        })
+        reviewer_rows.extend(
+            {"pull_request_id": item.pull_request_id, "user_id": r, "status": "OPEN", "assigned_at": now, "pr_created_at": now}
+            for r in reviewer_ids
+        )
+
+    try:
+        db.execute(insert(database.PullRequest), pr_rows)
+        if reviewer_rows:
+            db.execute(insert(database.PullRequestReviewer), reviewer_rows)
+        _bump_counters(
+            db,
+            assignments=[row["user_id"] for row in reviewer_rows],
+            prs_created=[row["author_id"] for row in pr_rows],
+        )
+        _record_events(db, [
+            event
+            for (_, item), reviewer_ids in zip(accepted, reviewers)
+            for event in _creation_events(item.pull_request_id, item.author_id, reviewer_ids, now)
+        ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        reviewer_selection.index.invalidate(team_names=set(author_teams.values()))
+        raise
+    return results
+
+# --- Оптимистичная блокировка PR ---
+# reassign проверяется в эндпоинте по прочитанному PR, а записывается условным
+# UPDATE ... WHERE version = <прочитанная версия> RETURNING. Если PR изменили
+# между чтением и записью, строка не находится: транзакция откатывается, и
+# эндпоинт повторяет чтение и проверки (до VERSION_RETRIES раз). merge не
+# читает PR заранее, но тоже увеличивает версию. На PostgreSQL UPDATE заодно
+# блокирует строку PR до коммита, поэтому изменения pr_reviewers в той же
+# транзакции не пересекаются с параллельными. Ответ собирается из RETURNING
+# и уже прочитанных данных, без db.refresh.
+
+VERSION_RETRIES = 5
+
+class VersionConflict(Exception):
+    """PR изменен параллельным запросом после чтения."""
+
+def _claim_pr_version(db: Session, db_pr: database.PullRequest, **values):
+    PR = database.PullRequest
+    row = db.execute(
+        update(PR)
+        .where(PR.pull_request_id == db_pr.pull_request_id, PR.version == db_pr.version)
+        .values(version=PR.version + 1, **values)
+        .returning(*PR.__table__.columns)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if row is None:
+        db.rollback()
+        raise VersionConflict(db_pr.pull_request_id)
+    return row
+
+def _detached_pr(pr_row, links: list[dict]) -> database.PullRequest:
+    """PR вне сессии для ответа эндпоинта (как в create_prs_batch)."""
+    return database.PullRequest(
+        **pr_row._mapping,
+        reviewers=[database.PullRequestReviewer(**link) for link in sorted(links, key=lambda link: link["assigned_at"])],
+    )
+
+# --- Merge ---
+# Без предварительного чтения: один UPDATE pull_requests с
+# merged_at = COALESCE(merged_at, :now) ... RETURNING (повторный merge ничего не
+# меняет и возвращает тот же merged_at) и один UPDATE pr_reviewers ... RETURNING
+# для списка ревьюеров в ответе. Первый merge отличается по merged_at == :now:
+# только для него увеличиваются версия и счетчики.
+
+def merge_pr(db: Session, pr_id: str) -> database.PullRequest | None:
+    return merge_prs_batch(db, [pr_id]).get(pr_id)
+
+def merge_prs_batch(db: Session, pr_ids: list[str]) -> dict[str, database.PullRequest]:
+    """Мержит PR одним запросом на таблицу; возвращает итоговое состояние найденных PR."""
+    PR, Reviewer = database.PullRequest, database.PullRequestReviewer
+    pr_ids = list(dict.fromkeys(pr_ids))
+    if not pr_ids:
+        return {}
+    now = datetime.utcnow()
+    pr_rows = db.execute(
+        update(PR)
+        .where(PR.pull_request_id.in_(pr_ids))
+        .values(
+            status="MERGED",
+            merged_at=func.coalesce(PR.merged_at, now),
+            version=case((PR.status == "OPEN", PR.version + 1), else_=PR.version),
+        )
+        .returning(*PR.__table__.columns)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if not pr_rows:
+        db.rollback()
+        return {}
+    links: dict[str, list[dict]] = {row.pull_request_id: [] for row in pr_rows}
+    for row in db.execute(
+        update(Reviewer)
+        .where(Reviewer.pull_request_id.in_(pr_ids))
+        .values(status="MERGED")
+        .returning(*Reviewer.__table__.columns)
+        .execution_options(synchronize_session=False)
+    ):
+        links[row.pull_request_id].append(dict(row._mapping))
+
+    merged_now = [row for row in pr_rows if row.merged_at == now]
+    reviewer_ids = [link["user_id"] for row in merged_now for link in links[row.pull_request_id]]
+    _bump_counters(db, merged_reviews=reviewer_ids, prs_merged=[row.author_id for row in merged_now])
+    _record_events(db, [
+        _event("MERGED", row.pull_request_id, row.author_id, row.created_at, now, user_id=row.author_id)
+        for row in merged_now
+    ])
+    db.commit()
+    reviewer_selection.index.pr_merged(reviewer_ids)
+    return {row.pull_request_id: _detached_pr(row, links[row.pull_request_id]) for row in pr_rows}
+
+class StaleCandidate(VersionConflict):
+    """Выбранная индексом замена уже неактивна или в другой команде: выбор повторяется."""
+
+def replace_reviewer(db: Session, db_pr: database.PullRequest, old_user_id: str, new_user_id: str):
+    Reviewer = database.PullRequestReviewer
+    users = _current_users(db, [old_user_id, new_user_id])
+    team_name = users.get(old_user_id, (None, False))[0]
+    if users.get(new_user_id) != (team_name, True):
+        db.rollback()
+        reviewer_selection.index.invalidate(team_names=[team_name] if team_name else [], user_ids=[new_user_id])
+        raise StaleCandidate(new_user_id)
+    # Совпавшая версия гарантирует, что прочитанный состав ревьюеров актуален
+    links = [
+        {column.key: getattr(link, column.key) for column in Reviewer.__table__.columns}
+        for link in db_pr.reviewers if link.user_id != old_user_id
+    ]
+    pr_row = _claim_pr_version(db, db_pr)
+    db.execute(
+        delete(Reviewer)
+        .where(Reviewer.pull_request_id == db_pr.pull_request_id, Reviewer.user_id == old_user_id)
+        .execution_options(synchronize_session=False)
     )
-    db.add(db_pr)
+    new_link = {
+        "pull_request_id": db_pr.pull_request_id, "user_id": new_user_id, "status": pr_row.status,
+        "assigned_at": datetime.utcnow(), "pr_created_at": pr_row.created_at,
+    }
+    db.execute(insert(Reviewer), [new_link])
+    _bump_counters(db, reassignments=[old_user_id], assignments=[new_user_id])
+    _record_events(db, [_event(
+        "REASSIGNED", pr_row.pull_request_id, pr_row.author_id, pr_row.created_at, new_link["assigned_at"],
+        user_id=new_user_id, previous_user_id=old_user_id,
+    )])
     db.commit()
-    db.refresh(db_pr)
-    return db_pr
+    reviewer_selection.index.reviewer_replaced(old_user_id, new_user_id)
+    return _detached_pr(pr_row, links + [new_link])
 
-def get_reviews_for_user(db: Session, user_id: str):
-    return db.query(database.PullRequest).filter(database.PullRequest.reviewers.contains(user_id)).all()
+# --- Ревью пользователя ---
+# Keyset-пагинация по (pr_created_at, pull_request_id) от новых к старым. Каждая
+# страница — поиск по индексу ix_pr_reviewers_user_status_created плюс чтение
+# limit строк pull_requests по первичному ключу, поэтому время ответа не зависит
+# от длины истории ревью. limit=None — весь список без курсора: так
+# /users/getReview отвечает на запрос без limit и cursor, как до пагинации.
+
+REVIEW_STATUSES = ("OPEN", "MERGED")
+# Размер страницы, если передан cursor без limit
+REVIEW_PAGE_SIZE = 100
+
+def encode_review_cursor(created_at: datetime, pr_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), pr_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_review_cursor(cursor: str) -> tuple[datetime, str]:
+    """ValueError, если курсор поврежден."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, pr_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(pr_id)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("invalid cursor") from exc
+
+def get_reviews_for_user(
+    db: Session,
+    user_id: str,
+    status: str | None = None,
+    limit: int | None = REVIEW_PAGE_SIZE,
+    after: tuple[datetime, str] | None = None,
+):
+    """
+    Возвращает (строки, следующий курсор). Строка — только поля PullRequestShort
+    и ключ сортировки. Без фильтра по статусу выполняется по одному индексному
+    запросу на статус, результаты сливаются по ключу.
+    """
+    Reviewer = database.PullRequestReviewer
+    PullRequest = database.PullRequest
+    key = (Reviewer.pr_created_at, Reviewer.pull_request_id)
+    pages = []
+    for review_status in ([status] if status else REVIEW_STATUSES):
+        query = (
+            select(
+                Reviewer.pull_request_id,
+                PullRequest.pull_request_name,
+                PullRequest.author_id,
+                Reviewer.status,
+                Reviewer.pr_created_at,
+            )
+            .join(PullRequest, PullRequest.pull_request_id == Reviewer.pull_request_id)
+            .where(Reviewer.user_id == user_id, Reviewer.status == review_status)
+            .order_by(key[0].desc(), key[1].desc())
+        )
+        if limit is not None:
+            query = query.limit(limit + 1)
+        if after is not None:
+            query = query.where(tuple_(*key) < tuple_(*after))
+        pages.append(db.execute(query).all())
+
+    rows = list(heapq.merge(*pages, key=lambda row: (row.pr_created_at, row.pull_request_id), reverse=True))
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_review_cursor(rows[-1].pr_created_at, rows[-1].pull_request_id)
+
+# --- Статистика назначений ---
+# Счетчики assignment_counters(user_id, day) обновляются в тех же транзакциях,
+# что и сами назначения, поэтому чтение статистики стоит O(пользователей × дней
+# в окне) и не зависит от числа PR.
+
+COUNTER_FIELDS = ("assignments", "reassignments", "merged_reviews", "prs_created", "prs_merged")
+
+def _bump_counters(db: Session, **events: list[str]):
+    """events: имя счетчика -> список user_id, по +1 за каждое вхождение; один multi-row upsert."""
+    totals: dict[str, dict[str, int]] = {}
+    for field, user_ids in events.items():
+        for user_id in user_ids:
+            totals.setdefault(user_id, dict.fromkeys(COUNTER_FIELDS, 0))[field] += 1
+    if not totals:
+        return
+    table = database.AssignmentCounter.__table__
+    day = datetime.utcnow().date()
+    stmt = _dialect_insert(db, database.AssignmentCounter).values([
+        {"user_id": user_id, "day": day, **counts} for user_id, counts in sorted(totals.items())
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.day],
+        set_={field: table.c[field] + stmt.excluded[field] for field in COUNTER_FIELDS},
+    ))
+
+# --- Журнал событий PR ---
+# pr_events пишется одним INSERT (executemany) в транзакции изменения PR.
+# Команда события — текущая команда автора, подзапрос по первичному ключу users.
+
+def _event(event_type: str, pr_id: str, author_id: str, pr_created_at: datetime, occurred_at: datetime,
+           user_id: str | None = None, previous_user_id: str | None = None) -> dict:
+    return {
+        "event_type": event_type, "pull_request_id": pr_id, "author_id": author_id, "pr_created_at": pr_created_at,
+        "occurred_at": occurred_at, "user_id": user_id, "previous_user_id": previous_user_id,
+    }
+
+def _creation_events(pr_id: str, author_id: str, reviewer_ids: list[str], now: datetime) -> list[dict]:
+    return [_event("CREATED", pr_id, author_id, now, now, user_id=author_id)] + [
+        _event("ASSIGNED", pr_id, author_id, now, now, user_id=user_id) for user_id in reviewer_ids
+    ]
+
+def _record_events(db: Session, events: list[dict]):
+    if not events:
+        return
+    author_team = select(database.User.team_name).where(database.User.user_id == bindparam("author_id"))
+    db.execute(insert(database.PrEvent).values(team_name=author_team.scalar_subquery()), events)
+
+def get_pr_events(db: Session, pr_id: str):
+    Event = database.PrEvent
+    return db.execute(
+        select(Event.event_type, Event.occurred_at, Event.user_id, Event.previous_user_id)
+        .where(Event.pull_request_id == pr_id)
+        .order_by(Event.event_id)
+    ).all()
+
+def _event_window(query, team_name: str | None, date_from: date | None, date_to: date | None):
+    """Окно по occurred_at: даты UTC включительно, как у /stats/assignments."""
+    Event = database.PrEvent
+    if team_name is not None:
+        query = query.where(Event.team_name == team_name)
+    if date_from is not None:
+        query = query.where(Event.occurred_at >= datetime.combine(date_from, datetime.min.time()))
+    if date_to is not None:
+        query = query.where(Event.occurred_at < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    return query.where(Event.team_name.is_not(None)).group_by(Event.team_name).order_by(Event.team_name)
+
+def _seconds_between(db: Session, later, earlier):
+    if db.get_bind().dialect.name == "sqlite":
+        return (func.julianday(later) - func.julianday(earlier)) * 86400
+    return func.extract("epoch", later - earlier)
+
+def get_time_to_merge(db: Session, team_name: str | None = None, date_from: date | None = None, date_to: date | None = None):
+    """Время от создания до merge PR, замерженных в окне, по командам."""
+    Event = database.PrEvent
+    seconds = _seconds_between(db, Event.occurred_at, Event.pr_created_at)
+    return db.execute(_event_window(
+        select(
+            Event.team_name,
+            func.count().label("merged_prs"),
+            cast(func.avg(seconds), Float).label("avg_seconds"),
+            cast(func.max(seconds), Float).label("max_seconds"),
+        ).where(Event.event_type == "MERGED"),
+        team_name, date_from, date_to,
+    )).all()
+
+def get_reassignment_rates(db: Session, team_name: str | None = None, date_from: date | None = None, date_to: date | None = None):
+    """Назначения ревьюеров в окне по командам и сколько из них — переназначения."""
+    Event = database.PrEvent
+    return db.execute(_event_window(
+        select(
+            Event.team_name,
+            func.count().label("assignments"),
+            func.sum(case((Event.event_type == "REASSIGNED", 1), else_=0)).label("reassignments"),
+        ).where(Event.event_type.in_(("ASSIGNED", "REASSIGNED"))),
+        team_name, date_from, date_to,
+    )).all()
+
+def _counter_sums(date_from: date | None, date_to: date | None):
+    Counter = database.AssignmentCounter
+    window = [Counter.user_id == database.User.user_id]
+    if date_from is not None:
+        window.append(Counter.day >= date_from)
+    if date_to is not None:
+        window.append(Counter.day <= date_to)
+    columns = [func.coalesce(func.sum(getattr(Counter, field)), 0).label(field) for field in COUNTER_FIELDS]
+    return columns, and_(*window)
+
+def get_assignment_stats(db: Session, team_name: str | None = None, date_from: date | None = None, date_to: date | None = None):
+    User = database.User
+    columns, window = _counter_sums(date_from, date_to)
+    query = (
+        select(User.user_id, User.team_name, *columns)
+        .outerjoin(database.AssignmentCounter, window)
+        .group_by(User.user_id, User.team_name)
+        .order_by(User.user_id)
+    )
+    if team_name is not None:
+        query = query.where(User.team_name == team_name)
+    return db.execute(query).all()
+
+def get_team_stats(db: Session, team_name: str | None = None, date_from: date | None = None, date_to: date | None = None):
+    User = database.User
+    columns, window = _counter_sums(date_from, date_to)
+    query = (
+        select(User.team_name, func.count(func.distinct(User.user_id)).label("members"), *columns)
+        .outerjoin(database.AssignmentCounter, window)
+        .where(User.team_name.is_not(None))
+        .group_by(User.team_name)
+        .order_by(User.team_name)
+    )
+    if team_name is not None:
+        query = query.where(User.team_name == team_name)
+    return db.execute(query).all()
 
 # --- Функция для массовой деактивации ---
+# Фиксированное число запросов независимо от количества PR и пользователей:
+# UPDATE users, UPDATE версий затронутых PR, SELECT затронутых назначений,
+# SELECT пула кандидатов с нагрузкой, DELETE + INSERT новых назначений.
+# Фоновый вариант (enqueue_deactivation) деактивирует пользователей сразу, а
+# их открытые ревью переназначает воркер src/jobs.py пачками PR.
+
+def _deactivate_users(db: Session, team: cache.TeamSnapshot, user_ids: list[str]) -> set[str]:
+    affected_teams = {team.team_name} | {
+        team_name for team_name in db.scalars(
+            update(database.User)
+            .where(database.User.user_id.in_(user_ids))
+            .values(is_active=False)
+            .returning(database.User.team_name)
+            .execution_options(synchronize_session=False)
+        ) if team_name
+    }
+    cache.publish(db, affected_teams, user_ids)
+    return affected_teams
+
+def _users_deactivated(affected_teams: set[str], user_ids: list[str]):
+    cache.invalidate(affected_teams, user_ids)
+    reviewer_selection.index.users_deactivated(user_ids)
+
+def reassign_open_reviews(db: Session, team_name: str, user_ids: list[str], affected_prs):
+    """
+    Заменяет уже деактивированных user_ids в открытых ревью PR из affected_prs
+    (подзапрос или список id) наименее загруженными активными участниками
+    team_name. Не коммитит; возвращает пары (PR, снятый ревьюер) и новые строки
+    pr_reviewers для reviewers_replaced после коммита.
+    """
+    Reviewer = database.PullRequestReviewer
+    PR = database.PullRequest
+    # Параллельные merge/reassign этих PR получат VersionConflict и перечитают их.
+    # affected_prs могли выбрать в другой транзакции (jobs.run_chunk): PR,
+    # замерженные с тех пор, не трогаются, а статус перечитывается уже под
+    # блокировкой строк, взятой этим UPDATE
+    db.execute(
+        update(PR)
+        .where(PR.pull_request_id.in_(affected_prs), PR.status == "OPEN")
+        .values(version=PR.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    rows = db.execute(
+        select(Reviewer.pull_request_id, Reviewer.user_id, PR.author_id, PR.created_at)
+        .join(PR, PR.pull_request_id == Reviewer.pull_request_id)
+        .where(Reviewer.pull_request_id.in_(affected_prs), PR.status == "OPEN")
+        .order_by(Reviewer.pull_request_id, Reviewer.assigned_at)
+    ).all()
+    if not rows:
+        return [], []
+
+    pool = reviewer_selection.CandidatePool(db.execute(
+        select(database.User.user_id, func.count(Reviewer.user_id))
+        .outerjoin(Reviewer, (Reviewer.user_id == database.User.user_id) & (Reviewer.status == 'OPEN'))
+        .where(database.User.team_name == team_name, database.User.is_active.is_(True))
+        .group_by(database.User.user_id)
+    ).all())
+
+    reviewers_by_pr: dict[str, list[str]] = {}
+    authors: dict[str, str] = {}
+    created: dict[str, datetime] = {}
+    for pr_id, user_id, author_id, created_at in rows:
+        reviewers_by_pr.setdefault(pr_id, []).append(user_id)
+        authors[pr_id] = author_id
+        created[pr_id] = created_at
+
+    deactivated = set(user_ids)
+    removed, added = [], []
+    now = datetime.utcnow()
+    for pr_id, reviewers in reviewers_by_pr.items():
+        for old_user_id in [r for r in reviewers if r in deactivated]:
+            new_user_id = pool.take(exclude={authors[pr_id], *reviewers})
+            if new_user_id is None:
+                continue
+            reviewers[reviewers.index(old_user_id)] = new_user_id
+            removed.append((pr_id, old_user_id))
+            added.append({
+                "pull_request_id": pr_id, "user_id": new_user_id, "status": 'OPEN',
+                "assigned_at": now, "pr_created_at": created[pr_id] or now,
+            })
+
+    if removed:
+        db.execute(
+            delete(Reviewer)
+            .where(tuple_(Reviewer.pull_request_id, Reviewer.user_id).in_(removed))
+            .execution_options(synchronize_session=False)
+        )
+        db.execute(insert(Reviewer), added)
+        _bump_counters(
+            db,
+            reassignments=[old_user_id for _, old_user_id in removed],
+            assignments=[row["user_id"] for row in added],
+        )
+        _record_events(db, [
+            _event("REASSIGNED", pr_id, authors[pr_id], created[pr_id] or now, now,
+                   user_id=link["user_id"], previous_user_id=old_user_id)
+            for (pr_id, old_user_id), link in zip(removed, added)
+        ])
+    return removed, added
+
+def reviewers_replaced(removed: list[tuple[str, str]], added: list[dict]) -> list[str]:
+    """Обновляет индекс ревьюеров после коммита; возвращает id переназначенных PR."""
+    for (_, old_user_id), new_link in zip(removed, added):
+        reviewer_selection.index.reviewer_replaced(old_user_id, new_link["user_id"])
+    return list(dict.fromkeys(pr_id for pr_id, _ in removed))
 
-def deactivate_and_reassign(db: Session, team: database.Team, user_ids: list[str]):
-    reassigned_prs = set()
-    
-    open_prs_to_check = db.query(database.PullRequest).filter(database.PullRequest.status == 'OPEN').all()
-
-    for user_id in user_ids:
-        db.query(database.User).filter(database.User.user_id == user_id).update({"is_active": False})
-
-        for pr in open_prs_to_check:
-            reviewers = pr.reviewers.split(',') if pr.reviewers else []
-            if user_id in reviewers:
-                candidates = [
-                    m.user_id for m in team.members 
-                    if m.is_active and m.user_id not in user_ids and m.user_id != pr.author_id and m.user_id not in reviewers
-                ]
-                
-                if candidates:
-                    new_reviewer = random.choice(candidates)
-                    reviewers.remove(user_id)
-                    reviewers.append(new_reviewer)
-                    pr.reviewers = ",".join(reviewers)
-                    reassigned_prs.add(pr.pull_request_id)
+def _open_reviews_of(user_ids: list[str]):
+    Reviewer = database.PullRequestReviewer
+    return select(Reviewer.pull_request_id).where(Reviewer.user_id.in_(user_ids), Reviewer.status == 'OPEN')
 
+def deactivate_and_reassign(db: Session, team: cache.TeamSnapshot, user_ids: list[str]):
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return []
+    affected_teams = _deactivate_users(db, team, user_ids)
+    removed, added = reassign_open_reviews(db, team.team_name, user_ids, _open_reviews_of(user_ids))
     db.commit()
-    return list(reassigned_prs)
+    _users_deactivated(affected_teams, user_ids)
+    return reviewers_replaced(removed, added)
+
+# --- Фоновые задания (src/jobs.py) ---
+
+JOB_DEACTIVATE_MEMBERS = "deactivate_members"
+# Результат задания хранит число переназначенных PR и не больше стольких их id:
+# JSON задания перезаписывается после каждой пачки и не растет с объемом
+JOB_RESULT_SAMPLE = 100
+
+def job_result(reassigned: list[str], previous: dict | None = None) -> dict:
+    previous = previous or {"reassigned": 0, "reassigned_prs": []}
+    return {
+        "reassigned": previous["reassigned"] + len(reassigned),
+        "reassigned_prs": (previous["reassigned_prs"] + reassigned[:JOB_RESULT_SAMPLE])[:JOB_RESULT_SAMPLE],
+    }
+
+def enqueue_deactivation(db: Session, team: cache.TeamSnapshot, user_ids: list[str]):
+    """Деактивирует пользователей и ставит переназначение их открытых ревью в очередь."""
+    user_ids = list(dict.fromkeys(user_ids))
+    affected_teams = _deactivate_users(db, team, user_ids) if user_ids else set()
+    total = db.scalar(_open_reviews_of(user_ids).with_only_columns(
+        func.count(func.distinct(database.PullRequestReviewer.pull_request_id))
+    )) if user_ids else 0
+    job = db.execute(
+        insert(database.Job)
+        .values(
+            job_id=uuid.uuid4().hex, kind=JOB_DEACTIVATE_MEMBERS, status="QUEUED",
+            payload={"team_name": team.team_name, "user_ids": user_ids},
+            total=total, result=job_result([]), created_at=datetime.utcnow(),
+        )
+        .returning(database.Job.__table__)
+    ).one()
+    db.commit()
+    if user_ids:
+        _users_deactivated(affected_teams, user_ids)
+    return job
+
+def get_job(db: Session, job_id: str):
+    return db.execute(select(database.Job.__table__).where(database.Job.job_id == job_id)).first()
+
+# --- Импорт (src/transfer.py) ---
+
+def import_rows(db: Session, table_name: str, rows: list[dict]):
+    """Пачка строк одной таблицы одним многострочным INSERT; существующие ключи пропускаются."""
+    table = database.Base.metadata.tables[table_name]
+    try:
+        db.execute(_dialect_insert(db, table).on_conflict_do_nothing(), rows)
+        if table_name == "users":
+            team_names = {row.get("team_name") for row in rows} - {None}
+            user_ids = [row["user_id"] for row in rows]
+            cache.publish(db, team_names, user_ids)
+        if db.get_bind().dialect.name == "postgresql":
+            for statement in _sequence_resets(table):
+                db.execute(statement)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    if table_name == "users":
+        cache.invalidate(team_names, user_ids)
+    # Нагрузка ревьюеров и составы команд изменились: индекс перестроится при следующем выборе
+    reviewer_selection.index.clear()
+
+# Функции модуля — SQL-реализация контракта storage.Storage
+storage.check(sys.modules[__name__])
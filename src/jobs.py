@@ -0,0 +1,215 @@
+"""
+Фоновые задания в таблице jobs (database.Job) и пул воркеров процесса.
+
+/team/deactivateMembersAsync деактивирует пользователей сразу, а переназначение
+их открытых ревью ставит в очередь. Воркер забирает задание через
+SELECT ... FOR UPDATE SKIP LOCKED (несколько воркеров и процессов uvicorn делят
+одну очередь) и обрабатывает затронутые PR пачками по JOB_CHUNK_SIZE по
+возрастанию pull_request_id. Каждая пачка вместе с прогрессом задания —
+отдельная короткая транзакция, поэтому блокировки держатся только на строках
+одной пачки, а прерванное задание продолжается с сохраненного курсора.
+
+Воркер продлевает аренду locked_until после каждой пачки. Задание с истекшей
+арендой (воркер упал или процесс остановлен) подхватывает другой воркер. Ошибка
+возвращает задание в очередь, после JOB_MAX_ATTEMPTS захватов оно помечается
+FAILED. На SQLite FOR UPDATE SKIP LOCKED не поддерживается: запись в базу и так
+последовательна, а захват защищен сравнением attempts.
+
+Воркеры запускаются в lifespan каждого процесса uvicorn с SQL-хранилищем, если
+JOB_WORKERS_ENABLED. При false процессы только ставят задания в очередь, а
+обрабатывает их отдельный процесс `python -m src.jobs`. В тестах воркеры
+выключены: задания обрабатываются явным вызовом process_next.
+"""
+import logging
+import os
+import signal
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import crud, database
+
+JOB_WORKERS_ENABLED = os.getenv("JOB_WORKERS_ENABLED", "true").lower() in ("1", "true", "yes")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", "500"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+
+logger = logging.getLogger(__name__)
+
+Job = database.Job
+
+# Будит воркеры этого процесса сразу после постановки задания, не дожидаясь опроса
+_wake = threading.Event()
+
+
+def notify():
+    _wake.set()
+
+
+def claim(db: Session):
+    """Забирает самое старое доступное задание; None, если очередь пуста."""
+    now = datetime.utcnow()
+    candidate = db.execute(
+        select(Job.job_id, Job.status, Job.attempts)
+        .where(or_(Job.status == "QUEUED", and_(Job.status == "RUNNING", Job.locked_until < now)))
+        .order_by(Job.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    ).first()
+    job = None
+    if candidate is not None:
+        # Сравнение status и attempts: на SQLite строку мог забрать другой воркер
+        job = db.execute(
+            update(Job)
+            .where(Job.job_id == candidate.job_id, Job.status == candidate.status, Job.attempts == candidate.attempts)
+            .values(
+                status="RUNNING",
+                attempts=Job.attempts + 1,
+                locked_until=now + timedelta(seconds=JOB_LEASE_SECONDS),
+                started_at=func.coalesce(Job.started_at, now),
+            )
+            .returning(Job.__table__)
+        ).first()
+    db.commit()
+    return job
+
+
+def run_chunk(db: Session, job):
+    """
+    Обрабатывает следующую пачку PR задания одной транзакцией. Возвращает
+    обновленную строку задания (status DONE после последней пачки) или None,
+    если задание за это время забрал другой воркер.
+    """
+    team_name, user_ids = job.payload["team_name"], job.payload["user_ids"]
+    Reviewer = database.PullRequestReviewer
+    query = (
+        select(Reviewer.pull_request_id)
+        .where(Reviewer.user_id.in_(user_ids), Reviewer.status == "OPEN")
+        .distinct()
+        .order_by(Reviewer.pull_request_id)
+        .limit(JOB_CHUNK_SIZE)
+    )
+    if job.cursor is not None:
+        query = query.where(Reviewer.pull_request_id > job.cursor)
+    pr_ids = db.scalars(query).all() if user_ids else []
+    removed, added = crud.reassign_open_reviews(db, team_name, user_ids, pr_ids) if pr_ids else ([], [])
+
+    now = datetime.utcnow()
+    reassigned = list(dict.fromkeys(pr_id for pr_id, _ in removed))
+    values = {
+        "processed": Job.processed + len(pr_ids),
+        "cursor": pr_ids[-1] if pr_ids else job.cursor,
+        "result": crud.job_result(reassigned, job.result),
+        "locked_until": now + timedelta(seconds=JOB_LEASE_SECONDS),
+    }
+    if len(pr_ids) < JOB_CHUNK_SIZE:
+        values.update(status="DONE", locked_until=None, finished_at=now)
+    updated = db.execute(
+        update(Job)
+        .where(Job.job_id == job.job_id, Job.attempts == job.attempts)
+        .values(**values)
+        .returning(Job.__table__)
+    ).first()
+    if updated is None:
+        db.rollback()
+        return None
+    db.commit()
+    crud.reviewers_replaced(removed, added)
+    return updated
+
+
+def _fail(db: Session, job, exc: Exception):
+    db.rollback()
+    failed = job.attempts >= JOB_MAX_ATTEMPTS
+    db.execute(
+        update(Job)
+        .where(Job.job_id == job.job_id, Job.attempts == job.attempts)
+        .values(
+            status="FAILED" if failed else "QUEUED",
+            error=f"{type(exc).__name__}: {exc}"[:500],
+            locked_until=None,
+            finished_at=datetime.utcnow() if failed else None,
+        )
+    )
+    db.commit()
+
+
+def process_next(session_factory: sessionmaker, stopped: threading.Event | None = None) -> bool:
+    """Выполняет одно задание из очереди; False, если очередь пуста."""
+    with session_factory() as db:
+        job = claim(db)
+        if job is None:
+            return False
+        try:
+            while job is not None and job.status == "RUNNING":
+                if stopped is not None and stopped.is_set():
+                    # Аренда истекает сразу: задание продолжит другой воркер
+                    db.execute(update(Job).where(Job.job_id == job.job_id, Job.attempts == job.attempts)
+                               .values(locked_until=datetime.utcnow()))
+                    db.commit()
+                    break
+                job = run_chunk(db, job)
+        except Exception as exc:
+            logger.exception("job %s failed", job.job_id)
+            _fail(db, job, exc)
+        return True
+
+
+def run_pending(session_factory: sessionmaker) -> int:
+    """Выполняет задания, пока очередь не опустеет (тесты, бенчмарки); возвращает их число."""
+    done = 0
+    while process_next(session_factory):
+        done += 1
+    return done
+
+
+class JobWorker(threading.Thread):
+    def __init__(self, session_factory: sessionmaker, number: int):
+        super().__init__(name=f"job-worker-{number}", daemon=True)
+        self.session_factory = session_factory
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+        _wake.set()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                busy = process_next(self.session_factory, self._stopped)
+            except Exception:
+                logger.exception("job worker failed")
+                busy = False
+            if not busy:
+                _wake.wait(JOB_POLL_INTERVAL)
+                _wake.clear()
+
+
+def start_workers(session_factory: sessionmaker, count: int = JOB_WORKERS) -> list[JobWorker]:
+    workers = [JobWorker(session_factory, number) for number in range(count)]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+def stop_workers(workers: list[JobWorker], timeout: float = 10.0):
+    # Текущая пачка дописывается, незаконченное задание подхватит другой процесс
+    for worker in workers:
+        worker.stop()
+    for worker in workers:
+        worker.join(timeout)
+
+
+if __name__ == "__main__":
+    # Процесс только с воркерами: до SIGTERM или Ctrl+C
+    logging.basicConfig(level=logging.INFO)
+    stopped = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stopped.set())
+    workers = start_workers(database.get_sessionmaker())
+    stopped.wait()
+    stop_workers(workers)
@@ -0,0 +1,240 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+
+from starlette.routing import Match
+
+from . import database, metrics, serializers
+
+# --- Ограничение нагрузки ---
+# LimitMiddleware пропускает запрос к обработчику только при свободных ресурсах:
+#   1. Токен-бакет клиента: RATE_LIMIT_RPS запросов в секунду со всплеском до
+#      RATE_LIMIT_BURST; сверх него — 429 с Retry-After. По умолчанию выключен:
+#      за NAT или ingress все клиенты приходят с одного адреса соединения, и
+#      лимит на клиента становится общим. Включать вместе с
+#      RATE_LIMIT_CLIENT_HEADER, который выставляет доверенный прокси.
+#   2. Слот маршрута: тяжелые эндпоинты объявляют декоратором @concurrency(n),
+#      сколько их запросов выполняется одновременно в процессе (ROUTE_CONCURRENCY
+#      переопределяет значения). Сумма лимитов меньше DB_CONCURRENCY, поэтому
+#      массовые операции не занимают все соединения пула.
+#   3. Слот БД: эндпоинты, зависящие от database.get_session, держат
+#      соединение пула, их одновременно не больше DB_CONCURRENCY (по умолчанию
+#      пул + overflow).
+# Слоты ждут в очереди не дольше BACKPRESSURE_DEADLINE с момента прихода
+# запроса, затем 503: запрос не висит в ожидании соединения DB_POOL_TIMEOUT
+# секунд, а очередь не растет без предела. Лимиты действуют в пределах одного
+# процесса uvicorn. Проверки здоровья и /metrics не ограничиваются.
+
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "0"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "200"))
+# Заголовок с адресом клиента за прокси (например X-Forwarded-For); по умолчанию — адрес соединения
+RATE_LIMIT_CLIENT_HEADER = os.getenv("RATE_LIMIT_CLIENT_HEADER", "").lower()
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000"))
+DB_CONCURRENCY = int(os.getenv("DB_CONCURRENCY", str(database.DB_POOL_SIZE + database.DB_MAX_OVERFLOW)))
+BACKPRESSURE_DEADLINE = float(os.getenv("BACKPRESSURE_DEADLINE", "1.0"))
+# "/team/deactivateMembers=1,/import=2": лимиты маршрутов вместо объявленных в коде
+ROUTE_CONCURRENCY = {
+    path.strip(): int(limit)
+    for path, _, limit in (item.partition("=") for item in os.getenv("ROUTE_CONCURRENCY", "").split(","))
+    if path.strip()
+}
+
+UNLIMITED_PATHS = {"/healthz", "/readyz", "/metrics"}
+# Сколько пар (метод, путь) запоминает поиск маршрута
+ROUTE_CACHE_SIZE = 1024
+
+metrics.registry.counter("http_rejected_total", "HTTP requests rejected by rate or concurrency limits", ("route", "reason"))
+metrics.registry.histogram("http_admission_wait_seconds", "Time spent waiting for route and database slots", ("route",))
+
+
+def concurrency(limit: int):
+    def decorate(endpoint):
+        endpoint.max_concurrency = limit
+        return endpoint
+    return decorate
+
+
+class TokenBuckets:
+    """Токен-бакеты по клиентам; давно не приходившие клиенты вытесняются (LRU)."""
+
+    def __init__(self, rate: float, burst: float, max_clients: int = RATE_LIMIT_MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def take(self, client: str, now: float | None = None) -> float:
+        """Списывает токен; 0 — запрос разрешен, иначе через сколько секунд появится токен."""
+        now = time.monotonic() if now is None else now
+        tokens, updated = self._buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[client] = (tokens, now)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        self._buckets.clear()
+
+
+class Slots:
+    """
+    Семафор с очередью FIFO и ожиданием не дольше timeout. В отличие от
+    asyncio.Semaphore не привязан к циклу событий и не теряет слот, если
+    ожидание отменено в момент передачи.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    async def acquire(self, timeout: float) -> bool:
+        if self.used < self.limit and not self._waiters:
+            self.used += 1
+            return True
+        if timeout <= 0:
+            return False
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        expire = loop.call_later(timeout, lambda: waiter.done() or waiter.set_result(False))
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            # Слот мог быть передан этому запросу до отмены
+            if waiter.done() and not waiter.cancelled() and waiter.result():
+                self.release()
+            raise
+        finally:
+            expire.cancel()
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self):
+        # Слот передается первому живому ожидающему, used не меняется
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.used -= 1
+
+
+buckets = TokenBuckets(RATE_LIMIT_RPS, RATE_LIMIT_BURST) if RATE_LIMIT_RPS > 0 else None
+db_slots = Slots(DB_CONCURRENCY)
+_route_slots: dict[str, Slots] = {}
+
+
+def _route_limit(route) -> int | None:
+    return ROUTE_CONCURRENCY.get(route.path, getattr(route.endpoint, "max_concurrency", None))
+
+
+def uses_db(route) -> bool:
+    """Зависит ли маршрут (в том числе через вложенные зависимости) от database.get_session."""
+    dependant = getattr(route, "dependant", None)
+    pending = list(dependant.dependencies) if dependant is not None else []
+    while pending:
+        dependency = pending.pop()
+        if dependency.call is database.get_session:
+            return True
+        pending.extend(dependency.dependencies)
+    return False
+
+
+def _slots_for(route, needs_db: bool) -> list[Slots]:
+    slots = []
+    limit = _route_limit(route)
+    if limit is not None:
+        if route.path not in _route_slots:
+            _route_slots[route.path] = Slots(limit)
+        slots.append(_route_slots[route.path])
+    if database.STORAGE_BACKEND == "sql" and needs_db:
+        slots.append(db_slots)
+    return slots
+
+
+def _match(scope):
+    # Маршрутизация еще не выполнена: тот же поиск, что в Router, без обработки
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route
+    return None
+
+
+def _client(scope) -> str:
+    if RATE_LIMIT_CLIENT_HEADER:
+        for name, value in scope["headers"]:
+            if name.decode("latin-1") == RATE_LIMIT_CLIENT_HEADER:
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else ""
+
+
+class LimitMiddleware:
+    def __init__(self, app):
+        self.app = app
+        # (метод, путь) -> (маршрут, нужен ли слот БД): маршрут ищется один раз на путь
+        self._routes: dict[tuple[str, str], tuple] = {}
+
+    def _resolve(self, scope) -> tuple:
+        key = (scope["method"], scope["path"])
+        resolved = self._routes.get(key)
+        if resolved is None:
+            route = _match(scope)
+            resolved = (route, route is not None and uses_db(route))
+            # Несуществующие пути не запоминаются: их множество не ограничено
+            if route is not None and len(self._routes) < ROUTE_CACHE_SIZE:
+                self._routes[key] = resolved
+        return resolved
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        route, needs_db = self._resolve(scope)
+        if route is None or route.path in UNLIMITED_PATHS:
+            return await self.app(scope, receive, send)
+
+        if buckets is not None:
+            wait = buckets.take(_client(scope))
+            if wait:
+                return await self._reject(scope, receive, send, route, status_code=429, code="RATE_LIMITED",
+                                          message="too many requests", retry_after=wait)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        acquired = []
+        try:
+            for slots in _slots_for(route, needs_db):
+                if not await slots.acquire(started + BACKPRESSURE_DEADLINE - loop.time()):
+                    reason = "db" if slots is db_slots else "route"
+                    return await self._reject(scope, receive, send, route, status_code=503, code="OVERLOADED",
+                                              message=f"server is busy ({reason} concurrency limit)", retry_after=1)
+                acquired.append(slots)
+            if acquired:
+                metrics.registry.observe("http_admission_wait_seconds", (route.path,), loop.time() - started)
+            await self.app(scope, receive, send)
+        finally:
+            for slots in acquired:
+                slots.release()
+
+    @staticmethod
+    async def _reject(scope, receive, send, route, status_code: int, code: str, message: str, retry_after: float):
+        # Маршрут в scope — для метки route в метриках MetricsMiddleware
+        scope["route"] = route
+        reason = "rate" if status_code == 429 else "overloaded"
+        metrics.registry.inc("http_rejected_total", (route.path, reason))
+        response = serializers.ORJSONResponse(
+            {"error": {"code": code, "message": message}},
+            status_code=status_code,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+        await response(scope, receive, send)
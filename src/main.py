@@ -1,20 +1,80 @@
-from fastapi import FastAPI, Depends, HTTPException, Request, status, Body
-from fastapi.responses import JSONResponse, RedirectResponse
-from sqlalchemy.orm import Session
-from typing import List
-import random
-from datetime import datetime
+from fastapi import FastAPI, Depends, HTTPException, Request, status, Body, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
+from contextlib import asynccontextmanager
+import asyncio
+import os
+import time
+from datetime import date
+from typing import List, Literal, Optional
 
-from . import crud, schemas, database
+from . import async_crud, cache, crud, jobs, limits, memory_store, metrics, schemas, database, migrations, serializers, transfer
 
-# Создаем таблицы в БД при старте
-database.Base.metadata.create_all(bind=database.engine)
+# Импорт модуля не открывает соединений: движки создаются, пул прогревается и
+# (при DB_MIGRATE_ON_STARTUP=true) применяются миграции в lifespan. В docker-compose
+# миграции выполняются один раз отдельной командой до старта воркеров.
+DB_MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+
+# Отсчет времени холодного старта — с импорта приложения до готовности
+_IMPORTED_AT = time.perf_counter()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    listener = None
+    workers = []
+    if database.STORAGE_BACKEND == "sql":
+        engine = database.get_engine()
+        metrics.instrument_engine(engine, "sync")
+        if database.get_async_engine() is not None:
+            metrics.instrument_engine(database.get_async_engine().sync_engine, "async")
+        if DB_MIGRATE_ON_STARTUP:
+            await asyncio.to_thread(migrations.upgrade, engine)
+        await database.warm_up_pools()
+        listener = cache.start_listener(engine)
+        if jobs.JOB_WORKERS_ENABLED:
+            workers = jobs.start_workers(database.get_sessionmaker())
+    else:
+        # Восстановление из снимка и WAL до первого запроса
+        await asyncio.to_thread(memory_store.get_store)
+    app.state.startup_seconds = time.perf_counter() - _IMPORTED_AT
+    app.state.ready = True
+    yield
+    app.state.ready = False
+    if listener is not None:
+        listener.stop()
+    await asyncio.to_thread(jobs.stop_workers, workers)
+    # Финальный снимок in-memory хранилища: следующий старт не переигрывает WAL
+    memory_store.close_store()
+    await database.dispose_engines()
 
 app = FastAPI(
     title="Avito",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+# --- Ограничение нагрузки ---
+# Добавлено раньше метрик, поэтому выполняется внутри MetricsMiddleware:
+# отклоненные запросы (429, 503) попадают в http_requests_total.
+app.add_middleware(limits.LimitMiddleware)
+
+# --- Метрики ---
+app.add_middleware(metrics.MetricsMiddleware)
+
+@metrics.registry.collector
+def startup_metrics():
+    startup_seconds = getattr(app.state, "startup_seconds", None)
+    if startup_seconds is not None:
+        yield "app_startup_seconds", "gauge", "Time from app import to readiness", {((), ()): round(startup_seconds, 4)}
+
+@metrics.registry.collector
+def cache_metrics():
+    stats = cache.stats()
+    for field, kind in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"), ("size", "gauge")):
+        name = f"cache_{field}_total" if kind == "counter" else f"cache_{field}"
+        samples = {(("cache",), (cache_name,)): values[field] for cache_name, values in stats.items()}
+        yield name, kind, f"Team/user cache {field}", samples
+
 # --- Кастомный обработчик ошибок ---
 class DomainException(HTTPException):
     def __init__(self, status_code: int, code: str, message: str):
@@ -24,40 +84,97 @@ class DomainException(HTTPException):
 async def domain_exception_handler(request: Request, exc: DomainException):
     return JSONResponse(status_code=exc.status_code, content=exc.detail)
 
-# --- Вспомогательная функция для форматирования PR ---
-def format_pr_response(db_pr: database.PullRequest) -> schemas.PullRequest:
-    return schemas.PullRequest(
-        pull_request_id=db_pr.pull_request_id,
-        pull_request_name=db_pr.pull_request_name,
-        author_id=db_pr.author_id,
-        status=db_pr.status,
-        assigned_reviewers=db_pr.reviewers.split(',') if db_pr.reviewers else [],
-        createdAt=db_pr.created_at,
-        mergedAt=db_pr.merged_at
-    )
+# Ответы собираются в src/serializers.py и отдаются как ORJSONResponse: FastAPI
+# не валидирует возвращенный Response по response_model, модель остается только
+# для OpenAPI. Формат ответа совпадает со схемами из schemas.py.
 
 # --- Эндпоинты ---
+# @metrics.query_budget(n) — число SQL-запросов эндпоинта при холодном кэше
+# (одна попытка для reassign), см. tests/test_query_budget.py.
+# @limits.concurrency(n) — сколько запросов массового эндпоинта выполняется
+# одновременно в процессе. Сумма лимитов (21) меньше limits.DB_CONCURRENCY по
+# умолчанию (30), поэтому создание, merge и reassign одиночных PR не остаются
+# без соединений.
 
 @app.get("/", include_in_schema=False)
 async def root_redirect():
     return RedirectResponse(url="/docs")
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/healthz", tags=["Service"])
+async def healthz():
+    """Liveness: процесс отвечает, зависимости не проверяются."""
+    return {"status": "ok"}
+
+@app.get("/readyz", tags=["Service"])
+async def readyz():
+    """Readiness: старт завершен (миграции, прогрев пула) и хранилище отвечает."""
+    if not getattr(app.state, "ready", False):
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "starting"})
+    try:
+        await database.ping()
+    except Exception as exc:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "unavailable", "error": type(exc).__name__},
+        )
+    return {"status": "ready", "startup_seconds": round(app.state.startup_seconds, 3)}
+
+@app.get("/export", tags=["Service"], response_class=StreamingResponse)
+@metrics.query_budget(len(transfer.TABLES))
+@limits.concurrency(2)
+async def export_data(db: database.AnySession = Depends(database.get_session)):
+    """Все данные в NDJSON, по строке на запись таблицы; отдается потоком по мере чтения."""
+    # Сессия из Depends живет, пока ответ не отправлен целиком, только начиная с
+    # FastAPI 0.118 (в 0.106–0.117 она закрывалась до первого чанка): нижняя
+    # граница версии — в requirements.txt
+    return StreamingResponse(
+        transfer.export_ndjson(db),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="avito-export.ndjson"'},
+    )
+
+@app.post("/import", response_model=schemas.ImportResponse, tags=["Service"])
+@metrics.query_budget(None)
+@limits.concurrency(1)
+async def import_data(request: Request, db: database.AnySession = Depends(database.get_session)):
+    """Загрузка NDJSON в формате /export; тело читается потоком, запись пачками."""
+    try:
+        imported = await transfer.import_ndjson(db, request.stream())
+    except ValueError as exc:
+        raise DomainException(status.HTTP_400_BAD_REQUEST, "INVALID_IMPORT", str(exc))
+    return serializers.ORJSONResponse({"imported": imported})
+
+@app.get("/cache/stats", tags=["Service"])
+async def cache_stats():
+    return cache.stats()
+
 @app.post("/team/add", response_model=schemas.TeamResponse, status_code=status.HTTP_201_CREATED, tags=["Teams"])
-def add_team(
+@metrics.query_budget(4)
+async def add_team(
     team_data: schemas.TeamAddRequest = Body(..., example={"team_name": "backend-squad", "members": [{"user_id": "u1", "username": "Alice", "is_active": True}]}), 
-    db: Session = Depends(database.get_db)
+    db: database.AnySession = Depends(database.get_session)
 ):
-    if crud.get_team_by_name(db, team_data.team_name):
+    if await async_crud.get_team_by_name(db, team_data.team_name):
         raise DomainException(status.HTTP_400_BAD_REQUEST, "TEAM_EXISTS", "team_name already exists")
-    db_team = crud.create_team_with_members(db, team_data)
-    return schemas.TeamResponse(team=schemas.Team.from_orm(db_team))
+    try:
+        team = await async_crud.create_team_with_members(db, team_data)
+    except crud.AlreadyExists:
+        # Та же команда создана параллельным запросом после проверки выше
+        raise DomainException(status.HTTP_400_BAD_REQUEST, "TEAM_EXISTS", "team_name already exists")
+    return serializers.ORJSONResponse({"team": serializers.team(team)}, status_code=status.HTTP_201_CREATED)
 
 # 🆕 NOVO ENDPOINT: Adicionar membros a uma equipe existente
 @app.post("/team/addMembers", response_model=schemas.TeamResponse, status_code=status.HTTP_201_CREATED, tags=["Teams"])
-def add_team_members(
+@metrics.query_budget(3)
+@limits.concurrency(4)
+async def add_team_members(
     team_name: str = Body(..., embed=True),
     members: List[schemas.TeamMember] = Body(..., embed=True, example=[{"user_id": "u3", "username": "Bob", "is_active": True}]),
-    db: Session = Depends(database.get_db)
+    db: database.AnySession = Depends(database.get_session)
 ):
     """
     Вы добавляете новых участников в существующую команду.
@@ -72,124 +189,287 @@ def add_team_members(
         }
     """
     # Verifica se a equipe existe
-    db_team = crud.get_team_by_name(db, team_name)
+    db_team = await async_crud.get_team_by_name(db, team_name)
     if not db_team:
         raise DomainException(status.HTTP_404_NOT_FOUND, "NOT_FOUND", "team not found")
     
-    # Adiciona os novos membros
-    for member in members:
-        # Verifica se o usuário já existe
-        existing_user = crud.get_user_by_id(db, member.user_id)
-        
-        if existing_user:
-            # Se o usuário já existe, atualiza para esta equipe
-            existing_user.username = member.username
-            existing_user.team_name = team_name
-            existing_user.is_active = member.is_active
-        else:
-            # Cria novo usuário
-            db_user = database.User(
-                user_id=member.user_id,
-                username=member.username,
-                team_name=team_name,
-                is_active=member.is_active
-            )
-            db.add(db_user)
-    
-    db.commit()
-    db.refresh(db_team)
-    
-    return schemas.TeamResponse(team=schemas.Team.from_orm(db_team))
+    team = await async_crud.add_team_members(db, db_team, members)
+
+    return serializers.ORJSONResponse({"team": serializers.team(team)}, status_code=status.HTTP_201_CREATED)
+
+@app.post("/team/sync", response_model=schemas.TeamSyncResponse, tags=["Teams"])
+@metrics.query_budget(4)
+@limits.concurrency(2)
+async def sync_teams(
+    request: schemas.TeamSyncRequest = Body(..., example={"teams": [{"team_name": "backend-squad", "members": [{"user_id": "u1", "username": "Alice", "is_active": True}]}]}),
+    db: database.AnySession = Depends(database.get_session)
+):
+    """
+    Массовая синхронизация команд (например, из HR-системы): отсутствующие команды
+    создаются, участники добавляются или обновляются. Участники, которых нет в запросе,
+    остаются в команде.
+    """
+    teams = await async_crud.sync_teams(db, request.teams)
+    return serializers.ORJSONResponse({"teams": [serializers.team(team) for team in teams]})
 
 @app.get("/team/get", response_model=schemas.Team, tags=["Teams"])
-def get_team(team_name: str, db: Session = Depends(database.get_db)):
-    db_team = crud.get_team_by_name(db, team_name)
+@metrics.query_budget(1)
+async def get_team(team_name: str, db: database.AnySession = Depends(database.get_session)):
+    db_team = await async_crud.get_team_by_name(db, team_name)
     if not db_team:
         raise DomainException(status.HTTP_404_NOT_FOUND, "NOT_FOUND", "team not found")
-    return schemas.Team.from_orm(db_team)
+    return serializers.ORJSONResponse(serializers.team(db_team))
 
 @app.post("/team/deactivateMembers", response_model=schemas.DeactivationResponse, tags=["Teams"])
-def deactivate_team_members(
+@metrics.query_budget(9)
+@limits.concurrency(2)
+async def deactivate_team_members(
     request: schemas.DeactivateTeamMembersRequest = Body(..., example={"team_name": "backend-squad", "user_ids": ["u1"]}), 
-    db: Session = Depends(database.get_db)
+    db: database.AnySession = Depends(database.get_session)
+):
+    team = await async_crud.get_team_by_name(db, request.team_name)
+    if not team:
+        raise DomainException(status.HTTP_404_NOT_FOUND, "NOT_FOUND", "team not found")
+    reassigned_prs = await async_crud.deactivate_and_reassign(db, team, request.user_ids)
+    return serializers.ORJSONResponse({"deactivated_users": request.user_ids, "reassigned_prs": reassigned_prs})
+
+@app.post("/team/deactivateMembersAsync", response_model=schemas.JobResponse, status_code=status.HTTP_202_ACCEPTED, tags=["Teams"])
+@metrics.query_budget(4)
+@limits.concurrency(2)
+async def deactivate_team_members_async(
+    request: schemas.DeactivateTeamMembersRequest = Body(..., example={"team_name": "backend-squad", "user_ids": ["u1"]}),
+    db: database.AnySession = Depends(database.get_session)
 ):
-    team = crud.get_team_by_name(db, request.team_name)
+    """
+    Фоновый вариант /team/deactivateMembers для больших реорганизаций: пользователи
+    деактивируются сразу, открытые ревью переназначаются воркерами пачками по
+    JOB_CHUNK_SIZE PR. Прогресс и результат — на /jobs/{job_id}.
+    """
+    team = await async_crud.get_team_by_name(db, request.team_name)
     if not team:
         raise DomainException(status.HTTP_404_NOT_FOUND, "NOT_FOUND", "team not found")
-    reassigned_prs = crud.deactivate_and_reassign(db, team, request.user_ids)
-    return schemas.DeactivationResponse(deactivated_users=request.user_ids, reassigned_prs=reassigned_prs)
+    job = await async_crud.enqueue_deactivation(db, team, request.user_ids)
+    jobs.notify()
+    return serializers.ORJSONResponse({"job": serializers.job(job)}, status_code=status.HTTP_202_ACCEPTED)
+
+@app.get("/jobs/{job_id}", response_model=schemas.JobResponse, tags=["Jobs"])
+@metrics.query_budget(1)
+async def get_job(job_id: str, db: database.AnySession = Depends(database.get_session)):
+    job = await async_crud.get_job(db, job_id)
+    if not job:
+        raise DomainException(status.HTTP_404_NOT_FOUND, "NOT_FOUND", "job not found")
+    return serializers.ORJSONResponse({"job": serializers.job(job)})
 
 @app.post("/users/setIsActive", response_model=schemas.UserResponse, tags=["Users"])
-def set_user_is_active(
+@metrics.query_budget(1)
+async def set_user_is_active(
     request: schemas.SetUserActiveRequest = Body(..., example={"user_id": "u1", "is_active": False}), 
-    db: Session = Depends(database.get_db)
+    db: database.AnySession = Depends(database.get_session)
 ):
-    user = crud.set_user_active(db, request.user_id, request.is_active)
+    user = await async_crud.set_user_active(db, request.user_id, request.is_active)
     if not user:
         raise DomainException(status.HTTP_404_NOT_FOUND, "NOT_FOUND", "user not found")
-    return schemas.UserResponse(user=schemas.User.from_orm(user))
+    return serializers.ORJSONResponse({"user": serializers.user(user)})
 
 @app.get("/users/getReview", response_model=schemas.UserReviewResponse, tags=["Users"])
-def get_user_reviews(user_id: str, db: Session = Depends(database.get_db)):
-    if not crud.get_user_by_id(db, user_id):
+@metrics.query_budget(3)
+async def get_user_reviews(
+    user_id: str,
+    status_filter: Optional[Literal["OPEN", "MERGED"]] = Query(None, alias="status"),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: database.AnySession = Depends(database.get_session)
+):
+    """
+    PR, где пользователь ревьюер, от новых к старым. Без `limit` и `cursor` — все
+    PR одним ответом, как до пагинации; с ними — страница (по умолчанию 100),
+    следующая запрашивается по `next_cursor`.
+    """
+    try:
+        after = crud.decode_review_cursor(cursor) if cursor else None
+    except ValueError:
+        raise DomainException(status.HTTP_400_BAD_REQUEST, "INVALID_CURSOR", "cursor is malformed")
+    if limit is None and after is not None:
+        limit = crud.REVIEW_PAGE_SIZE
+    if not await async_crud.get_user_by_id(db, user_id):
         raise DomainException(status.HTTP_404_NOT_FOUND, "NOT_FOUND", "user not found")
-    prs = crud.get_reviews_for_user(db, user_id)
-    return schemas.UserReviewResponse(user_id=user_id, pull_requests=[schemas.PullRequestShort.from_orm(pr) for pr in prs])
+    rows, next_cursor = await async_crud.get_reviews_for_user(db, user_id, status_filter, limit, after)
+    return serializers.ORJSONResponse({
+        "user_id": user_id,
+        "pull_requests": [serializers.pull_request_short(row) for row in rows],
+        "next_cursor": next_cursor,
+    })
 
 @app.post("/pullRequest/create", response_model=schemas.PullRequestResponse, status_code=status.HTTP_201_CREATED, tags=["PullRequests"])
-def create_pull_request(
+@metrics.query_budget(8)
+async def create_pull_request(
     pr_data: schemas.PullRequestCreateRequest = Body(..., example={"pull_request_id": "pr-1001", "pull_request_name": "New feature", "author_id": "u1"}), 
-    db: Session = Depends(database.get_db)
+    db: database.AnySession = Depends(database.get_session)
 ):
-    if crud.get_pr_by_id(db, pr_data.pull_request_id):
+    if await async_crud.get_pr_by_id(db, pr_data.pull_request_id):
         raise DomainException(status.HTTP_409_CONFLICT, "PR_EXISTS", "PR id already exists")
-    author = crud.get_user_by_id(db, pr_data.author_id)
-    if not author or not author.team:
+    author = await async_crud.get_user_by_id(db, pr_data.author_id)
+    if not author or not author.team_name:
         raise DomainException(status.HTTP_404_NOT_FOUND, "NOT_FOUND", "author or author's team not found")
-    candidates = [m for m in author.team.members if m.is_active and m.user_id != author.user_id]
-    random.shuffle(candidates)
-    reviewer_ids = [r.user_id for r in candidates[:2]]
-    db_pr = crud.create_pr(db, pr_data, reviewer_ids)
-    return schemas.PullRequestResponse(pr=format_pr_response(db_pr))
+    reviewer_ids = await async_crud.choose_reviewers(db, author.team_name, exclude={author.user_id})
+    try:
+        db_pr = await async_crud.create_pr(db, pr_data, reviewer_ids)
+    except crud.AlreadyExists:
+        raise DomainException(status.HTTP_409_CONFLICT, "PR_EXISTS", "PR id already exists")
+    return serializers.ORJSONResponse({"pr": serializers.pull_request(db_pr)}, status_code=status.HTTP_201_CREATED)
+
+@app.post("/pullRequest/createBatch", response_model=schemas.PullRequestBatchResponse, tags=["PullRequests"])
+@metrics.query_budget(8)
+@limits.concurrency(4)
+async def create_pull_requests_batch(
+    request: schemas.PullRequestBatchCreateRequest = Body(..., example={"pull_requests": [{"pull_request_id": "pr-1001", "pull_request_name": "New feature", "author_id": "u1"}]}),
+    db: database.AnySession = Depends(database.get_session)
+):
+    results = await async_crud.create_prs_batch(db, request.pull_requests)
+    return serializers.ORJSONResponse({"results": [serializers.batch_result(pr_id, db_pr, error) for pr_id, db_pr, error in results]})
 
 @app.post("/pullRequest/merge", response_model=schemas.PullRequestResponse, tags=["PullRequests"])
-def merge_pull_request(
+@metrics.query_budget(4)
+async def merge_pull_request(
     request: schemas.PullRequestMergeRequest = Body(..., example={"pull_request_id": "pr-1001"}), 
-    db: Session = Depends(database.get_db)
+    db: database.AnySession = Depends(database.get_session)
 ):
-    db_pr = crud.get_pr_by_id(db, request.pull_request_id)
+    db_pr = await async_crud.merge_pr(db, request.pull_request_id)
     if not db_pr:
         raise DomainException(status.HTTP_404_NOT_FOUND, "NOT_FOUND", "PR not found")
-    if db_pr.status != "MERGED":
-        db_pr.status = "MERGED"
-        db_pr.merged_at = datetime.utcnow()
-        db.commit()
-        db.refresh(db_pr)
-    return schemas.PullRequestResponse(pr=format_pr_response(db_pr))
+    return serializers.ORJSONResponse({"pr": serializers.pull_request(db_pr)})
+
+@app.post("/pullRequest/mergeBatch", response_model=schemas.PullRequestBatchResponse, tags=["PullRequests"])
+@metrics.query_budget(4)
+@limits.concurrency(4)
+async def merge_pull_requests_batch(
+    request: schemas.PullRequestBatchMergeRequest = Body(..., example={"pull_request_ids": ["pr-1001", "pr-1002"]}),
+    db: database.AnySession = Depends(database.get_session)
+):
+    merged = await async_crud.merge_prs_batch(db, request.pull_request_ids)
+    not_found = ("NOT_FOUND", "PR not found")
+    return serializers.ORJSONResponse({"results": [
+        serializers.batch_result(pr_id, merged[pr_id]) if pr_id in merged else serializers.batch_result(pr_id, error=not_found)
+        for pr_id in request.pull_request_ids
+    ]})
 
 @app.post("/pullRequest/reassign", response_model=schemas.ReassignResponse, tags=["PullRequests"])
-def reassign_reviewer(
+@metrics.query_budget(9)
+async def reassign_reviewer(
     request: schemas.PullRequestReassignRequest = Body(..., example={"pull_request_id": "pr-1001", "old_user_id": "u2"}), 
-    db: Session = Depends(database.get_db)
+    db: database.AnySession = Depends(database.get_session)
 ):
-    db_pr = crud.get_pr_by_id(db, request.pull_request_id)
-    if not db_pr:
+    for _ in range(crud.VERSION_RETRIES):
+        db_pr = await async_crud.get_pr_by_id(db, request.pull_request_id)
+        if not db_pr:
+            raise DomainException(status.HTTP_404_NOT_FOUND, "NOT_FOUND", "PR not found")
+        if db_pr.status == "MERGED":
+            raise DomainException(status.HTTP_409_CONFLICT, "PR_MERGED", "cannot reassign on merged PR")
+        reviewers = db_pr.reviewer_ids
+        if request.old_user_id not in reviewers:
+            raise DomainException(status.HTTP_409_CONFLICT, "NOT_ASSIGNED", "reviewer is not assigned to this PR")
+        old_reviewer = await async_crud.get_user_by_id(db, request.old_user_id)
+        if not old_reviewer or not old_reviewer.team_name:
+            raise DomainException(status.HTTP_404_NOT_FOUND, "NOT_FOUND", "old reviewer's team not found")
+        candidates = await async_crud.choose_reviewers(db, old_reviewer.team_name, exclude={db_pr.author_id, *reviewers}, k=1)
+        if not candidates:
+            raise DomainException(status.HTTP_409_CONFLICT, "NO_CANDIDATE", "no active replacement candidate in team")
+        new_reviewer_id = candidates[0]
+        try:
+            db_pr = await async_crud.replace_reviewer(db, db_pr, request.old_user_id, new_reviewer_id)
+        except crud.VersionConflict:
+            continue
+        return serializers.ORJSONResponse({"pr": serializers.pull_request(db_pr), "replaced_by": new_reviewer_id})
+    raise DomainException(status.HTTP_409_CONFLICT, "CONFLICT", "PR is being modified concurrently, retry later")
+
+@app.get("/pullRequest/history", response_model=schemas.PullRequestHistoryResponse, tags=["PullRequests"])
+@metrics.query_budget(2)
+async def get_pull_request_history(
+    pull_request_id: str,
+    db: database.AnySession = Depends(database.get_session)
+):
+    """События PR в порядке записи: создание, назначения, переназначения, merge."""
+    events = await async_crud.get_pr_events(db, pull_request_id)
+    # PR без событий — созданный до появления журнала или несуществующий
+    if not events and not await async_crud.get_pr_by_id(db, pull_request_id):
         raise DomainException(status.HTTP_404_NOT_FOUND, "NOT_FOUND", "PR not found")
-    if db_pr.status == "MERGED":
-        raise DomainException(status.HTTP_409_CONFLICT, "PR_MERGED", "cannot reassign on merged PR")
-    reviewers = db_pr.reviewers.split(',') if db_pr.reviewers else []
-    if request.old_user_id not in reviewers:
-        raise DomainException(status.HTTP_409_CONFLICT, "NOT_ASSIGNED", "reviewer is not assigned to this PR")
-    old_reviewer = crud.get_user_by_id(db, request.old_user_id)
-    if not old_reviewer or not old_reviewer.team:
-        raise DomainException(status.HTTP_404_NOT_FOUND, "NOT_FOUND", "old reviewer's team not found")
-    candidates = [m for m in old_reviewer.team.members if m.is_active and m.user_id != db_pr.author_id and m.user_id not in reviewers]
-    if not candidates:
-        raise DomainException(status.HTTP_409_CONFLICT, "NO_CANDIDATE", "no active replacement candidate in team")
-    new_reviewer = random.choice(candidates)
-    reviewers.remove(request.old_user_id)
-    reviewers.append(new_reviewer.user_id)
-    db_pr.reviewers = ",".join(reviewers)
-    db.commit()
-    db.refresh(db_pr)
-    return schemas.ReassignResponse(pr=format_pr_response(db_pr), replaced_by=new_reviewer.user_id)
+    return serializers.ORJSONResponse({
+        "pull_request_id": pull_request_id,
+        "events": [serializers.pr_event(row) for row in events],
+    })
+
+@app.get("/stats/assignments", response_model=schemas.AssignmentStatsResponse, tags=["Stats"])
+@metrics.query_budget(2)
+async def get_assignment_stats(
+    team_name: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    db: database.AnySession = Depends(database.get_session)
+):
+    """
+    Количество назначений по пользователям за период (даты в UTC, включительно):
+    назначения на ревью, снятия с ревью при переназначении, завершенные ревью,
+    созданные и замерженные PR автора.
+    """
+    if team_name is not None and not await async_crud.get_team_by_name(db, team_name):
+        raise DomainException(status.HTTP_404_NOT_FOUND, "NOT_FOUND", "team not found")
+    rows = await async_crud.get_assignment_stats(db, team_name, date_from, date_to)
+    return serializers.ORJSONResponse({
+        "team_name": team_name,
+        "date_from": date_from,
+        "date_to": date_to,
+        "users": [serializers.user_stats(row) for row in rows],
+    })
+
+@app.get("/stats/teams", response_model=schemas.TeamStatsResponse, tags=["Stats"])
+@metrics.query_budget(2)
+async def get_team_stats(
+    team_name: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    db: database.AnySession = Depends(database.get_session)
+):
+    if team_name is not None and not await async_crud.get_team_by_name(db, team_name):
+        raise DomainException(status.HTTP_404_NOT_FOUND, "NOT_FOUND", "team not found")
+    rows = await async_crud.get_team_stats(db, team_name, date_from, date_to)
+    return serializers.ORJSONResponse({
+        "date_from": date_from,
+        "date_to": date_to,
+        "teams": [serializers.team_stats(row) for row in rows],
+    })
+
+@app.get("/stats/timeToMerge", response_model=schemas.TimeToMergeResponse, tags=["Stats"])
+@metrics.query_budget(2)
+async def get_time_to_merge(
+    team_name: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    db: database.AnySession = Depends(database.get_session)
+):
+    """Время от создания до merge по командам автора для PR, замерженных в окне дат."""
+    if team_name is not None and not await async_crud.get_team_by_name(db, team_name):
+        raise DomainException(status.HTTP_404_NOT_FOUND, "NOT_FOUND", "team not found")
+    rows = await async_crud.get_time_to_merge(db, team_name, date_from, date_to)
+    return serializers.ORJSONResponse({
+        "date_from": date_from,
+        "date_to": date_to,
+        "teams": [serializers.time_to_merge(row) for row in rows],
+    })
+
+@app.get("/stats/reassignmentRate", response_model=schemas.ReassignmentRateResponse, tags=["Stats"])
+@metrics.query_budget(2)
+async def get_reassignment_rate(
+    team_name: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    db: database.AnySession = Depends(database.get_session)
+):
+    """Доля переназначений среди назначений ревьюеров в окне дат, по командам автора PR."""
+    if team_name is not None and not await async_crud.get_team_by_name(db, team_name):
+        raise DomainException(status.HTTP_404_NOT_FOUND, "NOT_FOUND", "team not found")
+    rows = await async_crud.get_reassignment_rates(db, team_name, date_from, date_to)
+    return serializers.ORJSONResponse({
+        "date_from": date_from,
+        "date_to": date_to,
+        "teams": [serializers.reassignment_rate(row) for row in rows],
+    })
@@ -0,0 +1,905 @@
+import bisect
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, replace
+from datetime import date, datetime, timedelta
+
+from . import cache, crud, reviewer_selection, schemas, storage
+
+logger = logging.getLogger(__name__)
+
+# --- Хранилище в памяти процесса ---
+# Альтернатива SQL-базе для развертываний без внешней БД и для быстрых тестов
+# (STORAGE_BACKEND=memory). Реализует контракт storage.Storage, как и crud.py,
+# но без параметра db: async_crud.run вызывает методы у хранилища напрямую.
+#
+# Записи неизменяемы (frozen dataclass со __slots__): изменение заменяет запись
+# целиком. Все структуры меняются только в _apply под короткой общей блокировкой,
+# под ней же изменение пишется в WAL, поэтому порядок журнала совпадает с порядком
+# применения. Логика "прочитать — решить — записать" сериализуется блокировками
+# по ключу (PR, команда) и не мешает операциям над другими PR и командами.
+#
+# Долговечность (если задан MEMORY_DATA_DIR): каждое изменение — одна строка WAL;
+# раз в MEMORY_SNAPSHOT_INTERVAL секунд состояние сохраняется снимком, и WAL
+# обрезается. При старте применяется снимок, затем хвост WAL.
+
+MEMORY_DATA_DIR = os.getenv("MEMORY_DATA_DIR", "")
+MEMORY_SNAPSHOT_INTERVAL = float(os.getenv("MEMORY_SNAPSHOT_INTERVAL", "60"))
+MEMORY_WAL_FSYNC = os.getenv("MEMORY_WAL_FSYNC", "false").lower() in ("1", "true", "yes")
+# Сколько завершенных фоновых заданий помнит хранилище (в WAL они не пишутся)
+MEMORY_JOB_HISTORY = int(os.getenv("MEMORY_JOB_HISTORY", "1000"))
+
+# Записей в одной строке снимка
+_SNAPSHOT_CHUNK = 1000
+
+
+@dataclass(frozen=True, slots=True)
+class PullRequestRecord:
+    pull_request_id: str
+    pull_request_name: str
+    author_id: str
+    status: str
+    created_at: datetime
+    merged_at: datetime | None
+    reviewers: tuple[str, ...]
+    version: int = 1
+
+    @property
+    def reviewer_ids(self) -> list[str]:
+        return list(self.reviewers)
+
+
+@dataclass(frozen=True, slots=True)
+class EventRecord:
+    """Строка журнала pr_events (database.PrEvent)."""
+    event_id: int
+    occurred_at: datetime
+    event_type: str
+    pull_request_id: str
+    team_name: str | None
+    user_id: str | None
+    previous_user_id: str | None
+    pr_created_at: datetime
+
+
+@dataclass(frozen=True, slots=True)
+class JobRecord:
+    """Те же поля, что у строки таблицы jobs (database.Job)."""
+    job_id: str
+    kind: str
+    status: str
+    payload: dict
+    total: int
+    processed: int
+    result: dict
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    cursor: str | None = None
+    error: str | None = None
+    attempts: int = 0
+    locked_until: datetime | None = None
+
+
+UserStatsRow = namedtuple("UserStatsRow", ("user_id", "team_name", *crud.COUNTER_FIELDS))
+TeamStatsRow = namedtuple("TeamStatsRow", ("team_name", "members", *crud.COUNTER_FIELDS))
+TimeToMergeRow = namedtuple("TimeToMergeRow", ("team_name", "merged_prs", "avg_seconds", "max_seconds"))
+ReassignmentRow = namedtuple("ReassignmentRow", ("team_name", "assignments", "reassignments"))
+
+
+class _KeyLocks:
+    """Фиксированный набор блокировок, ключ отображается на блокировку по хэшу."""
+
+    def __init__(self, size: int = 64):
+        self._locks = [threading.Lock() for _ in range(size)]
+
+    @contextmanager
+    def hold(self, keys):
+        # Захват в порядке номеров исключает взаимоблокировки при нескольких ключах
+        indices = sorted({hash(key) % len(self._locks) for key in keys})
+        for i in indices:
+            self._locks[i].acquire()
+        try:
+            yield
+        finally:
+            for i in reversed(indices):
+                self._locks[i].release()
+
+
+# --- WAL и снимки ---
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+class WriteAheadLog:
+    """
+    snapshot.jsonl и сегменты WAL wal.<N>.jsonl в каталоге данных. Строка файла —
+    список записей одного изменения (или часть снимка), поэтому оборванная при
+    сбое последняя строка отбрасывается целиком.
+
+    Снимок начинается с заголовка {"op": "snapshot", "wal": N} и содержит все
+    изменения из сегментов с номером меньше N. Новый сегмент открывается в момент
+    снятия копии состояния, поэтому снимок пишется на диск параллельно с новыми
+    изменениями, а старые сегменты удаляются только после записи снимка. Сбой на
+    любом шаге оставляет согласованную пару «снимок + сегменты», и ни одно
+    изменение не применяется дважды.
+    """
+
+    def __init__(self, directory: str, fsync: bool = MEMORY_WAL_FSYNC):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, "snapshot.jsonl")
+        self.fsync = fsync
+        self.pending = 0
+        self.generation = 0
+        self._file = None
+
+    def segment_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"wal.{generation}.jsonl")
+
+    def _segments(self) -> list[int]:
+        generations = []
+        for name in os.listdir(self.directory):
+            number = name[len("wal."):-len(".jsonl")] if name.startswith("wal.") and name.endswith(".jsonl") else ""
+            if number.isdigit():
+                generations.append(int(number))
+        return sorted(generations)
+
+    @staticmethod
+    def _read(path: str):
+        if not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    records = json.loads(line)
+                except ValueError:
+                    logger.warning("%s:%d is truncated, ignoring the rest of the file", path, line_number)
+                    break
+                yield records
+
+    def recover(self):
+        base = 0
+        for records in self._read(self.snapshot_path):
+            if records and records[0].get("op") == "snapshot":
+                base = records[0]["wal"]
+                continue
+            yield records
+        segments = [generation for generation in self._segments() if generation >= base]
+        for generation in segments:
+            yield from self._read(self.segment_path(generation))
+        # Запись продолжается в новый сегмент, а не после возможной оборванной строки
+        self.generation = max([base, *segments]) + 1
+
+    def open(self):
+        self._file = open(self.segment_path(self.generation), "a", encoding="utf-8")
+
+    def append(self, records: list[dict]):
+        self._file.write(json.dumps(records, default=_json_default, separators=(",", ":")) + "\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.pending += 1
+
+    def rotate(self) -> int:
+        """Открывает следующий сегмент; возвращает его номер — границу снимка."""
+        self._file.close()
+        self.generation += 1
+        self.open()
+        self.pending = 0
+        return self.generation
+
+    def write_snapshot(self, chunks, generation: int):
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps([{"op": "snapshot", "wal": generation}]) + "\n")
+            for records in chunks:
+                f.write(json.dumps(records, default=_json_default, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        for old in self._segments():
+            if old < generation:
+                os.remove(self.segment_path(old))
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# --- Хранилище ---
+
+class MemoryStore(storage.Storage):
+    def __init__(self, data_dir: str = MEMORY_DATA_DIR, snapshot_interval: float = MEMORY_SNAPSHOT_INTERVAL,
+                 fsync: bool = MEMORY_WAL_FSYNC, strategy: reviewer_selection.SelectionStrategy | None = None):
+        self._teams: dict[str, dict[str, None]] = {}
+        self._users: dict[str, cache.UserSnapshot] = {}
+        self._prs: dict[str, PullRequestRecord] = {}
+        # Обратный индекс ревьюер -> PR: (user_id, status) -> [(created_at, pull_request_id)] по возрастанию
+        self._reviews: dict[tuple[str, str], list[tuple[datetime, str]]] = {}
+        # Счетчики статистики: user_id -> day -> значения в порядке crud.COUNTER_FIELDS
+        self._counters: dict[str, dict[date, list[int]]] = {}
+        # Журнал событий PR: записи по id, ключи (occurred_at, event_id) по возрастанию
+        # для выборки окна бисекцией и id событий каждого PR
+        self._events: dict[int, EventRecord] = {}
+        self._event_keys: list[tuple[datetime, int]] = []
+        self._pr_events: dict[str, list[int]] = {}
+        # Следующий id события; восстанавливается из id в снимке и импорте
+        self._next_event_id = 1
+        # Завершенные фоновые задания; в WAL и снимок не попадают
+        self._jobs: dict[str, JobRecord] = {}
+
+        self._apply_lock = threading.Lock()
+        # Снимки пишутся по одному (цикл снимков, остановка, восстановление)
+        self._snapshot_lock = threading.Lock()
+        self._team_locks = _KeyLocks()
+        self._pr_locks = _KeyLocks()
+
+        # Хранилище — единственный источник данных процесса, поэтому индекс не устаревает по TTL
+        self.index = reviewer_selection.ReviewerIndex(
+            strategy or reviewer_selection.get_strategy(reviewer_selection.REVIEWER_STRATEGY),
+            ttl=float("inf"),
+            loader=self._load_team_members,
+        )
+
+        self._snapshot_interval = snapshot_interval
+        self._stopped = threading.Event()
+        self._snapshotter = None
+        self._wal = WriteAheadLog(data_dir, fsync) if data_dir else None
+        if self._wal is not None:
+            for records in self._wal.recover():
+                for record in records:
+                    self._apply(record)
+            self._wal.open()
+            # Снимок сразу после восстановления обрезает WAL вместе с возможной оборванной строкой
+            self.snapshot()
+
+    def start(self):
+        if self._wal is not None and self._snapshot_interval > 0 and self._snapshotter is None:
+            self._snapshotter = threading.Thread(target=self._snapshot_loop, name="memory-store-snapshot", daemon=True)
+            self._snapshotter.start()
+
+    def close(self):
+        self._stopped.set()
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+            self._snapshotter = None
+        if self._wal is not None:
+            if self._wal.pending:
+                self.snapshot()
+            self._wal.close()
+
+    def snapshot(self):
+        if self._wal is None:
+            return
+        with self._snapshot_lock:
+            # Под блокировкой изменений — только копия ссылок на неизменяемые записи
+            # и переход на новый сегмент WAL; сериализация и fsync идут без нее
+            with self._apply_lock:
+                state = self._state()
+                generation = self._wal.rotate()
+            self._wal.write_snapshot(self._dump(state), generation)
+
+    def _snapshot_loop(self):
+        while not self._stopped.wait(self._snapshot_interval):
+            if self._wal.pending:
+                try:
+                    self.snapshot()
+                except Exception:
+                    logger.exception("memory store snapshot failed")
+
+    def _state(self) -> tuple:
+        counters = [(user_id, day, list(values)) for user_id, days in self._counters.items() for day, values in days.items()]
+        return list(self._teams), list(self._users.values()), list(self._prs.values()), counters, list(self._events.values())
+
+    @staticmethod
+    def _dump(state: tuple):
+        teams, users, prs, counters, events = state
+        records = itertools.chain(
+            ({"op": "team", "team_name": team_name} for team_name in teams),
+            (_user_record(user) for user in users),
+            (_pr_record(pr) for pr in prs),
+            ({"op": "count", "user_id": user_id, "day": day, "values": values} for user_id, day, values in counters),
+            ({"op": "event", **asdict(event)} for event in events),
+        )
+        while chunk := list(itertools.islice(records, _SNAPSHOT_CHUNK)):
+            yield chunk
+
+    # --- Применение изменений ---
+
+    def _commit(self, records: list[dict]):
+        with self._apply_lock:
+            self._commit_locked(records)
+
+    def _commit_locked(self, records: list[dict]):
+        # Для записей, собранных под тем же _apply_lock из текущего состояния
+        if self._wal is not None:
+            self._wal.append(records)
+        for record in records:
+            self._apply(record)
+
+    def _apply(self, record: dict):
+        op = record["op"]
+        if op == "team":
+            self._teams.setdefault(record["team_name"], {})
+        elif op == "user":
+            user = cache.UserSnapshot(record["user_id"], record["username"], record["team_name"], record["is_active"])
+            previous = self._users.get(user.user_id)
+            if previous is not None and previous.team_name and previous.team_name != user.team_name:
+                self._teams[previous.team_name].pop(user.user_id, None)
+            if user.team_name:
+                self._teams.setdefault(user.team_name, {})[user.user_id] = None
+            self._users[user.user_id] = user
+        elif op == "pr":
+            pr = PullRequestRecord(
+                pull_request_id=record["pull_request_id"],
+                pull_request_name=record["pull_request_name"],
+                author_id=record["author_id"],
+                status=record["status"],
+                created_at=_datetime(record["created_at"]),
+                merged_at=_datetime(record["merged_at"]),
+                reviewers=tuple(record["reviewers"]),
+                version=record.get("version", 1),
+            )
+            previous = self._prs.get(pr.pull_request_id)
+            if previous is not None:
+                for user_id in previous.reviewers:
+                    keys = self._reviews[(user_id, previous.status)]
+                    position = bisect.bisect_left(keys, (previous.created_at, previous.pull_request_id))
+                    del keys[position]
+            for user_id in pr.reviewers:
+                bisect.insort(self._reviews.setdefault((user_id, pr.status), []), (pr.created_at, pr.pull_request_id))
+            self._prs[pr.pull_request_id] = pr
+        elif op == "count":
+            values = self._counters.setdefault(record["user_id"], {}).setdefault(
+                _date(record["day"]), [0] * len(crud.COUNTER_FIELDS)
+            )
+            for position, delta in enumerate(record["values"]):
+                values[position] += delta
+        elif op == "event":
+            # id назначается при применении: порядок WAL совпадает с порядком применения,
+            # поэтому при восстановлении события получают те же id
+            event_id = record.get("event_id") or self._next_event_id
+            self._next_event_id = max(self._next_event_id, event_id + 1)
+            event = EventRecord(
+                event_id=event_id,
+                occurred_at=_datetime(record["occurred_at"]),
+                event_type=record["event_type"],
+                pull_request_id=record["pull_request_id"],
+                team_name=record.get("team_name"),
+                user_id=record.get("user_id"),
+                previous_user_id=record.get("previous_user_id"),
+                pr_created_at=_datetime(record["pr_created_at"]),
+            )
+            self._events[event_id] = event
+            bisect.insort(self._event_keys, (event.occurred_at, event_id))
+            bisect.insort(self._pr_events.setdefault(event.pull_request_id, []), event_id)
+        else:
+            raise ValueError(f"unknown record op {op!r}")
+
+    def _event_record(self, event_type: str, pr: PullRequestRecord, occurred_at: datetime,
+                      user_id: str | None = None, previous_user_id: str | None = None) -> dict:
+        """Аналог crud._event; команда — текущая команда автора PR."""
+        author = self._users.get(pr.author_id)
+        return {
+            "op": "event", "event_type": event_type, "pull_request_id": pr.pull_request_id,
+            "team_name": author.team_name if author is not None else None, "user_id": user_id,
+            "previous_user_id": previous_user_id, "occurred_at": occurred_at, "pr_created_at": pr.created_at,
+        }
+
+    def _creation_events(self, pr: PullRequestRecord) -> list[dict]:
+        return [self._event_record("CREATED", pr, pr.created_at, user_id=pr.author_id)] + [
+            self._event_record("ASSIGNED", pr, pr.created_at, user_id=user_id) for user_id in pr.reviewers
+        ]
+
+    def _open_reviews(self, user_id: str) -> int:
+        return len(self._reviews.get((user_id, "OPEN"), ()))
+
+    def _load_team_members(self, db, team_names):
+        with self._apply_lock:
+            return {
+                team_name: [
+                    (user_id, self._users[user_id].is_active, self._open_reviews(user_id))
+                    for user_id in self._teams.get(team_name, {})
+                ]
+                for team_name in team_names
+            }
+
+    # --- Team ---
+
+    def get_team_by_name(self, team_name: str) -> cache.TeamSnapshot | None:
+        with self._apply_lock:
+            members = self._teams.get(team_name)
+            if members is None:
+                return None
+            users = [self._users[user_id] for user_id in members]
+        return cache.TeamSnapshot(
+            team_name=team_name,
+            members=tuple(cache.MemberSnapshot(u.user_id, u.username, u.is_active) for u in users),
+        )
+
+    def create_team_with_members(self, team_data: schemas.TeamAddRequest) -> schemas.Team:
+        with self._team_locks.hold([team_data.team_name]):
+            if team_data.team_name in self._teams:
+                raise crud.AlreadyExists("team_name already exists")
+            [team] = self._upsert_team_members([(team_data.team_name, team_data.members)])
+            return team
+
+    def add_team_members(self, db_team: cache.TeamSnapshot, members: list[schemas.TeamMember]) -> schemas.Team:
+        with self._team_locks.hold([db_team.team_name]):
+            [team] = self._upsert_team_members([(db_team.team_name, members)])
+            return team
+
+    def sync_teams(self, teams: list[schemas.TeamAddRequest]) -> list[schemas.Team]:
+        # Как в crud.sync_teams: все команды одной записью WAL, применяются целиком
+        with self._team_locks.hold([t.team_name for t in teams]):
+            return self._upsert_team_members([(t.team_name, t.members) for t in teams])
+
+    def _upsert_team_members(self, teams: list[tuple[str, list[schemas.TeamMember]]]) -> list[schemas.Team]:
+        """
+        Команды применяются по порядку: пользователь из нескольких команд остается
+        в последней, состав каждой команды в ответе — как после ее шага.
+        """
+        records, result = [], []
+        affected_teams = {team_name for team_name, _ in teams}
+        staged: dict[str, dict[str, schemas.TeamMember]] = {}
+        team_of: dict[str, str | None] = {}
+        with self._apply_lock:
+            for team_name, members in teams:
+                if team_name not in staged:
+                    if team_name not in self._teams:
+                        records.append({"op": "team", "team_name": team_name})
+                    staged[team_name] = {
+                        user_id: _team_member(self._users[user_id])
+                        for user_id in self._teams.get(team_name, ())
+                        if team_of.get(user_id, team_name) == team_name
+                    }
+                for member in members:
+                    previous = self._users.get(member.user_id)
+                    previous_team = team_of.get(member.user_id, previous.team_name if previous else None)
+                    if previous_team and previous_team != team_name:
+                        affected_teams.add(previous_team)
+                        staged.get(previous_team, {}).pop(member.user_id, None)
+                    team_of[member.user_id] = team_name
+                    user = cache.UserSnapshot(member.user_id, member.username, team_name, member.is_active)
+                    staged[team_name][member.user_id] = _team_member(user)
+                    records.append(_user_record(user))
+                result.append(schemas.Team(team_name=team_name, members=list(staged[team_name].values())))
+            self._commit_locked(records)
+        self.index.invalidate(team_names=affected_teams)
+        return result
+
+    # --- User ---
+
+    def get_user_by_id(self, user_id: str) -> cache.UserSnapshot | None:
+        return self._users.get(user_id)
+
+    def choose_reviewers(self, team_name: str, exclude: set[str], k: int = 2) -> list[str]:
+        return self.index.choose(None, team_name, k=k, exclude=exclude)
+
+    def set_user_active(self, user_id: str, is_active: bool):
+        user = self._users.get(user_id)
+        if user is None:
+            return None
+        with self._team_locks.hold([user.team_name]):
+            user = replace(self._users[user_id], is_active=is_active)
+            self._commit([_user_record(user)])
+        self.index.user_activity_changed(user_id, is_active)
+        return user
+
+    # --- PullRequest ---
+
+    def get_pr_by_id(self, pr_id: str) -> PullRequestRecord | None:
+        return self._prs.get(pr_id)
+
+    def create_pr(self, pr_data: schemas.PullRequestCreateRequest, reviewer_ids: list[str]) -> PullRequestRecord:
+        pr = PullRequestRecord(
+            pull_request_id=pr_data.pull_request_id,
+            pull_request_name=pr_data.pull_request_name,
+            author_id=pr_data.author_id,
+            status="OPEN",
+            created_at=datetime.utcnow(),
+            merged_at=None,
+            reviewers=tuple(reviewer_ids),
+        )
+        with self._pr_locks.hold([pr.pull_request_id]):
+            if pr.pull_request_id in self._prs:
+                raise crud.AlreadyExists("PR id already exists")
+            self._commit([
+                _pr_record(pr), *_count_records(assignments=reviewer_ids, prs_created=[pr.author_id]),
+                *self._creation_events(pr),
+            ])
+        self.index.pr_created(reviewer_ids)
+        return pr
+
+    def create_prs_batch(self, items: list[schemas.PullRequestCreateRequest]):
+        """Та же семантика, что у crud.create_prs_batch: результат по каждому элементу в порядке запроса."""
+        results, accepted, seen = [], [], set()
+        for item in items:
+            author = self._users.get(item.author_id)
+            if item.pull_request_id in self._prs or item.pull_request_id in seen:
+                results.append((item.pull_request_id, None, ("PR_EXISTS", "PR id already exists")))
+            elif author is None or not author.team_name:
+                results.append((item.pull_request_id, None, ("NOT_FOUND", "author or author's team not found")))
+            else:
+                accepted.append((len(results), item, author.team_name))
+                results.append(None)
+            seen.add(item.pull_request_id)
+        if not accepted:
+            return results
+
+        reviewers = self.index.choose_many(
+            None, [(team_name, {item.author_id}) for _, item, team_name in accepted], reserve=True
+        )
+        now = datetime.utcnow()
+        records, assigned, authors, released = [], [], [], []
+        with self._pr_locks.hold([item.pull_request_id for _, item, _ in accepted]):
+            for (position, item, _), reviewer_ids in zip(accepted, reviewers):
+                if item.pull_request_id in self._prs:
+                    # PR создан параллельным запросом после проверки выше
+                    results[position] = (item.pull_request_id, None, ("PR_EXISTS", "PR id already exists"))
+                    released.extend(reviewer_ids)
+                    continue
+                pr = PullRequestRecord(item.pull_request_id, item.pull_request_name, item.author_id,
+                                       "OPEN", now, None, tuple(reviewer_ids))
+                results[position] = (item.pull_request_id, pr, None)
+                records.append(_pr_record(pr))
+                records.extend(self._creation_events(pr))
+                assigned.extend(reviewer_ids)
+                authors.append(item.author_id)
+            self._commit(records + _count_records(assignments=assigned, prs_created=authors))
+        # Нагрузка была зарезервирована при выборе, снимается только для отброшенных PR
+        self.index.pr_merged(released)
+        return results
+
+    def merge_pr(self, pr_id: str) -> PullRequestRecord | None:
+        return self.merge_prs_batch([pr_id]).get(pr_id)
+
+    def merge_prs_batch(self, pr_ids: list[str]) -> dict[str, PullRequestRecord]:
+        pr_ids = list(dict.fromkeys(pr_ids))
+        results, records, reviewer_ids, authors = {}, [], [], []
+        now = datetime.utcnow()
+        with self._pr_locks.hold(pr_ids):
+            for pr_id in pr_ids:
+                pr = self._prs.get(pr_id)
+                if pr is None:
+                    continue
+                if pr.status != "MERGED":
+                    pr = replace(pr, status="MERGED", merged_at=now, version=pr.version + 1)
+                    records.append(_pr_record(pr))
+                    records.append(self._event_record("MERGED", pr, now, user_id=pr.author_id))
+                    reviewer_ids.extend(pr.reviewers)
+                    authors.append(pr.author_id)
+                results[pr_id] = pr
+            if records:
+                self._commit(records + _count_records(merged_reviews=reviewer_ids, prs_merged=authors))
+        self.index.pr_merged(reviewer_ids)
+        return results
+
+    def replace_reviewer(self, db_pr: PullRequestRecord, old_user_id: str, new_user_id: str) -> PullRequestRecord:
+        with self._pr_locks.hold([db_pr.pull_request_id]):
+            pr = self._prs[db_pr.pull_request_id]
+            # Та же проверка версии, что в crud: PR могли смержить или переназначить после чтения
+            if pr.version != db_pr.version:
+                raise crud.VersionConflict(pr.pull_request_id)
+            # Новый ревьюер в конце списка, как в SQL-версии (порядок по assigned_at)
+            updated = replace(
+                pr, reviewers=(*(r for r in pr.reviewers if r != old_user_id), new_user_id), version=pr.version + 1,
+            )
+            self._commit([
+                _pr_record(updated), *_count_records(reassignments=[old_user_id], assignments=[new_user_id]),
+                self._event_record("REASSIGNED", updated, datetime.utcnow(), user_id=new_user_id, previous_user_id=old_user_id),
+            ])
+        self.index.reviewer_replaced(old_user_id, new_user_id)
+        return updated
+
+    def get_reviews_for_user(self, user_id: str, status: str | None = None, limit: int | None = crud.REVIEW_PAGE_SIZE,
+                             after: tuple[datetime, str] | None = None):
+        pages = []
+        with self._apply_lock:
+            for review_status in ([status] if status else crud.REVIEW_STATUSES):
+                keys = self._reviews.get((user_id, review_status), [])
+                end = bisect.bisect_left(keys, after) if after is not None else len(keys)
+                start = 0 if limit is None else max(0, end - limit - 1)
+                pages.append(keys[start:end][::-1])
+        keys = list(heapq.merge(*pages, reverse=True))
+        if limit is not None:
+            keys = keys[:limit + 1]
+        rows = [self._prs[pr_id] for _, pr_id in keys]
+        if limit is None or len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, crud.encode_review_cursor(rows[-1].created_at, rows[-1].pull_request_id)
+
+    # --- Экспорт и импорт (src/transfer.py) ---
+
+    def export_rows(self):
+        """(таблица, строка) в формате таблиц SQL-версии. assigned_at не хранится и равен created_at."""
+        with self._apply_lock:
+            team_names = list(self._teams)
+            users = list(self._users.values())
+            prs = list(self._prs.values())
+            counters = [(user_id, day, list(values)) for user_id, days in self._counters.items() for day, values in days.items()]
+            events = list(self._events.values())
+        for team_name in team_names:
+            yield "teams", {"team_name": team_name}
+        for user in users:
+            yield "users", asdict(user)
+        for pr in prs:
+            row = asdict(pr)
+            del row["reviewers"]
+            yield "pull_requests", row
+        for pr in prs:
+            for user_id in pr.reviewers:
+                yield "pr_reviewers", {
+                    "pull_request_id": pr.pull_request_id, "user_id": user_id, "status": pr.status,
+                    "assigned_at": pr.created_at, "pr_created_at": pr.created_at,
+                }
+        for user_id, day, values in counters:
+            yield "assignment_counters", {"user_id": user_id, "day": day, **dict(zip(crud.COUNTER_FIELDS, values))}
+        for event in events:
+            yield "pr_events", asdict(event)
+
+    def import_rows(self, table_name: str, rows: list[dict]):
+        """Аналог crud.import_rows: существующие записи пропускаются."""
+        if table_name in ("teams", "users"):
+            team_names = {row.get("team_name") for row in rows} - {None}
+            with self._team_locks.hold(team_names):
+                if table_name == "teams":
+                    records = [{"op": "team", "team_name": name} for name in team_names if name not in self._teams]
+                else:
+                    records = [
+                        {"op": "user", "user_id": row["user_id"], "username": row["username"],
+                         "team_name": row.get("team_name"), "is_active": row.get("is_active", True)}
+                        for row in rows if row["user_id"] not in self._users
+                    ]
+                self._commit(records)
+        elif table_name in ("pull_requests", "pr_reviewers"):
+            pr_ids = {row["pull_request_id"] for row in rows}
+            with self._pr_locks.hold(pr_ids):
+                if table_name == "pull_requests":
+                    records = [
+                        {"op": "pr", "status": "OPEN", "merged_at": None, "version": 1, **row, "reviewers": []}
+                        for row in rows if row["pull_request_id"] not in self._prs
+                    ]
+                else:
+                    reviewers: dict[str, list[str]] = {}
+                    for row in sorted(rows, key=lambda row: row.get("assigned_at") or datetime.min):
+                        pr = self._prs.get(row["pull_request_id"])
+                        current = reviewers.setdefault(row["pull_request_id"], list(pr.reviewers) if pr else [])
+                        if pr is not None and row["user_id"] not in current:
+                            current.append(row["user_id"])
+                    records = [
+                        _pr_record(replace(self._prs[pr_id], reviewers=tuple(user_ids)))
+                        for pr_id, user_ids in reviewers.items()
+                        if pr_id in self._prs and tuple(user_ids) != self._prs[pr_id].reviewers
+                    ]
+                self._commit(records)
+        elif table_name == "assignment_counters":
+            with self._apply_lock:
+                records = [
+                    {"op": "count", "user_id": row["user_id"], "day": row["day"],
+                     "values": [row.get(field, 0) for field in crud.COUNTER_FIELDS]}
+                    for row in rows if row["day"] not in self._counters.get(row["user_id"], {})
+                ]
+            self._commit(records)
+        elif table_name == "pr_events":
+            with self._apply_lock:
+                records = [{"op": "event", **row} for row in rows if row.get("event_id") not in self._events]
+            self._commit(records)
+        else:
+            raise ValueError(f"unknown table {table_name!r}")
+        self.index.clear()
+
+    # --- Статистика ---
+
+    def _counter_sums(self, user_id: str, date_from: date | None, date_to: date | None) -> list[int]:
+        sums = [0] * len(crud.COUNTER_FIELDS)
+        for day, values in self._counters.get(user_id, {}).items():
+            if (date_from is None or day >= date_from) and (date_to is None or day <= date_to):
+                for position, value in enumerate(values):
+                    sums[position] += value
+        return sums
+
+    def get_assignment_stats(self, team_name: str | None = None, date_from: date | None = None,
+                             date_to: date | None = None):
+        with self._apply_lock:
+            users = sorted(
+                (u for u in self._users.values() if team_name is None or u.team_name == team_name),
+                key=lambda u: u.user_id,
+            )
+            return [UserStatsRow(u.user_id, u.team_name, *self._counter_sums(u.user_id, date_from, date_to)) for u in users]
+
+    def get_team_stats(self, team_name: str | None = None, date_from: date | None = None, date_to: date | None = None):
+        with self._apply_lock:
+            rows = []
+            for name in sorted(self._teams if team_name is None else [team_name]):
+                members = list(self._teams.get(name, {}))
+                if not members:
+                    continue
+                sums = [0] * len(crud.COUNTER_FIELDS)
+                for user_id in members:
+                    for position, value in enumerate(self._counter_sums(user_id, date_from, date_to)):
+                        sums[position] += value
+                rows.append(TeamStatsRow(name, len(members), *sums))
+            return rows
+
+    # --- Журнал событий PR ---
+
+    def get_pr_events(self, pr_id: str) -> list[EventRecord]:
+        with self._apply_lock:
+            return [self._events[event_id] for event_id in self._pr_events.get(pr_id, ())]
+
+    def _events_in_window(self, event_types: set[str], team_name: str | None, date_from: date | None,
+                          date_to: date | None) -> dict[str, list[EventRecord]]:
+        start = (datetime.combine(date_from, datetime.min.time()),) if date_from is not None else ()
+        end = (datetime.combine(date_to + timedelta(days=1), datetime.min.time()),) if date_to is not None else None
+        by_team: dict[str, list[EventRecord]] = {}
+        with self._apply_lock:
+            first = bisect.bisect_left(self._event_keys, start)
+            last = bisect.bisect_left(self._event_keys, end) if end is not None else len(self._event_keys)
+            for _, event_id in self._event_keys[first:last]:
+                event = self._events[event_id]
+                if event.event_type in event_types and event.team_name and team_name in (None, event.team_name):
+                    by_team.setdefault(event.team_name, []).append(event)
+        return dict(sorted(by_team.items()))
+
+    def get_time_to_merge(self, team_name: str | None = None, date_from: date | None = None, date_to: date | None = None):
+        rows = []
+        for name, events in self._events_in_window({"MERGED"}, team_name, date_from, date_to).items():
+            seconds = [(event.occurred_at - event.pr_created_at).total_seconds() for event in events]
+            rows.append(TimeToMergeRow(name, len(seconds), sum(seconds) / len(seconds), max(seconds)))
+        return rows
+
+    def get_reassignment_rates(self, team_name: str | None = None, date_from: date | None = None,
+                               date_to: date | None = None):
+        return [
+            ReassignmentRow(name, len(events), sum(event.event_type == "REASSIGNED" for event in events))
+            for name, events in self._events_in_window({"ASSIGNED", "REASSIGNED"}, team_name, date_from, date_to).items()
+        ]
+
+    # --- Массовая деактивация ---
+
+    def deactivate_and_reassign(self, team: cache.TeamSnapshot, user_ids: list[str]) -> list[str]:
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return []
+        deactivated = set(user_ids)
+        records, removed, added, reassigned, events = [], [], [], [], []
+        now = datetime.utcnow()
+        with self._team_locks.hold([team.team_name]):
+            with self._apply_lock:
+                pr_ids = sorted({pr_id for user_id in user_ids for _, pr_id in self._reviews.get((user_id, "OPEN"), ())})
+                pool = reviewer_selection.CandidatePool([
+                    (user_id, self._open_reviews(user_id))
+                    for user_id in self._teams.get(team.team_name, {})
+                    if user_id not in deactivated and self._users[user_id].is_active
+                ])
+            with self._pr_locks.hold(pr_ids):
+                for pr_id in pr_ids:
+                    pr = self._prs[pr_id]
+                    if pr.status != "OPEN":
+                        continue
+                    reviewers = list(pr.reviewers)
+                    for old_user_id in [r for r in reviewers if r in deactivated]:
+                        new_user_id = pool.take(exclude={pr.author_id, *reviewers})
+                        if new_user_id is None:
+                            continue
+                        reviewers.remove(old_user_id)
+                        reviewers.append(new_user_id)
+                        removed.append(old_user_id)
+                        added.append(new_user_id)
+                        events.append(self._event_record(
+                            "REASSIGNED", pr, now, user_id=new_user_id, previous_user_id=old_user_id,
+                        ))
+                    if tuple(reviewers) != pr.reviewers:
+                        records.append(_pr_record(replace(pr, reviewers=tuple(reviewers), version=pr.version + 1)))
+                        reassigned.append(pr_id)
+                with self._apply_lock:
+                    # Записи пользователей — из текущего состояния: set_user_active и
+                    # /team/sync могли изменить их, пока выбирались замены
+                    users = [
+                        _user_record(replace(self._users[user_id], is_active=False))
+                        for user_id in user_ids if user_id in self._users
+                    ]
+                    self._commit_locked(users + records + _count_records(reassignments=removed, assignments=added) + events)
+        self.index.users_deactivated(user_ids)
+        for old_user_id, new_user_id in zip(removed, added):
+            self.index.reviewer_replaced(old_user_id, new_user_id)
+        return reassigned
+
+    # --- Фоновые задания ---
+    # В памяти переназначение не держит транзакций и блокировок БД, поэтому
+    # задание выполняется сразу и сохраняется уже завершенным.
+
+    def enqueue_deactivation(self, team: cache.TeamSnapshot, user_ids: list[str]) -> JobRecord:
+        user_ids = list(dict.fromkeys(user_ids))
+        started = datetime.utcnow()
+        with self._apply_lock:
+            total = len({pr_id for user_id in user_ids for _, pr_id in self._reviews.get((user_id, "OPEN"), ())})
+        reassigned = self.deactivate_and_reassign(team, user_ids)
+        job = JobRecord(
+            job_id=uuid.uuid4().hex, kind=crud.JOB_DEACTIVATE_MEMBERS, status="DONE",
+            payload={"team_name": team.team_name, "user_ids": user_ids},
+            total=total, processed=total, result=crud.job_result(reassigned),
+            created_at=started, started_at=started, finished_at=datetime.utcnow(), attempts=1,
+        )
+        with self._apply_lock:
+            self._jobs[job.job_id] = job
+            # dict хранит порядок вставки: вытесняются самые старые задания
+            while len(self._jobs) > MEMORY_JOB_HISTORY:
+                del self._jobs[next(iter(self._jobs))]
+        return job
+
+    def get_job(self, job_id: str) -> JobRecord | None:
+        return self._jobs.get(job_id)
+
+
+def _team_member(user: cache.UserSnapshot) -> schemas.TeamMember:
+    return schemas.TeamMember(user_id=user.user_id, username=user.username, is_active=user.is_active)
+
+
+def _user_record(user: cache.UserSnapshot) -> dict:
+    return {"op": "user", **asdict(user)}
+
+
+def _pr_record(pr: PullRequestRecord) -> dict:
+    return {"op": "pr", **asdict(pr)}
+
+
+def _count_records(**events: list[str]) -> list[dict]:
+    """Аналог crud._bump_counters: events — имя счетчика -> user_id, по +1 за вхождение."""
+    totals: dict[str, list[int]] = {}
+    for field, user_ids in events.items():
+        position = crud.COUNTER_FIELDS.index(field)
+        for user_id in user_ids:
+            totals.setdefault(user_id, [0] * len(crud.COUNTER_FIELDS))[position] += 1
+    day = datetime.utcnow().date()
+    return [{"op": "count", "user_id": user_id, "day": day, "values": values} for user_id, values in totals.items()]
+
+
+storage.check(MemoryStore)
+
+
+# --- Хранилище процесса ---
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> MemoryStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = MemoryStore()
+                store.start()
+                _store = store
+    return _store
+
+
+def close_store():
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+            _store = None
@@ -0,0 +1,305 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+# --- Метрики в формате Prometheus ---
+# Каждый поток пишет в собственный шард (threading.local), поэтому на горячем
+# пути нет блокировок: блокировка берется только при создании шарда и при
+# чтении /metrics, где шарды суммируются.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+
+class _Shard:
+    __slots__ = ("values", "histograms")
+
+    def __init__(self):
+        self.values = {}
+        self.histograms = {}
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._local = threading.local()
+        self._shards = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labels: tuple = ()):
+        self._metrics[name] = ("counter", help, labels, None)
+
+    def gauge(self, name: str, help: str, labels: tuple = ()):
+        self._metrics[name] = ("gauge", help, labels, None)
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self._metrics[name] = ("histogram", help, labels, buckets)
+
+    def collector(self, callback):
+        """callback() -> iterable[(name, type, help, {labels_tuple: value})], вызывается при чтении /metrics."""
+        self._collectors.append(callback)
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name: str, labels: tuple = (), value: float = 1):
+        values = self._shard().values
+        key = (name, labels)
+        values[key] = values.get(key, 0) + value
+
+    def observe(self, name: str, labels: tuple, value: float):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        data = histograms.get(key)
+        if data is None:
+            data = histograms[key] = [[0] * (len(self._metrics[name][3]) + 1), 0.0]
+        data[0][bisect.bisect_left(self._metrics[name][3], value)] += 1
+        data[1] += value
+
+    def render(self) -> str:
+        values, histograms = {}, {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for key, value in list(shard.values.items()):
+                values[key] = values.get(key, 0) + value
+            for key, (buckets, total) in list(shard.histograms.items()):
+                merged = histograms.setdefault(key, [[0] * len(buckets), 0.0])
+                merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+                merged[1] += total
+
+        lines = []
+        for name, (kind, help, label_names, bucket_bounds) in self._metrics.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "histogram":
+                for (metric, labels), (buckets, total) in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip((*bucket_bounds, "+Inf"), buckets):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(label_names, labels, le=bound)} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(label_names, labels)} {total}")
+                    lines.append(f"{name}_count{_labels(label_names, labels)} {cumulative}")
+            else:
+                for (metric, labels), value in sorted(values.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_labels(label_names, labels)} {value}")
+
+        for callback in self._collectors:
+            for name, kind, help, samples in callback():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for (label_names, labels), value in samples.items():
+                    lines.append(f"{name}{_labels(label_names, labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(names: tuple, values: tuple, le=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Registry()
+registry.counter("http_requests_total", "HTTP requests by route and status code", ("method", "route", "status"))
+registry.histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+registry.gauge("http_requests_in_progress", "HTTP requests currently being served", ("method",))
+registry.histogram("db_queries_per_request", "SQL statements executed per HTTP request", ("route",), COUNT_BUCKETS)
+registry.histogram("db_query_time_per_request_seconds", "Total SQL time per HTTP request", ("route",), LATENCY_BUCKETS)
+registry.histogram("db_query_duration_seconds", "SQL statement latency", (), QUERY_BUCKETS)
+registry.gauge("db_pool_connections_in_use", "Connections currently checked out of the pool", ("pool",))
+registry.counter("db_pool_checkouts_total", "Connections checked out of the pool", ("pool",))
+registry.counter("db_pool_connects_total", "New DBAPI connections opened by the pool", ("pool",))
+registry.histogram("db_pool_connection_hold_seconds", "Time a connection stays checked out", ("pool",), LATENCY_BUCKETS)
+registry.counter("db_query_budget_exceeded_total", "HTTP requests over their SQL statement budget", ("route",))
+
+logger = logging.getLogger(__name__)
+
+
+# --- Статистика запросов к БД в рамках HTTP-запроса ---
+# Эндпоинт объявляет бюджет декоратором @query_budget(n): сколько SQL-запросов
+# он выполняет при холодном кэше; None — число запросов зависит от объема
+# данных (/import), бюджет не проверяется. QUERY_BUDGET_MODE задает реакцию на
+# превышение: off — не проверять, log — предупреждение в лог и счетчик
+# db_query_budget_exceeded_total, raise — QueryBudgetExceeded на запросе сверх
+# бюджета (для тестов, см. фикстуру query_stats). В режимах log и raise один и
+# тот же SQL, повторенный в запросе больше QUERY_REPEAT_LIMIT раз, считается
+# признаком N+1 и попадает в лог.
+
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "log").lower()
+QUERY_REPEAT_LIMIT = int(os.getenv("QUERY_REPEAT_LIMIT", "3"))
+
+if QUERY_BUDGET_MODE not in ("off", "log", "raise"):
+    raise ValueError(f"QUERY_BUDGET_MODE must be off, log or raise, got {QUERY_BUDGET_MODE!r}")
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+def query_budget(limit: int | None):
+    def decorate(endpoint):
+        endpoint.query_budget = limit
+        return endpoint
+    return decorate
+
+
+class RequestStats:
+    __slots__ = ("queries", "query_time", "scope", "statements")
+
+    def __init__(self, scope=None):
+        self.queries = 0
+        self.query_time = 0.0
+        # scope["route"] появляется после маршрутизации, поэтому бюджет читается лениво
+        self.scope = scope
+        self.statements = []
+
+    @property
+    def route(self) -> str:
+        route = self.scope.get("route") if self.scope is not None else None
+        return route.path if route is not None else "unmatched"
+
+    @property
+    def budget(self) -> int | None:
+        route = self.scope.get("route") if self.scope is not None else None
+        return getattr(getattr(route, "endpoint", None), "query_budget", None)
+
+    def repeated(self) -> list[tuple[str, int]]:
+        return [(sql, n) for sql, n in Counter(self.statements).most_common() if n > QUERY_REPEAT_LIMIT]
+
+
+# callback(stats) после каждого HTTP-запроса (фикстура query_stats в тестах)
+request_observers = []
+
+
+def _check_budget(stats: RequestStats, statement: str):
+    stats.statements.append(statement)
+    if QUERY_BUDGET_MODE == "raise":
+        budget = stats.budget
+        if budget is not None and stats.queries > budget:
+            raise QueryBudgetExceeded(
+                f"{stats.route}: {stats.queries} SQL statements, budget {budget}; last: {statement[:200]}"
+            )
+
+
+def _report_budget(stats: RequestStats, route_label: str):
+    budget = stats.budget
+    if budget is not None and stats.queries > budget:
+        registry.inc("db_query_budget_exceeded_total", (route_label,))
+        logger.warning("%s: %d SQL statements, budget %d", route_label, stats.queries, budget)
+    for statement, count in stats.repeated():
+        logger.warning("%s: possible N+1, statement repeated %d times: %s", route_label, count, statement[:200])
+
+
+# run_in_threadpool и AsyncSession.run_sync переносят контекст, поэтому хуки
+# движка видят статистику текущего HTTP-запроса.
+current_request: ContextVar[RequestStats | None] = ContextVar("current_request", default=None)
+
+
+def instrument_engine(engine, pool_name: str):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        registry.observe("db_query_duration_seconds", (), elapsed)
+        stats = current_request.get()
+        if stats is not None and not (context is not None and context.execution_options.get("query_budget_exempt")):
+            stats.queries += 1
+            stats.query_time += elapsed
+            if QUERY_BUDGET_MODE != "off":
+                _check_budget(stats, statement)
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_started"):
+            connection.info["query_started"].pop()
+
+    # События пула, зарегистрированные на движке, переходят к новому пулу после
+    # engine.dispose(). События "начало ожидания" у пула нет: ожидание свободного
+    # соединения видно как http_admission_wait_seconds (слоты БД limits.py не
+    # больше пула) и как рост db_pool_connections_in_use до размера пула.
+    labels = (pool_name,)
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        registry.inc("db_pool_connects_total", labels)
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checked_out_at"] = time.perf_counter()
+        registry.inc("db_pool_checkouts_total", labels)
+        registry.inc("db_pool_connections_in_use", labels)
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        # Для соединения, отсоединенного от пула, записи нет
+        started = connection_record.info.pop("checked_out_at", None) if connection_record is not None else None
+        if started is not None:
+            registry.observe("db_pool_connection_hold_seconds", labels, time.perf_counter() - started)
+            registry.inc("db_pool_connections_in_use", labels, -1)
+
+
+# --- ASGI middleware ---
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status_code = 500
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        in_progress = ("http_requests_in_progress", (method,))
+        registry.inc(*in_progress)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request.reset(token)
+            registry.inc(*in_progress, value=-1)
+            # Шаблон маршрута вместо пути, чтобы число серий не росло
+            route_label = stats.route
+            registry.inc("http_requests_total", (method, route_label, str(status_code)))
+            registry.observe("http_request_duration_seconds", (method, route_label), elapsed)
+            registry.observe("db_queries_per_request", (route_label,), stats.queries)
+            registry.observe("db_query_time_per_request_seconds", (route_label,), stats.query_time)
+            if QUERY_BUDGET_MODE != "off":
+                _report_budget(stats, route_label)
+            for observer in request_observers:
+                observer(stats)
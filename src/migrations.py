@@ -0,0 +1,180 @@
+import time
+from datetime import datetime
+
+from sqlalchemy import Date, DateTime, func, inspect, literal, null, select, text, union_all
+from sqlalchemy.engine import Engine
+
+from . import database
+
+# --- Миграции схемы ---
+# Таблицы создаются через create_all, а данные из старого формата
+# переносятся отдельными идемпотентными шагами. Запускаются один раз перед
+# стартом сервиса (python -m src.migrations, см. docker-compose), а не в каждом
+# воркере uvicorn.
+
+# Ключ pg_advisory_xact_lock: параллельные запуски миграций выполняются по очереди
+_MIGRATION_LOCK_KEY = 0x61766974
+# Строк pull_requests в пачке переноса ревьюеров
+BACKFILL_CHUNK = 5000
+
+def upgrade(engine: Engine):
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(select(func.pg_advisory_xact_lock(_MIGRATION_LOCK_KEY)))
+        database.Base.metadata.create_all(bind=conn)
+        add_reviewer_pr_created_at(conn)
+        add_pull_request_version(conn)
+        backfill_pr_reviewers(conn)
+        ensure_indexes(conn)
+        backfill_assignment_counters(conn)
+        backfill_pr_events(conn)
+
+def ensure_indexes(conn):
+    """create_all не добавляет новые индексы в уже существующие таблицы."""
+    for table in database.Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+def add_reviewer_pr_created_at(conn):
+    """Добавляет pr_reviewers.pr_created_at и заменяет индекс (user_id, status) на расширенный."""
+    columns = {c["name"] for c in inspect(conn).get_columns("pr_reviewers")}
+    if "pr_created_at" in columns:
+        return
+    conn.execute(text("ALTER TABLE pr_reviewers ADD COLUMN pr_created_at TIMESTAMP"))
+    conn.execute(text(
+        "UPDATE pr_reviewers SET pr_created_at = COALESCE("
+        "(SELECT created_at FROM pull_requests WHERE pull_requests.pull_request_id = pr_reviewers.pull_request_id), "
+        "assigned_at)"
+    ))
+    conn.execute(text("DROP INDEX IF EXISTS ix_pr_reviewers_user_status"))
+
+def add_pull_request_version(conn):
+    """Добавляет pull_requests.version для оптимистичной блокировки."""
+    columns = {c["name"] for c in inspect(conn).get_columns("pull_requests")}
+    if "version" not in columns:
+        conn.execute(text("ALTER TABLE pull_requests ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+
+def backfill_pr_reviewers(conn):
+    """
+    Переносит ревьюеров из строкового столбца pull_requests.reviewers ("u1,u2")
+    в таблицу pr_reviewers и удаляет старый столбец. PR читаются потоком пачками
+    по BACKFILL_CHUNK: в памяти одновременно только одна пачка, а существующие
+    пользователи и уже перенесенные связи проверяются запросом на пачку.
+    """
+    columns = {c["name"] for c in inspect(conn).get_columns("pull_requests")}
+    if "reviewers" not in columns:
+        return
+
+    User = database.User
+    Reviewer = database.PullRequestReviewer
+    now = datetime.utcnow()
+    rows = conn.execution_options(stream_results=True).execute(text(
+        "SELECT pull_request_id, status, reviewers, created_at FROM pull_requests "
+        "WHERE reviewers IS NOT NULL AND reviewers <> ''"
+    ).columns(created_at=DateTime))
+    for chunk in rows.partitions(BACKFILL_CHUNK):
+        candidates = [
+            (pr_id, user_id, pr_status, created_at or now)
+            for pr_id, pr_status, reviewers, created_at in chunk
+            for user_id in dict.fromkeys(r.strip() for r in reviewers.split(','))
+        ]
+        known_users = set(conn.scalars(
+            select(User.user_id).where(User.user_id.in_({user_id for _, user_id, _, _ in candidates}))
+        ))
+        already_linked = set(conn.execute(
+            select(Reviewer.pull_request_id, Reviewer.user_id)
+            .where(Reviewer.pull_request_id.in_({pr_id for pr_id, _, _, _ in candidates}))
+        ).all())
+        links = [
+            {"pull_request_id": pr_id, "user_id": user_id, "status": pr_status,
+             "assigned_at": created_at, "pr_created_at": created_at}
+            for pr_id, user_id, pr_status, created_at in candidates
+            if user_id in known_users and (pr_id, user_id) not in already_linked
+        ]
+        if links:
+            conn.execute(Reviewer.__table__.insert(), links)
+    conn.execute(text("ALTER TABLE pull_requests DROP COLUMN reviewers"))
+
+def backfill_assignment_counters(conn):
+    """
+    Заполняет assignment_counters по текущим данным, если таблица пуста.
+    История переназначений до появления счетчиков не сохранилась, поэтому
+    reassignments начинается с нуля.
+    """
+    Counter = database.AssignmentCounter
+    if conn.execute(select(Counter.user_id).limit(1)).first() is not None:
+        return
+
+    PR = database.PullRequest
+    Reviewer = database.PullRequestReviewer
+    day = lambda column: func.date(column, type_=Date)
+    sources = {
+        "assignments": select(Reviewer.user_id, day(Reviewer.assigned_at), func.count())
+            .group_by(Reviewer.user_id, day(Reviewer.assigned_at)),
+        "merged_reviews": select(Reviewer.user_id, day(PR.merged_at), func.count())
+            .join(PR, PR.pull_request_id == Reviewer.pull_request_id)
+            .where(PR.status == "MERGED", PR.merged_at.is_not(None))
+            .group_by(Reviewer.user_id, day(PR.merged_at)),
+        "prs_created": select(PR.author_id, day(PR.created_at), func.count())
+            .where(PR.created_at.is_not(None))
+            .group_by(PR.author_id, day(PR.created_at)),
+        "prs_merged": select(PR.author_id, day(PR.merged_at), func.count())
+            .where(PR.status == "MERGED", PR.merged_at.is_not(None))
+            .group_by(PR.author_id, day(PR.merged_at)),
+    }
+    counters = {}
+    for field, query in sources.items():
+        for user_id, counter_day, count in conn.execute(query):
+            row = counters.setdefault((user_id, counter_day), {
+                "user_id": user_id, "day": counter_day, "assignments": 0, "reassignments": 0,
+                "merged_reviews": 0, "prs_created": 0, "prs_merged": 0,
+            })
+            row[field] += count
+    if counters:
+        conn.execute(Counter.__table__.insert(), list(counters.values()))
+
+def backfill_pr_events(conn):
+    """
+    Заполняет журнал pr_events по текущим PR, если он пуст: CREATED, ASSIGNED
+    для текущих ревьюеров и MERGED. Заменённые ревьюеры и переназначения до
+    появления журнала не сохранились.
+    """
+    Event = database.PrEvent
+    if conn.execute(select(Event.event_id).limit(1)).first() is not None:
+        return
+
+    PR = database.PullRequest
+    Reviewer = database.PullRequestReviewer
+    User = database.User
+    columns = ["event_type", "occurred_at", "pull_request_id", "team_name", "user_id", "previous_user_id", "pr_created_at"]
+    created = func.coalesce(PR.created_at, func.current_timestamp())
+    # Команда автора — текущая: на момент событий она не сохранилась.
+    # step упорядочивает события одного PR с одинаковым временем
+    source = lambda step, event_type, occurred_at, user_id: (
+        select(
+            literal(event_type).label("event_type"), occurred_at.label("occurred_at"), PR.pull_request_id,
+            User.team_name, user_id.label("user_id"), null().label("previous_user_id"),
+            created.label("pr_created_at"), literal(step).label("step"),
+        )
+        .select_from(PR)
+        .outerjoin(User, User.user_id == PR.author_id)
+    )
+    events = union_all(
+        source(0, "CREATED", created, PR.author_id),
+        source(1, "ASSIGNED", Reviewer.assigned_at, Reviewer.user_id)
+            .join(Reviewer, Reviewer.pull_request_id == PR.pull_request_id),
+        source(2, "MERGED", PR.merged_at, PR.author_id)
+            .where(PR.status == "MERGED", PR.merged_at.is_not(None)),
+    ).subquery()
+    # Один INSERT в порядке времени: event_id растет вместе с occurred_at, на
+    # этом держится BRIN-индекс по occurred_at
+    query = (
+        select(*(events.c[name] for name in columns))
+        .order_by(events.c.occurred_at, events.c.pull_request_id, events.c.step)
+    )
+    conn.execute(Event.__table__.insert().from_select(columns, query))
+
+if __name__ == "__main__":
+    started = time.perf_counter()
+    upgrade(database.get_engine())
+    print(f"migrations applied in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,352 @@
+import heapq
+import os
+import random
+import threading
+import time
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from . import cache, database
+
+# --- Выбор ревьюеров ---
+# Индекс в памяти процесса: для каждой команды хранится состав, флаг активности
+# и число открытых ревью каждого участника. Индекс строится одним запросом при
+# первом обращении к команде (и повторно по истечении TTL), а дальше обновляется
+# событиями create / merge / reassign / deactivate без чтения состава команды.
+# Выбор k ревьюеров стоит O(k log n) для стратегий на куче и O(k) для random.
+
+REVIEWER_STRATEGY = os.getenv("REVIEWER_STRATEGY", "random")
+REVIEWER_INDEX_TTL = float(os.getenv("REVIEWER_INDEX_TTL", "10"))
+
+
+class _KeyedHeap:
+    """Min-куча с обновлением ключа: устаревшие записи пропускаются при извлечении."""
+
+    def __init__(self):
+        self._heap = []
+        self._keys = {}
+
+    def assign(self, item: str, key):
+        self._keys[item] = key
+        heapq.heappush(self._heap, (key, item))
+        if len(self._heap) > 2 * len(self._keys) + 16:
+            self._heap = [(k, i) for i, k in self._keys.items()]
+            heapq.heapify(self._heap)
+
+    def discard(self, item: str):
+        self._keys.pop(item, None)
+
+    def key(self, item: str):
+        return self._keys.get(item)
+
+    def min_key(self, default):
+        while self._heap:
+            key, item = self._heap[0]
+            if self._keys.get(item) == key:
+                return key
+            heapq.heappop(self._heap)
+        return default
+
+    def smallest(self, k: int, exclude: set[str]) -> list[str]:
+        popped, found, seen = [], [], set()
+        while self._heap and len(found) < k:
+            key, item = heapq.heappop(self._heap)
+            if self._keys.get(item) != key or item in seen:
+                continue
+            seen.add(item)
+            popped.append((key, item))
+            if item not in exclude:
+                found.append(item)
+        for entry in popped:
+            heapq.heappush(self._heap, entry)
+        return found
+
+
+class TeamState:
+    __slots__ = ("team_name", "loads", "active", "_positions", "heap", "built_at")
+
+    def __init__(self, team_name: str, members: list[tuple[str, bool, int]]):
+        self.team_name = team_name
+        self.loads = {user_id: load for user_id, _, load in members}
+        self.active = []
+        self._positions = {}
+        self.heap = _KeyedHeap()
+        self.built_at = time.monotonic()
+        for user_id, is_active, _ in members:
+            if is_active:
+                self._add_active(user_id)
+
+    def is_active(self, user_id: str) -> bool:
+        return user_id in self._positions
+
+    def _add_active(self, user_id: str):
+        self._positions[user_id] = len(self.active)
+        self.active.append(user_id)
+
+    def _remove_active(self, user_id: str):
+        position = self._positions.pop(user_id)
+        last = self.active.pop()
+        if last != user_id:
+            self.active[position] = last
+            self._positions[last] = position
+
+
+# --- Стратегии ---
+
+class SelectionStrategy:
+    name = ""
+
+    def on_join(self, team: TeamState, user_id: str):
+        pass
+
+    def on_leave(self, team: TeamState, user_id: str):
+        pass
+
+    def on_load_changed(self, team: TeamState, user_id: str):
+        pass
+
+    def select(self, team: TeamState, k: int, exclude: set[str]) -> list[str]:
+        raise NotImplementedError
+
+
+class RandomStrategy(SelectionStrategy):
+    """Случайные активные участники (правило из спецификации)."""
+
+    name = "random"
+
+    def select(self, team, k, exclude):
+        active = team.active
+        if len(active) <= 2 * (k + len(exclude)):
+            candidates = [u for u in active if u not in exclude]
+            return random.sample(candidates, min(k, len(candidates)))
+        chosen = []
+        while len(chosen) < k:
+            user_id = active[random.randrange(len(active))]
+            if user_id not in exclude and user_id not in chosen:
+                chosen.append(user_id)
+        return chosen
+
+
+class LeastLoadedStrategy(SelectionStrategy):
+    """Участники с наименьшим числом открытых ревью, при равенстве — случайно."""
+
+    name = "least_loaded"
+
+    def on_join(self, team, user_id):
+        team.heap.assign(user_id, (team.loads[user_id], random.random()))
+
+    def on_leave(self, team, user_id):
+        team.heap.discard(user_id)
+
+    def on_load_changed(self, team, user_id):
+        if team.is_active(user_id):
+            self.on_join(team, user_id)
+
+    def select(self, team, k, exclude):
+        return team.heap.smallest(k, exclude)
+
+
+class WeightedRoundRobinStrategy(SelectionStrategy):
+    """
+    Взвешенный round-robin (stride scheduling): выбирается участник с минимальным
+    "проходом", после выбора проход увеличивается на 1 + число его открытых ревью,
+    поэтому загруженные участники получают ревью реже.
+    """
+
+    name = "weighted_round_robin"
+
+    def on_join(self, team, user_id):
+        team.heap.assign(user_id, team.heap.min_key(0.0))
+
+    def on_leave(self, team, user_id):
+        team.heap.discard(user_id)
+
+    def select(self, team, k, exclude):
+        chosen = team.heap.smallest(k, exclude)
+        for user_id in chosen:
+            team.heap.assign(user_id, team.heap.key(user_id) + 1 + team.loads[user_id])
+        return chosen
+
+
+STRATEGIES = {
+    strategy.name: strategy
+    for strategy in (RandomStrategy, LeastLoadedStrategy, WeightedRoundRobinStrategy)
+}
+
+
+def get_strategy(name: str) -> SelectionStrategy:
+    if name not in STRATEGIES:
+        raise ValueError(f"unknown reviewer strategy {name!r}, expected one of {sorted(STRATEGIES)}")
+    return STRATEGIES[name]()
+
+
+# --- Индекс нагрузки по командам ---
+
+class ReviewerIndex:
+    def __init__(self, strategy: SelectionStrategy, ttl: float = REVIEWER_INDEX_TTL, loader=None):
+        self.strategy = strategy
+        self.ttl = ttl
+        # loader(db, team_names) -> {team_name: [(user_id, is_active, open_reviews)]}
+        self._loader = loader or load_team_members
+        self._lock = threading.Lock()
+        self._teams: dict[str, TeamState] = {}
+        self._user_team: dict[str, str] = {}
+
+    def choose(self, db: Session, team_name: str, k: int = 2, exclude: set[str] = frozenset()) -> list[str]:
+        return self.choose_many(db, [(team_name, exclude)], k=k)[0]
+
+    def choose_many(self, db: Session, requests: list[tuple[str, set[str]]], k: int = 2, reserve: bool = False):
+        """
+        Выбор ревьюеров сразу для нескольких PR. Недостающие в индексе команды
+        загружаются одним запросом. При reserve=True нагрузка выбранных
+        ревьюеров увеличивается сразу, чтобы следующие PR пакета это учитывали.
+        """
+        while True:
+            with self._lock:
+                stale = {name for name, _ in requests if not self._is_fresh(name)}
+            members = self._loader(db, stale) if stale else {}
+            with self._lock:
+                for team_name in stale:
+                    self._install(TeamState(team_name, members.get(team_name, [])))
+                if any(name not in self._teams for name, _ in requests):
+                    continue
+                results = []
+                for team_name, exclude in requests:
+                    chosen = self._select(self._teams[team_name], k, set(exclude))
+                    if reserve:
+                        for user_id in chosen:
+                            self._add_load(user_id, 1)
+                    results.append(chosen)
+                return results
+
+    def _is_fresh(self, team_name: str) -> bool:
+        team = self._teams.get(team_name)
+        return team is not None and time.monotonic() - team.built_at < self.ttl
+
+    def _select(self, team: TeamState, k: int, exclude: set[str]) -> list[str]:
+        return self.strategy.select(team, k, exclude)
+
+    def _install(self, team: TeamState) -> TeamState:
+        previous = self._teams.get(team.team_name)
+        if previous is not None:
+            for user_id in previous.loads:
+                if self._user_team.get(user_id) == team.team_name:
+                    del self._user_team[user_id]
+        self._teams[team.team_name] = team
+        for user_id in team.loads:
+            self._user_team[user_id] = team.team_name
+        for user_id in team.active:
+            self.strategy.on_join(team, user_id)
+        return team
+
+    def _team_of(self, user_id: str):
+        team_name = self._user_team.get(user_id)
+        return self._teams.get(team_name) if team_name else None
+
+    def _add_load(self, user_id: str, delta: int):
+        team = self._team_of(user_id)
+        if team is not None:
+            team.loads[user_id] = max(0, team.loads[user_id] + delta)
+            self.strategy.on_load_changed(team, user_id)
+
+    # --- События ---
+
+    def pr_created(self, reviewer_ids: list[str]):
+        with self._lock:
+            for user_id in reviewer_ids:
+                self._add_load(user_id, 1)
+
+    def pr_merged(self, reviewer_ids: list[str]):
+        with self._lock:
+            for user_id in reviewer_ids:
+                self._add_load(user_id, -1)
+
+    def reviewer_replaced(self, old_user_id: str, new_user_id: str):
+        with self._lock:
+            self._add_load(old_user_id, -1)
+            self._add_load(new_user_id, 1)
+
+    def user_activity_changed(self, user_id: str, is_active: bool):
+        with self._lock:
+            team = self._team_of(user_id)
+            if team is None or team.is_active(user_id) == is_active:
+                return
+            if is_active:
+                team._add_active(user_id)
+                self.strategy.on_join(team, user_id)
+            else:
+                team._remove_active(user_id)
+                self.strategy.on_leave(team, user_id)
+
+    def users_deactivated(self, user_ids: list[str]):
+        for user_id in user_ids:
+            self.user_activity_changed(user_id, False)
+
+    def invalidate(self, team_names=(), user_ids=()):
+        """Состав команд изменился: индекс будет перестроен при следующем выборе."""
+        with self._lock:
+            names = set(team_names) | {self._user_team[u] for u in user_ids if u in self._user_team}
+            for team_name in names:
+                team = self._teams.pop(team_name, None)
+                if team is None:
+                    continue
+                for user_id in team.loads:
+                    if self._user_team.get(user_id) == team_name:
+                        del self._user_team[user_id]
+
+    def clear(self):
+        with self._lock:
+            self._teams.clear()
+            self._user_team.clear()
+
+    def on_remote_invalidation(self, team_names, user_ids):
+        if team_names is None:
+            self.clear()
+        else:
+            self.invalidate(team_names=team_names, user_ids=user_ids)
+
+
+class CandidatePool:
+    """
+    Активные участники команды в куче по числу открытых ревью (min-heap): замены
+    при массовой деактивации берутся у наименее загруженных.
+    """
+
+    def __init__(self, loads):
+        self._heap = [(load, random.random(), user_id) for user_id, load in loads]
+        heapq.heapify(self._heap)
+
+    def take(self, exclude: set[str]):
+        skipped = []
+        chosen = None
+        while self._heap:
+            load, tiebreak, user_id = heapq.heappop(self._heap)
+            if user_id in exclude:
+                skipped.append((load, tiebreak, user_id))
+                continue
+            chosen = user_id
+            heapq.heappush(self._heap, (load + 1, random.random(), user_id))
+            break
+        for item in skipped:
+            heapq.heappush(self._heap, item)
+        return chosen
+
+
+def load_team_members(db: Session, team_names) -> dict[str, list[tuple[str, bool, int]]]:
+    Reviewer = database.PullRequestReviewer
+    User = database.User
+    rows = db.execute(
+        select(User.team_name, User.user_id, User.is_active, func.count(Reviewer.user_id))
+        .outerjoin(Reviewer, (Reviewer.user_id == User.user_id) & (Reviewer.status == 'OPEN'))
+        .where(User.team_name.in_(list(team_names)))
+        .group_by(User.team_name, User.user_id, User.is_active)
+    ).all()
+    members: dict[str, list[tuple[str, bool, int]]] = {}
+    for team_name, user_id, is_active, load in rows:
+        members.setdefault(team_name, []).append((user_id, bool(is_active), load))
+    return members
+
+
+index = ReviewerIndex(get_strategy(REVIEWER_STRATEGY))
+cache.on_remote_invalidation(index.on_remote_invalidation)
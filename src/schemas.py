@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
-from datetime import datetime
+from typing import Dict, List, Optional
+from datetime import date, datetime
 
 # --- Schemas para respostas API ---
 # from_attributes=True permite converter automaticamente
@@ -56,6 +56,9 @@ class TeamAddRequest(BaseModel):
     team_name: str
     members: List[TeamMember]
 
+class TeamSyncRequest(BaseModel):
+    teams: List[TeamAddRequest]
+
 class SetUserActiveRequest(BaseModel):
     user_id: str
     is_active: bool
@@ -65,9 +68,15 @@ class PullRequestCreateRequest(BaseModel):
     pull_request_name: str
     author_id: str
 
+class PullRequestBatchCreateRequest(BaseModel):
+    pull_requests: List[PullRequestCreateRequest]
+
 class PullRequestMergeRequest(BaseModel):
     pull_request_id: str
 
+class PullRequestBatchMergeRequest(BaseModel):
+    pull_request_ids: List[str]
+
 class PullRequestReassignRequest(BaseModel):
     pull_request_id: str
     old_user_id: str
@@ -82,6 +91,9 @@ class DeactivateTeamMembersRequest(BaseModel):
 class TeamResponse(BaseModel):
     team: Team
 
+class TeamSyncResponse(BaseModel):
+    teams: List[Team]
+
 class UserResponse(BaseModel):
     user: User
 
@@ -92,10 +104,110 @@ class ReassignResponse(BaseModel):
     pr: PullRequest
     replaced_by: str
 
+class ErrorInfo(BaseModel):
+    code: str
+    message: str
+
+class PullRequestBatchResult(BaseModel):
+    pull_request_id: str
+    pr: Optional[PullRequest] = None
+    error: Optional[ErrorInfo] = None
+
+class PullRequestBatchResponse(BaseModel):
+    results: List[PullRequestBatchResult]
+
 class UserReviewResponse(BaseModel):
     user_id: str
     pull_requests: List[PullRequestShort]
+    # Курсор следующей страницы; None — страница последняя
+    next_cursor: Optional[str] = None
 
 class DeactivationResponse(BaseModel):
     deactivated_users: List[str]
     reassigned_prs: List[str]
+
+class Job(BaseModel):
+    job_id: str
+    kind: str
+    # QUEUED, RUNNING, DONE или FAILED
+    status: str
+    # Прогресс: обработано затронутых PR из total
+    total: int
+    processed: int
+    # Число переназначенных PR и первые из них (не больше crud.JOB_RESULT_SAMPLE)
+    reassigned: int
+    reassigned_prs: List[str]
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class JobResponse(BaseModel):
+    job: Job
+
+class AssignmentCounters(BaseModel):
+    assignments: int
+    reassignments: int
+    merged_reviews: int
+    prs_created: int
+    prs_merged: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+class UserAssignmentStats(AssignmentCounters):
+    user_id: str
+    team_name: Optional[str] = None
+
+class AssignmentStatsResponse(BaseModel):
+    team_name: Optional[str] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    users: List[UserAssignmentStats]
+
+class TeamStats(AssignmentCounters):
+    team_name: str
+    members: int
+
+class TeamStatsResponse(BaseModel):
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    teams: List[TeamStats]
+
+class PrEvent(BaseModel):
+    event_type: str
+    occurred_at: datetime
+    # CREATED, MERGED — автор; ASSIGNED, REASSIGNED — назначенный ревьюер
+    user_id: Optional[str] = None
+    # REASSIGNED — заменённый ревьюер
+    previous_user_id: Optional[str] = None
+
+class PullRequestHistoryResponse(BaseModel):
+    pull_request_id: str
+    events: List[PrEvent]
+
+class TeamTimeToMerge(BaseModel):
+    team_name: str
+    merged_prs: int
+    avg_seconds: float
+    max_seconds: float
+
+class TimeToMergeResponse(BaseModel):
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    teams: List[TeamTimeToMerge]
+
+class TeamReassignmentRate(BaseModel):
+    team_name: str
+    assignments: int
+    reassignments: int
+    # reassignments / assignments, 0 без назначений
+    reassignment_rate: float
+
+class ReassignmentRateResponse(BaseModel):
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    teams: List[TeamReassignmentRate]
+
+class ImportResponse(BaseModel):
+    # Прочитано строк по таблицам (включая пропущенные существующие записи)
+    imported: Dict[str, int]
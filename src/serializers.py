@@ -0,0 +1,122 @@
+"""
+Быстрая сборка ответов API: строки, снимки кэша и записи хранилища
+превращаются в обычные dict и кодируются orjson, без построения моделей
+schemas и повторной валидации response_model в FastAPI. Данные приходят из
+своей БД и уже прошли валидацию на входе, поэтому проверять их еще раз не нужно.
+
+Вывод побайтно совпадает с сериализацией schemas через Pydantic (порядок
+полей, алиасы created_at/merged_at, null у пустых полей, формат дат) — это
+проверяет tests/test_serializers.py. При изменении схемы в schemas.py нужно
+поправить и функцию здесь. response_model у эндпоинтов остается для OpenAPI.
+"""
+import orjson
+from starlette.responses import JSONResponse
+
+
+class ORJSONResponse(JSONResponse):
+    # OPT_UTC_Z: datetime с зоной UTC пишется как "...Z", как в Pydantic;
+    # OPT_NON_STR_KEYS: ключи-наследники str (имена таблиц SQLAlchemy в /import)
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+
+def member(row) -> dict:
+    return {"user_id": row.user_id, "username": row.username, "is_active": row.is_active}
+
+
+def team(row) -> dict:
+    return {"team_name": row.team_name, "members": [member(m) for m in row.members]}
+
+
+def user(row) -> dict:
+    return {"user_id": row.user_id, "username": row.username, "team_name": row.team_name, "is_active": row.is_active}
+
+
+def pull_request(row) -> dict:
+    return {
+        "pull_request_id": row.pull_request_id,
+        "pull_request_name": row.pull_request_name,
+        "author_id": row.author_id,
+        "status": row.status,
+        "assigned_reviewers": row.reviewer_ids,
+        "created_at": row.created_at,
+        "merged_at": row.merged_at,
+    }
+
+
+def pull_request_short(row) -> dict:
+    return {
+        "pull_request_id": row.pull_request_id,
+        "pull_request_name": row.pull_request_name,
+        "author_id": row.author_id,
+        "status": row.status,
+    }
+
+
+def batch_result(pr_id: str, row=None, error: tuple[str, str] | None = None) -> dict:
+    return {
+        "pull_request_id": pr_id,
+        "pr": pull_request(row) if row is not None else None,
+        "error": {"code": error[0], "message": error[1]} if error else None,
+    }
+
+
+def job(row) -> dict:
+    return {
+        "job_id": row.job_id,
+        "kind": row.kind,
+        "status": row.status,
+        "total": row.total,
+        "processed": row.processed,
+        "reassigned": row.result["reassigned"],
+        "reassigned_prs": row.result["reassigned_prs"],
+        "error": row.error,
+        "created_at": row.created_at,
+        "started_at": row.started_at,
+        "finished_at": row.finished_at,
+    }
+
+
+def pr_event(row) -> dict:
+    return {
+        "event_type": row.event_type,
+        "occurred_at": row.occurred_at,
+        "user_id": row.user_id,
+        "previous_user_id": row.previous_user_id,
+    }
+
+
+def time_to_merge(row) -> dict:
+    return {
+        "team_name": row.team_name,
+        "merged_prs": row.merged_prs,
+        "avg_seconds": float(row.avg_seconds),
+        "max_seconds": float(row.max_seconds),
+    }
+
+
+def reassignment_rate(row) -> dict:
+    return {
+        "team_name": row.team_name,
+        "assignments": row.assignments,
+        "reassignments": row.reassignments,
+        "reassignment_rate": row.reassignments / row.assignments if row.assignments else 0.0,
+    }
+
+
+def _counters(row) -> dict:
+    return {
+        "assignments": row.assignments,
+        "reassignments": row.reassignments,
+        "merged_reviews": row.merged_reviews,
+        "prs_created": row.prs_created,
+        "prs_merged": row.prs_merged,
+    }
+
+
+def user_stats(row) -> dict:
+    return {**_counters(row), "user_id": row.user_id, "team_name": row.team_name}
+
+
+def team_stats(row) -> dict:
+    return {**_counters(row), "team_name": row.team_name, "members": row.members}
@@ -0,0 +1,122 @@
+import abc
+import inspect
+from datetime import date, datetime
+
+from . import cache, schemas
+
+# --- Контракт хранилища ---
+# Операции, которые эндпоинты вызывают через async_crud. crud.py реализует их
+# функциями с сессией первым параметром, MemoryStore — методами с теми же
+# остальными параметрами: async_crud.run вызывает у хранилища метод с именем
+# функции crud. Оба варианта сверяются с контрактом при импорте (check), а
+# MemoryStore еще и наследует Storage, поэтому пропущенный или переименованный
+# метод падает сразу, а не 500-й ошибкой на первом запросе.
+# Возвращаемые объекты у бэкендов разные (ORM-модели и записи memory_store),
+# общие у них только поля, которые читают serializers.
+
+
+class Storage(abc.ABC):
+    # --- Team ---
+
+    @abc.abstractmethod
+    def get_team_by_name(self, team_name: str) -> cache.TeamSnapshot | None: ...
+
+    @abc.abstractmethod
+    def create_team_with_members(self, team_data: schemas.TeamAddRequest): ...
+
+    @abc.abstractmethod
+    def add_team_members(self, db_team: cache.TeamSnapshot, members: list[schemas.TeamMember]): ...
+
+    @abc.abstractmethod
+    def sync_teams(self, teams: list[schemas.TeamAddRequest]): ...
+
+    # --- User ---
+
+    @abc.abstractmethod
+    def get_user_by_id(self, user_id: str) -> cache.UserSnapshot | None: ...
+
+    @abc.abstractmethod
+    def choose_reviewers(self, team_name: str, exclude: set[str], k: int = 2) -> list[str]: ...
+
+    @abc.abstractmethod
+    def set_user_active(self, user_id: str, is_active: bool): ...
+
+    # --- PullRequest ---
+
+    @abc.abstractmethod
+    def get_pr_by_id(self, pr_id: str): ...
+
+    @abc.abstractmethod
+    def create_pr(self, pr_data: schemas.PullRequestCreateRequest, reviewer_ids: list[str]): ...
+
+    @abc.abstractmethod
+    def create_prs_batch(self, items: list[schemas.PullRequestCreateRequest]): ...
+
+    @abc.abstractmethod
+    def merge_pr(self, pr_id: str): ...
+
+    @abc.abstractmethod
+    def merge_prs_batch(self, pr_ids: list[str]) -> dict: ...
+
+    @abc.abstractmethod
+    def replace_reviewer(self, db_pr, old_user_id: str, new_user_id: str): ...
+
+    @abc.abstractmethod
+    def get_reviews_for_user(self, user_id: str, status: str | None = None, limit: int | None = 100,
+                             after: tuple[datetime, str] | None = None): ...
+
+    # --- Статистика и журнал событий ---
+
+    @abc.abstractmethod
+    def get_assignment_stats(self, team_name: str | None = None, date_from: date | None = None,
+                             date_to: date | None = None): ...
+
+    @abc.abstractmethod
+    def get_team_stats(self, team_name: str | None = None, date_from: date | None = None,
+                       date_to: date | None = None): ...
+
+    @abc.abstractmethod
+    def get_pr_events(self, pr_id: str) -> list: ...
+
+    @abc.abstractmethod
+    def get_time_to_merge(self, team_name: str | None = None, date_from: date | None = None,
+                          date_to: date | None = None): ...
+
+    @abc.abstractmethod
+    def get_reassignment_rates(self, team_name: str | None = None, date_from: date | None = None,
+                               date_to: date | None = None): ...
+
+    # --- Массовая деактивация и фоновые задания ---
+
+    @abc.abstractmethod
+    def deactivate_and_reassign(self, team: cache.TeamSnapshot, user_ids: list[str]) -> list[str]: ...
+
+    @abc.abstractmethod
+    def enqueue_deactivation(self, team: cache.TeamSnapshot, user_ids: list[str]): ...
+
+    @abc.abstractmethod
+    def get_job(self, job_id: str): ...
+
+    # --- Импорт ---
+
+    @abc.abstractmethod
+    def import_rows(self, table_name: str, rows: list[dict]): ...
+
+
+OPERATIONS = frozenset(Storage.__abstractmethods__)
+
+
+def check(implementation):
+    """
+    Сверяет модуль функций (первый параметр — сессия) или класс (первый — self)
+    с контрактом по именам параметров; расхождение — TypeError при импорте.
+    """
+    name = getattr(implementation, "__name__", repr(implementation))
+    for operation in sorted(OPERATIONS):
+        expected = list(inspect.signature(getattr(Storage, operation)).parameters)[1:]
+        fn = getattr(implementation, operation, None)
+        if fn is None or getattr(fn, "__isabstractmethod__", False):
+            raise TypeError(f"{name} does not implement {operation}")
+        actual = list(inspect.signature(fn).parameters)[1:]
+        if actual != expected:
+            raise TypeError(f"{name}.{operation}{tuple(actual)} does not match Storage.{operation}{tuple(expected)}")
@@ -0,0 +1,149 @@
+"""
+Экспорт и импорт данных в NDJSON: по строке на запись таблицы,
+{"table": "<имя таблицы>", <столбцы>...}. Таблицы идут в порядке внешних
+ключей (Base.metadata.sorted_tables), поэтому файл экспорта можно сразу
+загрузить в пустую базу.
+
+Экспорт читает таблицы курсором (yield_per, на PostgreSQL — серверный курсор)
+и отдает пачки строк по мере чтения. Импорт разбирает тело запроса по мере
+поступления и пишет пачками по IMPORT_CHUNK строк, каждая пачка — отдельная
+транзакция. Память процесса не зависит от объема данных.
+"""
+import json
+from collections.abc import AsyncIterator, Iterator
+from datetime import date, datetime
+
+from sqlalchemy import Date, DateTime, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import iterate_in_threadpool
+
+from . import async_crud, database, memory_store
+
+EXPORT_CHUNK = 1000
+IMPORT_CHUNK = 5000
+
+TABLES = {table.name: table for table in database.Base.metadata.sorted_tables if table.info.get("export", True)}
+
+# Столбцы без значения по умолчанию, которые обязаны быть в строке импорта
+REQUIRED = {
+    table.name: {c.name for c in table.columns if not c.nullable and c.default is None and c.server_default is None}
+    for table in TABLES.values()
+}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def encode(table_name: str, row) -> bytes:
+    return (json.dumps({"table": table_name, **row}, default=_json_default, separators=(",", ":")) + "\n").encode()
+
+
+def decode(line: bytes, number: int) -> tuple[str, dict]:
+    """Строка NDJSON -> (таблица, значения столбцов); ValueError с номером строки при ошибке."""
+    try:
+        row = json.loads(line)
+    except ValueError:
+        raise ValueError(f"line {number}: invalid JSON") from None
+    if not isinstance(row, dict):
+        raise ValueError(f"line {number}: expected an object")
+    table = TABLES.get(row.pop("table", None))
+    if table is None:
+        raise ValueError(f"line {number}: unknown table, expected one of {list(TABLES)}")
+    unknown = row.keys() - table.columns.keys()
+    if unknown:
+        raise ValueError(f"line {number}: unknown columns {sorted(unknown)} for {table.name}")
+    missing = {name for name in REQUIRED[table.name] if row.get(name) is None}
+    if missing:
+        raise ValueError(f"line {number}: missing columns {sorted(missing)} for {table.name}")
+    try:
+        for name, value in row.items():
+            if value is None:
+                continue
+            column_type = table.columns[name].type
+            if isinstance(column_type, DateTime):
+                row[name] = datetime.fromisoformat(value)
+            elif isinstance(column_type, Date):
+                row[name] = date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"line {number}: invalid value for {table.name}.{name}") from None
+    return table.name, row
+
+
+# --- Экспорт ---
+
+def _export_sync(db: Session) -> Iterator[bytes]:
+    for name, table in TABLES.items():
+        result = db.execute(select(table).execution_options(yield_per=EXPORT_CHUNK))
+        for partition in result.partitions():
+            yield b"".join(encode(name, row._mapping) for row in partition)
+
+
+async def export_ndjson(db) -> AsyncIterator[bytes]:
+    if isinstance(db, memory_store.MemoryStore):
+        lines = []
+        for name, row in db.export_rows():
+            lines.append(encode(name, row))
+            if len(lines) >= EXPORT_CHUNK:
+                yield b"".join(lines)
+                lines.clear()
+        if lines:
+            yield b"".join(lines)
+    elif isinstance(db, AsyncSession):
+        for name, table in TABLES.items():
+            result = await db.stream(select(table).execution_options(yield_per=EXPORT_CHUNK))
+            async for partition in result.partitions():
+                yield b"".join(encode(name, row._mapping) for row in partition)
+    else:
+        # Синхронная сессия читается в пуле потоков, как и остальные запросы при DB_ASYNC=false
+        async for chunk in iterate_in_threadpool(_export_sync(db)):
+            yield chunk
+
+
+# --- Импорт ---
+
+async def _lines(body: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    buffer = b""
+    async for chunk in body:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    yield buffer
+
+
+async def import_ndjson(db, body: AsyncIterator[bytes]) -> dict[str, int]:
+    """
+    Загружает NDJSON из потока тела запроса. Уже существующие записи (по
+    первичному ключу) пропускаются, поэтому прерванный импорт можно повторить.
+    Возвращает число прочитанных строк по таблицам.
+    """
+    counts: dict[str, int] = {}
+    pending_table, pending = None, []
+    number = 0
+
+    async def flush():
+        if not pending:
+            return
+        try:
+            await async_crud.import_rows(db, pending_table, pending)
+        except DBAPIError as exc:
+            raise ValueError(f"{pending_table} rows before line {number} rejected by the database: {exc.orig}") from None
+        pending.clear()
+
+    async for line in _lines(body):
+        number += 1
+        if not line.strip():
+            continue
+        table_name, row = decode(line, number)
+        if table_name != pending_table or len(pending) >= IMPORT_CHUNK:
+            await flush()
+            pending_table = table_name
+        pending.append(row)
+        counts[table_name] = counts.get(table_name, 0) + 1
+    await flush()
+    return counts
@@ -1,19 +1,38 @@
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
 from sqlalchemy.orm import sessionmaker
 import os
+import tempfile
 
-from ..src.main import app
-from ..src.database import Base, get_db
+# Воркеры jobs в тестах не запускаются, даже если тест войдет в lifespan:
+# задания обрабатываются явным вызовом jobs.process_next
+os.environ.setdefault("JOB_WORKERS_ENABLED", "false")
 
-# Используем отдельную БД для тестов
-TEST_DATABASE_URL = os.getenv("DATABASE_URL") + "_test"
+from src import cache, database, limits, metrics, migrations, reviewer_selection
+from src.main import app
+from src.database import DATABASE_URL, Base, get_session
+
+# Используем отдельную БД для тестов; без настроек — файл SQLite во временном каталоге.
+# Адрес сервиса берется уже нормализованным (драйвер psycopg2 из requirements),
+# к имени базы добавляется _test, параметры запроса сохраняются
+if os.getenv("TEST_DATABASE_URL"):
+    TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+elif DATABASE_URL:
+    url = make_url(DATABASE_URL)
+    TEST_DATABASE_URL = url.set(database=f"{url.database}_test").render_as_string(hide_password=False)
+else:
+    TEST_DATABASE_URL = "sqlite:///" + os.path.join(tempfile.gettempdir(), "avito_test.db")
 
 engine = create_engine(TEST_DATABASE_URL)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Счетчики SQL-запросов на HTTP-запрос (lifespan в тестах не запускается)
+metrics.instrument_engine(engine, "test")
 
-# Переопределяем зависимость get_db на тестовую
+# Переопределяем зависимость get_session на тестовую (синхронная сессия в пуле потоков)
 def override_get_db():
     try:
         db = TestingSessionLocal()
@@ -21,19 +40,60 @@ def override_get_db():
     finally:
         db.close()
 
-app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_session] = override_get_db
+
+# Та же база через асинхронный драйвер (aiosqlite/asyncpg): эндпоинты получают
+# AsyncSession, и async_crud выполняет crud через run_sync. Без пула: TestClient
+# запускает каждый запрос в новом event loop, а соединение привязано к своему
+async_engine = create_async_engine(database._async_url(TEST_DATABASE_URL), poolclass=NullPool)
+metrics.instrument_engine(async_engine.sync_engine, "test-async")
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
 
 @pytest.fixture(scope="session", autouse=True)
 def setup_database():
     # Создаем таблицы перед запуском тестов
-    Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
     yield
     # Удаляем таблицы после завершения тестов
     Base.metadata.drop_all(bind=engine)
 
 @pytest.fixture(scope="function")
-def client():
-    # Очищаем таблицы перед каждым тестом
-    for table in reversed(Base.metadata.sorted_tables):
-        engine.execute(table.delete())
+def client(request, monkeypatch):
+    # Очищаем таблицы и кэши процесса перед каждым тестом.
+    # parametrize("client", ["async"], indirect=True) — запросы через AsyncSession
+    if getattr(request, "param", "sync") == "async":
+        monkeypatch.setitem(app.dependency_overrides, get_session, override_get_async_db)
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    cache.teams.clear()
+    cache.users.clear()
+    reviewer_selection.index.clear()
+    if limits.buckets is not None:
+        limits.buckets.clear()
     return TestClient(app)
+
+@pytest.fixture
+def db():
+    # Прямой доступ к тестовой БД для проверки состояния после запросов
+    with TestingSessionLocal() as session:
+        yield session
+
+@pytest.fixture
+def query_stats(monkeypatch):
+    # Запрос сверх бюджета эндпоинта падает с QueryBudgetExceeded; в списке —
+    # RequestStats каждого HTTP-запроса
+    monkeypatch.setattr(metrics, "QUERY_BUDGET_MODE", "raise")
+    collected = []
+    metrics.request_observers.append(collected.append)
+    yield collected
+    metrics.request_observers.remove(collected.append)
+
+@pytest.fixture
+def session_factory():
+    # Фабрика сессий тестовой БД для кода вне HTTP-запросов (воркеры src/jobs.py)
+    return TestingSessionLocal
@@ -1,5 +1,9 @@
+import pytest
 from fastapi.testclient import TestClient
 
+from src import async_crud
+
+@pytest.mark.parametrize("client", ["sync", "async"], indirect=True)
 def test_full_flow(client: TestClient):
     # 1. Создаем команду
     team_payload = {
@@ -57,3 +61,55 @@ def test_full_flow(client: TestClient):
     response = client.post("/pullRequest/reassign", json=reassign_payload)
     assert response.status_code == 409
     assert response.json()["error"]["code"] == "PR_MERGED"
+
+
+def test_probes_before_startup(client: TestClient):
+    # Без lifespan (TestClient вне контекста) приложение еще не готово
+    assert client.get("/healthz").status_code == 200
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["status"] == "starting"
+
+
+@pytest.mark.parametrize("client", ["sync", "async"], indirect=True)
+def test_merge_batch_is_idempotent(client: TestClient):
+    members = [{"user_id": f"u{i}", "username": f"User {i}", "is_active": True} for i in range(4)]
+    client.post("/team/add", json={"team_name": "release", "members": members})
+    for i in range(3):
+        pr = {"pull_request_id": f"pr-{i}", "pull_request_name": f"PR {i}", "author_id": "u0"}
+        assert client.post("/pullRequest/create", json=pr).status_code == 201
+
+    first = client.post("/pullRequest/merge", json={"pull_request_id": "pr-0"}).json()["pr"]
+    response = client.post("/pullRequest/mergeBatch", json={"pull_request_ids": ["pr-0", "pr-1", "missing", "pr-2"]})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["pull_request_id"] for r in results] == ["pr-0", "pr-1", "missing", "pr-2"]
+    assert results[2]["error"]["code"] == "NOT_FOUND"
+    # Повторный merge не меняет время и состав ревьюеров
+    assert results[0]["pr"] == first
+    assert all(r["pr"]["status"] == "MERGED" and len(r["pr"]["assigned_reviewers"]) == 2 for r in results if r["pr"])
+
+    again = client.post("/pullRequest/mergeBatch", json={"pull_request_ids": ["pr-1", "pr-2"]}).json()["results"]
+    assert [r["pr"] for r in again] == [results[1]["pr"], results[3]["pr"]]
+    stats = client.get("/stats/teams", params={"team_name": "release"}).json()["teams"][0]
+    assert stats["prs_merged"] == 3 and stats["merged_reviews"] == 6
+
+@pytest.mark.parametrize("client", ["sync", "async"], indirect=True)
+def test_duplicate_created_after_check_is_a_conflict(client: TestClient, monkeypatch):
+    team = {"team_name": "backend", "members": [
+        {"user_id": f"u{i}", "username": f"User {i}", "is_active": True} for i in range(3)
+    ]}
+    pr = {"pull_request_id": "pr-1", "pull_request_name": "PR", "author_id": "u0"}
+    assert client.post("/team/add", json=team).status_code == 201
+    assert client.post("/pullRequest/create", json=pr).status_code == 201
+
+    # Параллельный запрос создал ту же команду и PR между проверкой и вставкой
+    async def not_found(db, key):
+        return None
+    monkeypatch.setattr(async_crud, "get_team_by_name", not_found)
+    monkeypatch.setattr(async_crud, "get_pr_by_id", not_found)
+
+    response = client.post("/team/add", json=team)
+    assert (response.status_code, response.json()["error"]["code"]) == (400, "TEAM_EXISTS")
+    response = client.post("/pullRequest/create", json=pr)
+    assert (response.status_code, response.json()["error"]["code"]) == (409, "PR_EXISTS")
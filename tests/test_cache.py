@@ -0,0 +1,27 @@
+from src.cache import LRUCache
+
+
+def test_lru_eviction_and_counters():
+    lru = LRUCache(maxsize=2, ttl=60)
+    lru.put("a", 1)
+    lru.put("b", 2)
+    assert lru.get("a") == 1
+    lru.put("c", 3)
+    assert lru.get("b") is None
+    assert lru.get("a") == 1
+    assert lru.get("c") == 3
+    assert lru.stats() == {"size": 2, "hits": 3, "misses": 1, "evictions": 1}
+
+
+def test_ttl_expiry():
+    lru = LRUCache(maxsize=10, ttl=-1)
+    lru.put("a", 1)
+    assert lru.get("a") is None
+
+
+def test_stale_read_is_not_cached_after_invalidation():
+    lru = LRUCache(maxsize=10, ttl=60)
+    generation = lru.generation
+    lru.pop("a")
+    lru.put("a", "stale", generation)
+    assert lru.get("a") is None
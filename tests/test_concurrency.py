@@ -0,0 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.testclient import TestClient
+
+from src import database
+
+
+def test_concurrent_reassigns_and_merge_keep_pr_consistent(client: TestClient, db):
+    members = [{"user_id": f"u{i}", "username": f"User {i}", "is_active": True} for i in range(10)]
+    assert client.post("/team/add", json={"team_name": "race", "members": members}).status_code == 201
+    pr = {"pull_request_id": "pr-race", "pull_request_name": "Race", "author_id": "u0"}
+    assert client.post("/pullRequest/create", json=pr).status_code == 201
+
+    def reassign(i):
+        # Старый ревьюер берется наугад: часть запросов ожидаемо получает NOT_ASSIGNED
+        body = {"pull_request_id": "pr-race", "old_user_id": f"u{1 + i % 9}"}
+        return "reassign", client.post("/pullRequest/reassign", json=body)
+
+    def merge(_):
+        return "merge", client.post("/pullRequest/merge", json={"pull_request_id": "pr-race"})
+
+    calls = [reassign] * 60
+    calls[30:30] = [merge] * 4
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(lambda args: args[1](args[0]), enumerate(calls)))
+
+    assert all(response.status_code < 500 for _, response in results)
+    merges = [response for kind, response in results if kind == "merge"]
+    assert all(response.status_code == 200 for response in merges)
+    reassigned = [response for kind, response in results if kind == "reassign" and response.status_code == 200]
+    for _, response in results:
+        if response.status_code == 409:
+            assert response.json()["error"]["code"] in ("PR_MERGED", "NOT_ASSIGNED", "CONFLICT")
+
+    # Состав ревьюеров не меняется после merge: все ответы merge видят один и тот же итог
+    final = client.get("/users/getReview", params={"user_id": merges[0].json()["pr"]["assigned_reviewers"][0]})
+    assert final.status_code == 200
+    reviewers = merges[0].json()["pr"]["assigned_reviewers"]
+    assert all(response.json()["pr"]["assigned_reviewers"] == reviewers for response in merges)
+    assert len(set(reviewers)) == 2 and "u0" not in reviewers
+
+    links = db.query(database.PullRequestReviewer).filter_by(pull_request_id="pr-race").all()
+    assert sorted(link.user_id for link in links) == sorted(reviewers)
+    assert {link.status for link in links} == {"MERGED"}
+    db_pr = db.get(database.PullRequest, "pr-race")
+    # Версия растет на каждое успешное изменение: 1 + reassign + один merge
+    assert db_pr.version == 1 + len(reassigned) + 1
+    counters = db.query(database.AssignmentCounter).all()
+    assert sum(c.reassignments for c in counters) == len(reassigned)
+    assert sum(c.assignments for c in counters) == 2 + len(reassigned)
+    assert sum(c.prs_merged for c in counters) == 1
@@ -0,0 +1,85 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import select, update
+
+from src import database
+
+
+def reviewers(db) -> dict[str, list[str]]:
+    db.expire_all()
+    result = {}
+    for pr_id, user_id in db.execute(
+        select(database.PullRequestReviewer.pull_request_id, database.PullRequestReviewer.user_id)
+    ):
+        result.setdefault(pr_id, []).append(user_id)
+    return {pr_id: sorted(users) for pr_id, users in result.items()}
+
+
+def test_mass_deactivation_reassigns_only_affected_open_reviews(client: TestClient, db):
+    # В команде из трех человек u1 и u2 ревьюят каждый PR u0, а u0 и u2 — PR u1
+    client.post("/team/add", json={"team_name": "backend", "members": [
+        {"user_id": f"u{i}", "username": f"User {i}", "is_active": True} for i in range(3)
+    ]})
+    for i in range(12):
+        client.post("/pullRequest/create", json={"pull_request_id": f"pr-{i:02}", "pull_request_name": "PR", "author_id": "u0"})
+    client.post("/pullRequest/create", json={"pull_request_id": "pr-u1", "pull_request_name": "PR", "author_id": "u1"})
+    client.post("/pullRequest/mergeBatch", json={"pull_request_ids": ["pr-09", "pr-10", "pr-11"]})
+    # Кандидаты без открытых ревью; c1 — автор части затронутых PR
+    client.post("/team/addMembers", json={"team_name": "backend", "members": [
+        {"user_id": f"c{i}", "username": f"Candidate {i}", "is_active": True} for i in range(1, 4)
+    ]})
+    db.execute(
+        update(database.PullRequest)
+        .where(database.PullRequest.pull_request_id.in_(["pr-00", "pr-01", "pr-02"]))
+        .values(author_id="c1")
+    )
+    db.commit()
+    # u0 не кандидат в замены: остаются только c1..c3
+    client.post("/users/setIsActive", json={"user_id": "u0", "is_active": False})
+    before = reviewers(db)
+
+    response = client.post("/team/deactivateMembers", json={"team_name": "backend", "user_ids": ["u1", "u2"]})
+
+    assert response.status_code == 200
+    open_prs = [f"pr-{i:02}" for i in range(9)]
+    assert sorted(response.json()["reassigned_prs"]) == open_prs + ["pr-u1"]
+    after = reviewers(db)
+    # Слитые PR сохраняют прежних ревьюеров
+    for pr_id in ("pr-09", "pr-10", "pr-11"):
+        assert after[pr_id] == before[pr_id] == ["u1", "u2"]
+    # В PR u1 заменен только ревьюер u2, u0 остается
+    assert before["pr-u1"] == ["u0", "u2"]
+    assert "u0" in after["pr-u1"] and "u2" not in after["pr-u1"] and len(after["pr-u1"]) == 2
+
+    loads = dict.fromkeys(["c1", "c2", "c3"], 0)
+    pr_authors = dict(db.execute(select(database.PullRequest.pull_request_id, database.PullRequest.author_id)).all())
+    for pr_id in open_prs:
+        new = after[pr_id]
+        # Два разных ревьюера, не автор и не деактивированные
+        assert len(set(new)) == 2 and set(new) <= set(loads), (pr_id, new)
+        assert pr_authors[pr_id] not in new
+        for user_id in new:
+            loads[user_id] += 1
+    assert "c1" not in after["pr-00"] + after["pr-01"] + after["pr-02"]
+    # Замены распределены между кандидатами поровну (±1)
+    loads[[user for user in after["pr-u1"] if user != "u0"][0]] += 1
+    assert max(loads.values()) - min(loads.values()) <= 1, loads
+
+
+def test_deactivation_keeps_existing_reviewer_and_skips_without_candidates(client: TestClient, db):
+    client.post("/team/add", json={"team_name": "backend", "members": [
+        {"user_id": f"u{i}", "username": f"User {i}", "is_active": True} for i in range(4)
+    ]})
+    client.post("/pullRequest/create", json={"pull_request_id": "pr-1", "pull_request_name": "PR", "author_id": "u0"})
+    reviewers_before = reviewers(db)["pr-1"]
+    free = ({"u1", "u2", "u3"} - set(reviewers_before)).pop()
+    gone = reviewers_before[0]
+
+    client.post("/team/deactivateMembers", json={"team_name": "backend", "user_ids": [gone]})
+    # Единственный допустимый кандидат — не автор и не оставшийся ревьюер
+    assert reviewers(db)["pr-1"] == sorted([reviewers_before[1], free])
+
+    # Других кандидатов нет: ревьюер остается, PR не попадает в ответ
+    response = client.post("/team/deactivateMembers", json={"team_name": "backend", "user_ids": [free]})
+    assert response.status_code == 200
+    assert response.json()["reassigned_prs"] == []
+    assert reviewers(db)["pr-1"] == sorted([reviewers_before[1], free])
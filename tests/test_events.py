@@ -0,0 +1,92 @@
+from datetime import date, datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from src import database, migrations
+
+
+def setup_teams(client: TestClient):
+    for team, prefix in (("backend", "u"), ("frontend", "f")):
+        client.post("/team/add", json={"team_name": team, "members": [
+            {"user_id": f"{prefix}{i}", "username": f"{prefix}{i}", "is_active": True} for i in range(4)
+        ]})
+
+
+def test_pull_request_history(client: TestClient):
+    setup_teams(client)
+    pr = client.post("/pullRequest/create", json={
+        "pull_request_id": "pr-1", "pull_request_name": "PR 1", "author_id": "u0",
+    }).json()["pr"]
+    old = pr["assigned_reviewers"][0]
+    new = client.post("/pullRequest/reassign", json={"pull_request_id": "pr-1", "old_user_id": old}).json()["replaced_by"]
+    client.post("/pullRequest/merge", json={"pull_request_id": "pr-1"})
+    client.post("/pullRequest/merge", json={"pull_request_id": "pr-1"})
+
+    response = client.get("/pullRequest/history", params={"pull_request_id": "pr-1"})
+
+    assert response.status_code == 200
+    events = response.json()["events"]
+    assert [e["event_type"] for e in events] == ["CREATED", "ASSIGNED", "ASSIGNED", "REASSIGNED", "MERGED"]
+    assert {e["user_id"] for e in events[1:3]} == set(pr["assigned_reviewers"])
+    assert (events[3]["user_id"], events[3]["previous_user_id"]) == (new, old)
+    assert events[-1]["user_id"] == "u0"
+    assert client.get("/pullRequest/history", params={"pull_request_id": "nope"}).status_code == 404
+
+
+def test_time_to_merge_and_reassignment_rate(client: TestClient):
+    setup_teams(client)
+    client.post("/pullRequest/createBatch", json={"pull_requests": [
+        {"pull_request_id": f"pr-{i}", "pull_request_name": f"PR {i}", "author_id": author}
+        for i, author in enumerate(["u0", "u1", "f0"])
+    ]})
+    client.post("/pullRequest/mergeBatch", json={"pull_request_ids": ["pr-0", "pr-2"]})
+    client.post("/team/deactivateMembers", json={"team_name": "frontend", "user_ids": ["f1", "f2"]})
+
+    merged = client.get("/stats/timeToMerge").json()["teams"]
+    assert [(t["team_name"], t["merged_prs"]) for t in merged] == [("backend", 1), ("frontend", 1)]
+    assert all(0 <= t["avg_seconds"] <= t["max_seconds"] < 60 for t in merged)
+
+    rates = {t["team_name"]: t for t in client.get("/stats/reassignmentRate").json()["teams"]}
+    assert (rates["backend"]["assignments"], rates["backend"]["reassignments"]) == (4, 0)
+    # pr-2 смержен: его ревьюеры не переназначаются
+    assert (rates["frontend"]["assignments"], rates["frontend"]["reassignment_rate"]) == (2, 0.0)
+
+    filtered = client.get("/stats/reassignmentRate", params={"team_name": "backend"}).json()["teams"]
+    assert [t["team_name"] for t in filtered] == ["backend"]
+    tomorrow = (date.today() + timedelta(days=1)).isoformat()
+    assert client.get("/stats/timeToMerge", params={"date_from": tomorrow}).json()["teams"] == []
+    assert client.get("/stats/timeToMerge", params={"team_name": "nope"}).status_code == 404
+
+
+def test_backfill_inserts_events_in_time_order():
+    engine = create_engine("sqlite://")
+    database.Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(database.Team(team_name="t"))
+        db.add_all([database.User(user_id=u, username=u, team_name="t", is_active=True) for u in "abc"])
+        db.flush()
+        # Порядок ключей PR обратен порядку времени
+        for pr_id, day in (("p1", 3), ("p2", 1)):
+            created = datetime(2024, 1, day)
+            db.add(database.PullRequest(pull_request_id=pr_id, pull_request_name=pr_id, author_id="a",
+                                        status="MERGED", created_at=created, merged_at=created + timedelta(days=1)))
+            db.flush()
+            db.add(database.PullRequestReviewer(pull_request_id=pr_id, user_id="b", status="MERGED",
+                                                assigned_at=created, pr_created_at=created))
+        db.commit()
+
+    migrations.upgrade(engine)
+    migrations.upgrade(engine)
+
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(database.PrEvent.occurred_at, database.PrEvent.pull_request_id, database.PrEvent.event_type)
+            .order_by(database.PrEvent.event_id)
+        ).all()
+    assert [(row.pull_request_id, row.event_type) for row in rows] == [
+        ("p2", "CREATED"), ("p2", "ASSIGNED"), ("p2", "MERGED"),
+        ("p1", "CREATED"), ("p1", "ASSIGNED"), ("p1", "MERGED"),
+    ]
+    assert [row.occurred_at for row in rows] == sorted(row.occurred_at for row in rows)
@@ -0,0 +1,97 @@
+from fastapi.testclient import TestClient
+
+from src import crud, database, jobs
+
+
+def seed(client: TestClient, prs: int = 12):
+    members = [{"user_id": f"u{i}", "username": f"User {i}", "is_active": True} for i in range(6)]
+    client.post("/team/add", json={"team_name": "backend", "members": members})
+    for i in range(prs):
+        client.post("/pullRequest/create", json={"pull_request_id": f"pr-{i:02}", "pull_request_name": "PR", "author_id": "u0"})
+
+
+def open_reviews(db, user_ids):
+    return set(db.scalars(crud._open_reviews_of(user_ids)))
+
+
+def test_background_deactivation_runs_in_chunks(client: TestClient, session_factory, db, monkeypatch):
+    seed(client)
+    affected = open_reviews(db, ["u1", "u2"])
+    monkeypatch.setattr(jobs, "JOB_CHUNK_SIZE", 3)
+    monkeypatch.setattr(crud, "JOB_RESULT_SAMPLE", 4)
+
+    response = client.post("/team/deactivateMembersAsync", json={"team_name": "backend", "user_ids": ["u1", "u2"]})
+    assert response.status_code == 202
+    job = response.json()["job"]
+    assert (job["status"], job["total"], job["processed"]) == ("QUEUED", len(affected), 0)
+    # Пользователи деактивированы сразу, в новые PR их уже не назначат
+    assert client.get("/team/get", params={"team_name": "backend"}).json()["members"][1]["is_active"] is False
+
+    with session_factory() as worker_db:
+        claimed = jobs.run_chunk(worker_db, jobs.claim(worker_db))
+        progress = client.get(f"/jobs/{job['job_id']}").json()["job"]
+        assert (progress["status"], progress["processed"]) == ("RUNNING", 3)
+        assert (progress["reassigned"], len(progress["reassigned_prs"])) == (3, 3)
+        chunks = 1
+        while claimed.status == "RUNNING":
+            claimed = jobs.run_chunk(worker_db, claimed)
+            chunks += 1
+    assert chunks == len(affected) // 3 + 1
+
+    done = client.get(f"/jobs/{job['job_id']}").json()["job"]
+    assert (done["status"], done["processed"]) == ("DONE", len(affected))
+    assert done["reassigned"] == len(affected)
+    # В результате — только первые JOB_RESULT_SAMPLE id
+    assert len(done["reassigned_prs"]) == 4 and set(done["reassigned_prs"]) < affected
+    db.expire_all()
+    assert open_reviews(db, ["u1", "u2"]) == set()
+
+
+def test_worker_that_lost_its_lease_cannot_commit(client: TestClient, session_factory, monkeypatch):
+    seed(client, prs=4)
+    monkeypatch.setattr(jobs, "JOB_CHUNK_SIZE", 2)
+    job_id = client.post("/team/deactivateMembersAsync", json={"team_name": "backend", "user_ids": ["u1"]}).json()["job"]["job_id"]
+
+    # Аренда истекает сразу: задание у "зависшего" воркера забирает следующий
+    monkeypatch.setattr(jobs, "JOB_LEASE_SECONDS", -1)
+    with session_factory() as stale_db, session_factory() as fresh_db:
+        stale = jobs.claim(stale_db)
+        fresh = jobs.claim(fresh_db)
+        assert (stale.attempts, fresh.attempts) == (1, 2)
+        assert jobs.run_chunk(stale_db, stale) is None
+        assert jobs.claim(stale_db) is not None  # аренда fresh тоже истекла
+    monkeypatch.setattr(jobs, "JOB_LEASE_SECONDS", 60)
+    assert jobs.run_pending(session_factory) == 1
+
+    job = client.get(f"/jobs/{job_id}").json()["job"]
+    assert job["status"] == "DONE"
+    assert job["processed"] == job["total"]
+    assert len(job["reassigned_prs"]) == len(set(job["reassigned_prs"]))
+
+
+def test_pr_merged_between_chunk_selection_and_processing_is_skipped(client: TestClient, session_factory, db, monkeypatch):
+    seed(client, prs=4)
+    # Ревьюеры выбираются случайно: деактивируется ревьюер pr-00
+    user_id = db.query(database.PullRequestReviewer).filter_by(pull_request_id="pr-00").first().user_id
+    affected = sorted(open_reviews(db, [user_id]))
+    client.post("/team/deactivateMembersAsync", json={"team_name": "backend", "user_ids": [user_id]})
+
+    reassign = crud.reassign_open_reviews
+
+    def merge_first(worker_db, team_name, user_ids, pr_ids):
+        # Merge фиксируется другим запросом уже после выборки пачки
+        assert client.post("/pullRequest/merge", json={"pull_request_id": affected[0]}).status_code == 200
+        return reassign(worker_db, team_name, user_ids, pr_ids)
+
+    monkeypatch.setattr(crud, "reassign_open_reviews", merge_first)
+    assert jobs.run_pending(session_factory) == 1
+
+    db.expire_all()
+    links = db.query(database.PullRequestReviewer).filter_by(pull_request_id=affected[0]).all()
+    assert {(link.user_id, link.status) for link in links} >= {(user_id, "MERGED")}
+    assert all(link.status == "MERGED" for link in links)
+    assert open_reviews(db, [user_id]) == set()
+
+
+def test_unknown_job_is_not_found(client: TestClient):
+    assert client.get("/jobs/missing").json()["error"]["code"] == "NOT_FOUND"
@@ -0,0 +1,72 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from src import limits
+from src.main import app
+
+
+def test_token_bucket_allows_burst_then_refills():
+    buckets = limits.TokenBuckets(rate=2, burst=3, max_clients=2)
+
+    assert [buckets.take("a", now=0) for _ in range(3)] == [0, 0, 0]
+    assert buckets.take("a", now=0) == 0.5
+    assert buckets.take("a", now=0.5) == 0
+    assert buckets.take("b", now=0) == 0
+    # Третий клиент вытесняет самого давнего, "a" снова начинает с полного бакета
+    buckets.take("c", now=0)
+    assert buckets.take("a", now=0.5) == 0
+
+
+def test_slots_wait_with_deadline_and_hand_over():
+    async def scenario():
+        slots = limits.Slots(1)
+        assert await slots.acquire(0)
+        assert not await slots.acquire(0.01)
+        waiting = asyncio.create_task(slots.acquire(1))
+        await asyncio.sleep(0)
+        slots.release()
+        assert await waiting
+        slots.release()
+        return slots.used
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_client_over_rate_limit_gets_429(client: TestClient, monkeypatch):
+    monkeypatch.setattr(limits, "buckets", limits.TokenBuckets(rate=0.1, burst=2))
+    responses = [client.get("/team/get", params={"team_name": "none"}) for _ in range(3)]
+
+    assert [r.status_code for r in responses] == [404, 404, 429]
+    assert responses[-1].json()["error"]["code"] == "RATE_LIMITED"
+    assert responses[-1].headers["Retry-After"] == "10"
+    assert client.get("/healthz").status_code == 200
+
+
+def test_database_routes_fail_fast_when_saturated(client: TestClient, monkeypatch):
+    monkeypatch.setattr(limits, "db_slots", limits.Slots(0))
+    monkeypatch.setattr(limits, "BACKPRESSURE_DEADLINE", 0.01)
+
+    response = client.post("/pullRequest/create", json={"pull_request_id": "pr-1", "pull_request_name": "PR", "author_id": "u1"})
+
+    assert response.status_code == 503
+    assert response.json()["error"]["code"] == "OVERLOADED"
+    assert response.headers["Retry-After"] == "1"
+    assert client.get("/cache/stats").status_code == 200
+    assert 'http_rejected_total{route="/pullRequest/create",reason="overloaded"}' in client.get("/metrics").text
+
+
+def test_routes_are_resolved_once_per_path(monkeypatch):
+    middleware = limits.LimitMiddleware(app)
+    calls = []
+    match = limits._match
+    monkeypatch.setattr(limits, "_match", lambda scope: calls.append(scope["path"]) or match(scope))
+    scope = {"type": "http", "app": app, "method": "GET", "path": "/team/get", "root_path": "", "headers": []}
+
+    route, needs_db = middleware._resolve(scope)
+    assert middleware._resolve(dict(scope)) == (route, needs_db)
+    assert route.path == "/team/get" and needs_db
+    assert middleware._resolve({**scope, "path": "/healthz"})[1] is False
+    assert middleware._resolve({**scope, "path": "/missing"}) == (None, False)
+    middleware._resolve({**scope, "path": "/missing"})
+    assert calls == ["/team/get", "/healthz", "/missing", "/missing"]
@@ -0,0 +1,212 @@
+import pytest
+
+from src import crud, memory_store, schemas, storage
+from src.memory_store import MemoryStore
+from src.reviewer_selection import LeastLoadedStrategy
+
+
+def make_store(data_dir="", **kwargs):
+    store = MemoryStore(data_dir=data_dir, snapshot_interval=0, strategy=LeastLoadedStrategy(), **kwargs)
+    store.create_team_with_members(schemas.TeamAddRequest(team_name="t", members=[
+        schemas.TeamMember(user_id=f"u{i}", username=f"U{i}", is_active=True) for i in range(5)
+    ]))
+    return store
+
+
+def create_pr(store, pr_id, author_id="u0"):
+    reviewers = store.choose_reviewers("t", exclude={author_id})
+    return store.create_pr(
+        schemas.PullRequestCreateRequest(pull_request_id=pr_id, pull_request_name=pr_id, author_id=author_id), reviewers
+    )
+
+
+def test_recovers_from_snapshot_and_wal(tmp_path):
+    store = make_store(str(tmp_path))
+    pr = create_pr(store, "pr-1")
+    store.snapshot()
+    store.replace_reviewer(pr, pr.reviewers[0], "u4" if "u4" not in pr.reviewers else "u3")
+    merged = store.merge_pr("pr-1")
+    store.set_user_active("u2", False)
+    store._wal.close()
+    # Оборванная при сбое строка в конце WAL отбрасывается
+    with open(store._wal.segment_path(store._wal.generation), "a") as f:
+        f.write('[{"op":"user","user_id":"u9"')
+
+    recovered = MemoryStore(data_dir=str(tmp_path), snapshot_interval=0)
+    assert recovered.get_pr_by_id("pr-1") == merged
+    assert recovered.get_user_by_id("u2").is_active is False
+    assert recovered.get_user_by_id("u9") is None
+    assert [row.prs_merged for row in recovered.get_assignment_stats("t") if row.user_id == "u0"] == [1]
+    # Снимок после восстановления удалил прочитанные сегменты
+    assert sorted(p.name for p in tmp_path.glob("wal.*")) == [f"wal.{recovered._wal.generation}.jsonl"]
+    # id событий из снимка и WAL те же, новые продолжают последовательность
+    assert recovered.get_pr_events("pr-1") == store.get_pr_events("pr-1")
+    create_pr(recovered, "pr-2")
+    assert recovered.get_pr_events("pr-2")[0].event_id == max(recovered._events) - 2
+    assert len(recovered._events) == len(store._events) + 3
+
+
+def test_snapshot_is_written_outside_the_store_lock(tmp_path, monkeypatch):
+    store = make_store(str(tmp_path))
+    create_pr(store, "pr-1")
+    write_snapshot = store._wal.write_snapshot
+
+    def write_during_snapshot(chunks, generation):
+        # Изменения не ждут записи снимка и попадают в новый сегмент WAL
+        assert store._apply_lock.acquire(blocking=False)
+        store._apply_lock.release()
+        create_pr(store, "pr-2")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(store._wal, "write_snapshot", write_during_snapshot)
+    with pytest.raises(OSError):
+        store.snapshot()
+    monkeypatch.setattr(store._wal, "write_snapshot", write_snapshot)
+    store.merge_pr("pr-1")
+    store._wal.close()
+
+    # Недописанный снимок не теряет изменения и не применяет их дважды
+    recovered = MemoryStore(data_dir=str(tmp_path), snapshot_interval=0)
+    assert set(recovered._prs) == {"pr-1", "pr-2"}
+    assert recovered.get_pr_by_id("pr-1").status == "MERGED"
+    assert [row.prs_created for row in recovered.get_assignment_stats("t") if row.user_id == "u0"] == [2]
+    assert len(recovered._events) == len(store._events)
+
+
+def test_reviews_keyset_pages_cover_history_once():
+    store = make_store()
+    for i in range(12):
+        pr = create_pr(store, f"pr-{i:02}")
+        if i % 3 == 0:
+            store.merge_pr(pr.pull_request_id)
+    reviewer = "u1"
+    expected = sorted(
+        (pr for pr in store._prs.values() if reviewer in pr.reviewers),
+        key=lambda pr: (pr.created_at, pr.pull_request_id), reverse=True,
+    )
+
+    seen, cursor = [], None
+    while True:
+        rows, cursor = store.get_reviews_for_user(
+            reviewer, limit=2, after=crud.decode_review_cursor(cursor) if cursor else None
+        )
+        seen += rows
+        if cursor is None:
+            break
+    assert seen == expected
+    open_rows, _ = store.get_reviews_for_user(reviewer, status="OPEN", limit=100)
+    assert all(row.status == "OPEN" for row in open_rows)
+
+
+def test_deactivation_moves_open_reviews_to_active_members():
+    store = make_store()
+    for i in range(6):
+        create_pr(store, f"pr-{i}")
+    team = store.get_team_by_name("t")
+
+    reassigned = store.deactivate_and_reassign(team, ["u1", "u2"])
+
+    assert reassigned
+    for pr in store._prs.values():
+        assert not {"u1", "u2"} & set(pr.reviewers)
+        assert "u0" not in pr.reviewers
+    assert store.get_reviews_for_user("u1", status="OPEN")[0] == []
+
+
+def test_background_deactivation_completes_immediately():
+    store = make_store()
+    for i in range(4):
+        create_pr(store, f"pr-{i}")
+    affected = {pr.pull_request_id for pr in store._prs.values() if "u1" in pr.reviewers}
+
+    job = store.enqueue_deactivation(store.get_team_by_name("t"), ["u1"])
+
+    assert (job.status, job.total, job.processed) == ("DONE", len(affected), len(affected))
+    assert set(job.result["reassigned_prs"]) == affected
+    assert job.result["reassigned"] == len(affected)
+    assert store.get_job(job.job_id) == job
+
+
+def test_stale_pr_version_is_rejected():
+    store = make_store()
+    stale = create_pr(store, "pr-1")
+    store.replace_reviewer(stale, stale.reviewers[0], "u4" if "u4" not in stale.reviewers else "u3")
+
+    with pytest.raises(crud.VersionConflict):
+        store.replace_reviewer(stale, stale.reviewers[1], "u2" if "u2" not in stale.reviewers else "u1")
+    assert store.merge_pr("pr-1").version == stale.version + 2
+
+
+def test_pr_events_and_analytics():
+    store = make_store()
+    for i in range(4):
+        create_pr(store, f"pr-{i}")
+    store.merge_prs_batch(["pr-0"])
+    reviewer = store._prs["pr-1"].reviewers[0]
+    reassigned = sum(reviewer in store._prs[f"pr-{i}"].reviewers for i in range(1, 4))
+    store.deactivate_and_reassign(store.get_team_by_name("t"), [reviewer])
+
+    events = store.get_pr_events("pr-1")
+    assert [e.event_type for e in events] == ["CREATED", "ASSIGNED", "ASSIGNED", "REASSIGNED"]
+    assert events[-1].previous_user_id == reviewer
+    assert [e.event_type for e in store.get_pr_events("pr-0")][-1] == "MERGED"
+
+    [merged] = store.get_time_to_merge()
+    assert (merged.team_name, merged.merged_prs) == ("t", 1)
+    [rate] = store.get_reassignment_rates(team_name="t")
+    assert (rate.assignments, rate.reassignments) == (8 + reassigned, reassigned)
+
+
+def test_sync_teams_matches_sql_semantics(tmp_path):
+    store = make_store(str(tmp_path))
+    member = lambda user_id, active=True: schemas.TeamMember(user_id=user_id, username=user_id, is_active=active)
+
+    result = store.sync_teams([
+        schemas.TeamAddRequest(team_name="a", members=[member("u1"), member("x")]),
+        schemas.TeamAddRequest(team_name="b", members=[member("x", active=False)]),
+        schemas.TeamAddRequest(team_name="t", members=[member("u0")]),
+    ])
+
+    # Состав в ответе — после шага своей команды; x остается в последней
+    assert [{m.user_id for m in team.members} for team in result] == [{"u1", "x"}, {"x"}, {"u0", "u2", "u3", "u4"}]
+    assert {m.user_id for m in store.get_team_by_name("a").members} == {"u1"}
+    assert (store.get_user_by_id("x").team_name, store.get_user_by_id("x").is_active) == ("b", False)
+    # Вся синхронизация — одна строка WAL: после сбоя применяется целиком или никак
+    store._wal.close()
+    with open(store._wal.segment_path(store._wal.generation)) as f:
+        assert len(f.readlines()) == 2
+    recovered = MemoryStore(data_dir=str(tmp_path), snapshot_interval=0)
+    assert {m.user_id for m in recovered.get_team_by_name("b").members} == {"x"}
+    assert recovered.get_user_by_id("u1").team_name == "a"
+
+
+def test_storage_contract_is_checked():
+    class Renamed(MemoryStore):
+        def get_reviews_for_user(self, user_id, status=None, limit=100, cursor=None):
+            return []
+
+    # crud и MemoryStore проверены при импорте; расхождение в параметрах — TypeError
+    with pytest.raises(TypeError, match="get_reviews_for_user"):
+        storage.check(Renamed)
+    with pytest.raises(TypeError, match="does not implement"):
+        storage.check(type("Empty", (), {}))
+
+
+def test_duplicate_team_and_pr_raise_already_exists():
+    store = make_store()
+    create_pr(store, "pr-1")
+
+    with pytest.raises(crud.AlreadyExists):
+        store.create_team_with_members(schemas.TeamAddRequest(team_name="t", members=[]))
+    with pytest.raises(crud.AlreadyExists):
+        create_pr(store, "pr-1")
+
+
+def test_job_history_is_bounded(monkeypatch):
+    monkeypatch.setattr(memory_store, "MEMORY_JOB_HISTORY", 2)
+    store = make_store()
+    team = store.get_team_by_name("t")
+    jobs = [store.enqueue_deactivation(team, [f"u{i}"]) for i in range(1, 4)]
+
+    assert store.get_job(jobs[0].job_id) is None
+    assert [store.get_job(job.job_id) for job in jobs[1:]] == jobs[1:]
@@ -0,0 +1,52 @@
+import threading
+
+from sqlalchemy import create_engine, text
+
+from src import metrics
+from src.metrics import Registry
+
+
+def test_histogram_and_counters_are_merged_across_threads():
+    registry = Registry()
+    registry.counter("requests_total", "requests", ("route",))
+    registry.histogram("latency_seconds", "latency", ("route",), buckets=(0.1, 1.0))
+
+    def work():
+        for value in (0.05, 0.5, 5.0):
+            registry.inc("requests_total", ("/a",))
+            registry.observe("latency_seconds", ("/a",), value)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    lines = registry.render().splitlines()
+    assert 'requests_total{route="/a"} 12' in lines
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 4' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 8' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 12' in lines
+    assert 'latency_seconds_count{route="/a"} 12' in lines
+
+
+def test_pool_metrics_survive_engine_dispose(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    metrics.instrument_engine(engine, "dispose-test")
+
+    def sample(name):
+        prefix = f'{name}{{pool="dispose-test"}} '
+        return next(float(line[len(prefix):]) for line in metrics.registry.render().splitlines() if line.startswith(prefix))
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        assert sample("db_pool_connections_in_use") == 1
+    engine.dispose()
+    # Новый пул после dispose наследует обработчики событий
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    assert sample("db_pool_checkouts_total") == 2
+    assert sample("db_pool_connects_total") == 2
+    assert sample("db_pool_connections_in_use") == 0
+    assert sample("db_pool_connection_hold_seconds_count") == 2
@@ -0,0 +1,36 @@
+from sqlalchemy import create_engine, inspect, text
+
+from src import database, migrations
+
+
+def test_reviewers_column_is_moved_to_pr_reviewers_in_chunks(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    database.Base.metadata.create_all(engine)
+    # Старая схема: ревьюеры строкой в pull_requests.reviewers
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE pull_requests ADD COLUMN reviewers VARCHAR"))
+        conn.execute(text("INSERT INTO teams (team_name) VALUES ('t')"))
+        for user_id in ("u0", "u1", "u2", "u3"):
+            conn.execute(text(
+                "INSERT INTO users (user_id, username, team_name, is_active) VALUES (:u, :u, 't', 1)"
+            ), {"u": user_id})
+        for i in range(5):
+            conn.execute(text(
+                "INSERT INTO pull_requests (pull_request_id, pull_request_name, author_id, status, created_at, reviewers) "
+                "VALUES (:pr, 'PR', 'u0', 'OPEN', '2025-01-01 00:00:00', :reviewers)"
+            ), {"pr": f"pr-{i}", "reviewers": "u3" if i == 3 else "u1, u2,ghost,u1"})
+        # Часть связей уже есть в новой таблице
+        conn.execute(text(
+            "INSERT INTO pr_reviewers (pull_request_id, user_id, status, assigned_at, pr_created_at) "
+            "VALUES ('pr-0', 'u1', 'OPEN', '2025-01-01 00:00:00', '2025-01-01 00:00:00')"
+        ))
+    monkeypatch.setattr(migrations, "BACKFILL_CHUNK", 2)
+
+    migrations.upgrade(engine)
+
+    with engine.connect() as conn:
+        links = sorted(conn.execute(text("SELECT pull_request_id, user_id FROM pr_reviewers")).all())
+        columns = {column["name"] for column in inspect(conn).get_columns("pull_requests")}
+    # Неизвестные пользователи и повторы пропущены
+    assert links == [(f"pr-{i}", user_id) for i in range(5) for user_id in (["u3"] if i == 3 else ["u1", "u2"])]
+    assert "reviewers" not in columns
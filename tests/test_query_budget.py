@@ -0,0 +1,110 @@
+import pytest
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from src import cache, limits, metrics, reviewer_selection
+from src.main import app
+
+
+def cold(client: TestClient, method: str, path: str, **kwargs):
+    # Бюджеты рассчитаны на холодный кэш: каждый вызов читает все из БД
+    cache.teams.clear()
+    cache.users.clear()
+    reviewer_selection.index.clear()
+    response = client.request(method, path, **kwargs)
+    assert response.status_code < 300, response.text
+    return response
+
+
+def test_endpoints_stay_within_query_budget(client: TestClient, query_stats):
+    members = [{"user_id": f"u{i}", "username": f"User {i}", "is_active": True} for i in range(8)]
+    cold(client, "POST", "/team/add", json={"team_name": "backend", "members": members[:6]})
+    cold(client, "POST", "/team/addMembers", json={"team_name": "backend", "members": members[6:]})
+    cold(client, "POST", "/team/sync", json={"teams": [{"team_name": "frontend", "members": [
+        {"user_id": f"f{i}", "username": f"F {i}", "is_active": True} for i in range(3)
+    ]}]})
+    cold(client, "GET", "/team/get", params={"team_name": "backend"})
+    cold(client, "POST", "/users/setIsActive", json={"user_id": "u7", "is_active": False})
+    pr = cold(client, "POST", "/pullRequest/create", json={
+        "pull_request_id": "pr-0", "pull_request_name": "PR 0", "author_id": "u0",
+    }).json()["pr"]
+    cold(client, "POST", "/pullRequest/createBatch", json={"pull_requests": [
+        {"pull_request_id": f"pr-{i}", "pull_request_name": f"PR {i}", "author_id": f"u{i % 6}"} for i in range(1, 40)
+    ]})
+    cold(client, "POST", "/pullRequest/reassign", json={"pull_request_id": "pr-0", "old_user_id": pr["assigned_reviewers"][0]})
+    cold(client, "POST", "/pullRequest/merge", json={"pull_request_id": "pr-0"})
+    cold(client, "POST", "/pullRequest/mergeBatch", json={"pull_request_ids": [f"pr-{i}" for i in range(1, 20)]})
+    cold(client, "GET", "/users/getReview", params={"user_id": "u1"})
+    cold(client, "GET", "/stats/assignments", params={"team_name": "backend"})
+    cold(client, "GET", "/stats/teams", params={"team_name": "backend"})
+    cold(client, "GET", "/pullRequest/history", params={"pull_request_id": "pr-0"})
+    cold(client, "GET", "/stats/timeToMerge", params={"team_name": "backend"})
+    cold(client, "GET", "/stats/reassignmentRate")
+    cold(client, "POST", "/team/deactivateMembers", json={"team_name": "backend", "user_ids": ["u1", "u2", "u3"]})
+    job = cold(client, "POST", "/team/deactivateMembersAsync", json={"team_name": "backend", "user_ids": ["u4"]})
+    cold(client, "GET", f"/jobs/{job.json()['job']['job_id']}")
+    cold(client, "GET", "/export")
+
+    assert len(query_stats) == 20
+    for stats in query_stats:
+        assert stats.queries <= stats.budget, stats.route
+        assert stats.repeated() == [], stats.route
+
+
+
+def test_team_sync_query_count_does_not_grow_with_teams(client: TestClient, query_stats):
+    def sync(teams: int):
+        return cold(client, "POST", "/team/sync", json={"teams": [
+            {"team_name": f"team-{t}", "members": [
+                {"user_id": f"t{t}-{i}", "username": f"T{t} {i}", "is_active": True} for i in range(5)
+            ]}
+            for t in range(teams)
+        ]})
+
+    sync(2)
+    response = sync(12)
+
+    assert [len(team["members"]) for team in response.json()["teams"]] == [5] * 12
+    assert query_stats[0].queries == query_stats[1].queries <= query_stats[1].budget
+
+
+def test_every_database_route_declares_budget():
+    for route in app.routes:
+        if not isinstance(route, APIRoute):
+            continue
+        assert limits.uses_db(route) == hasattr(route.endpoint, "query_budget"), route.path
+
+
+def test_query_over_budget_raises(client: TestClient, query_stats, monkeypatch):
+    client.post("/team/add", json={"team_name": "backend", "members": []})
+    endpoint = next(route.endpoint for route in app.routes if getattr(route, "path", None) == "/team/get")
+    monkeypatch.setattr(endpoint, "query_budget", 0)
+    cache.teams.clear()
+
+    with pytest.raises(metrics.QueryBudgetExceeded, match="/team/get: 1 SQL statements, budget 0"):
+        client.get("/team/get", params={"team_name": "backend"})
+
+
+def test_repeated_statements_are_reported(monkeypatch):
+    monkeypatch.setattr(metrics, "QUERY_REPEAT_LIMIT", 2)
+    stats = metrics.RequestStats()
+    stats.statements = ["SELECT users"] * 3 + ["SELECT teams"] * 2
+
+    assert stats.repeated() == [("SELECT users", 3)]
+
+
+def test_budget_exempt_statements_are_not_counted():
+    # Так исполняется служебный pg_notify из cache.publish
+    engine = create_engine("sqlite://")
+    metrics.instrument_engine(engine, "exempt")
+    stats = metrics.RequestStats()
+    token = metrics.current_request.set(stats)
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"), execution_options={"query_budget_exempt": True})
+    finally:
+        metrics.current_request.reset(token)
+
+    assert stats.queries == 1
@@ -0,0 +1,92 @@
+import pytest
+
+from src import reviewer_selection
+from src.reviewer_selection import ReviewerIndex, TeamState, get_strategy
+
+
+def make_index(strategy: str, members):
+    index = ReviewerIndex(get_strategy(strategy), ttl=3600)
+    index._install(TeamState("team", members))
+    return index
+
+
+def pick(index, k=2, exclude=()):
+    with index._lock:
+        return index._select(index._teams["team"], k, set(exclude))
+
+
+@pytest.mark.parametrize("strategy", sorted(reviewer_selection.STRATEGIES))
+def test_rules_are_kept(strategy):
+    index = make_index(strategy, [("u1", True, 0), ("u2", True, 0), ("u3", False, 0), ("u4", True, 0)])
+    for _ in range(20):
+        chosen = pick(index, exclude={"u1"})
+        assert len(chosen) == 2
+        assert len(set(chosen)) == 2
+        assert "u1" not in chosen
+        assert "u3" not in chosen
+    assert pick(index, exclude={"u1", "u2", "u4"}) == []
+    assert pick(index, exclude={"u1", "u2"}) == ["u4"]
+
+
+def test_least_loaded_prefers_free_reviewers():
+    index = make_index("least_loaded", [("u1", True, 5), ("u2", True, 0), ("u3", True, 1), ("u4", True, 3)])
+    assert set(pick(index)) == {"u2", "u3"}
+
+    for _ in range(3):
+        index.pr_created(["u2", "u3"])
+    assert set(pick(index)) == {"u2", "u4"}
+
+
+def test_weighted_round_robin_rotates_by_load():
+    index = make_index("weighted_round_robin", [("u1", True, 0), ("u2", True, 0), ("u3", True, 4)])
+    counts = {"u1": 0, "u2": 0, "u3": 0}
+    for _ in range(60):
+        counts[pick(index, k=1)[0]] += 1
+    assert counts["u1"] == counts["u2"]
+    assert counts["u3"] < counts["u1"]
+
+
+def test_events_update_index_incrementally():
+    index = make_index("least_loaded", [("u1", True, 0), ("u2", True, 0), ("u3", True, 0)])
+
+    index.users_deactivated(["u1"])
+    assert "u1" not in pick(index, k=3)
+
+    index.user_activity_changed("u1", True)
+    index.pr_created(["u2", "u3"])
+    assert pick(index, k=1) == ["u1"]
+
+    index.reviewer_replaced("u2", "u1")
+    index.pr_merged(["u1", "u3"])
+    assert index._teams["team"].loads == {"u1": 0, "u2": 0, "u3": 0}
+
+    index.invalidate(user_ids=["u2"])
+    assert "team" not in index._teams
+
+
+@pytest.mark.parametrize("client", ["sync", "async"], indirect=True)
+def test_stale_index_never_assigns_inactive_users(client, db):
+    from sqlalchemy import update
+
+    from src import database
+
+    client.post("/team/add", json={"team_name": "backend", "members": [
+        {"user_id": f"u{i}", "username": f"User {i}", "is_active": True} for i in range(5)
+    ]})
+    # Индекс прогрет; затем другой воркер деактивирует u1..u3 в обход индекса этого процесса
+    client.post("/pullRequest/create", json={"pull_request_id": "pr-0", "pull_request_name": "PR", "author_id": "u0"})
+    db.execute(update(database.User).where(database.User.user_id.in_(["u1", "u2", "u3"])).values(is_active=False))
+    db.commit()
+    assert all(reviewer_selection.index._teams["backend"].is_active(u) for u in ("u1", "u2", "u3"))
+
+    pr = client.post("/pullRequest/create", json={"pull_request_id": "pr-1", "pull_request_name": "PR", "author_id": "u0"})
+    assert pr.json()["pr"]["assigned_reviewers"] == ["u4"]
+    batch = client.post("/pullRequest/createBatch", json={"pull_requests": [
+        {"pull_request_id": f"pr-b{i}", "pull_request_name": "PR", "author_id": "u0"} for i in range(3)
+    ]})
+    assert [item["pr"]["assigned_reviewers"] for item in batch.json()["results"]] == [["u4"]] * 3
+
+    # Единственный активный кандидат уже назначен: замены нет
+    reassign = client.post("/pullRequest/reassign", json={"pull_request_id": "pr-1", "old_user_id": "u4"})
+    assert reassign.status_code == 409
+    assert reassign.json()["error"]["code"] == "NO_CANDIDATE"
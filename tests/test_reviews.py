@@ -0,0 +1,108 @@
+import base64
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+from src import crud, database
+
+
+def seed(client: TestClient, prs: int):
+    # В команде из трех человек оба не-автора получают каждый PR
+    client.post("/team/add", json={"team_name": "backend", "members": [
+        {"user_id": f"u{i}", "username": f"User {i}", "is_active": True} for i in range(3)
+    ]})
+    for i in range(prs):
+        client.post("/pullRequest/create", json={"pull_request_id": f"pr-{i}", "pull_request_name": "PR", "author_id": "u0"})
+
+
+def pages(client: TestClient, user_id: str, limit: int | None, cursor: str | None = None, **params):
+    result = []
+    while True:
+        response = client.get("/users/getReview", params={
+            "user_id": user_id, **({"limit": limit} if limit else {}), **params, **({"cursor": cursor} if cursor else {}),
+        })
+        assert response.status_code == 200
+        body = response.json()
+        result.append([pr["pull_request_id"] for pr in body["pull_requests"]])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return result
+
+
+def test_review_pages_split_prs_created_at_the_same_time(client: TestClient, db):
+    seed(client, 7)
+    # Все PR созданы в одну и ту же секунду: порядок задает pull_request_id
+    created = datetime(2025, 1, 1, 12, 0, 0)
+    db.execute(update(database.PullRequest).values(created_at=created))
+    db.execute(update(database.PullRequestReviewer).values(pr_created_at=created))
+    db.commit()
+
+    result = pages(client, "u1", limit=2)
+
+    assert result == [["pr-6", "pr-5"], ["pr-4", "pr-3"], ["pr-2", "pr-1"], ["pr-0"]]
+    assert pages(client, "u1", limit=7) == [["pr-6", "pr-5", "pr-4", "pr-3", "pr-2", "pr-1", "pr-0"]]
+
+
+def test_merge_between_pages_neither_repeats_nor_skips(client: TestClient):
+    seed(client, 6)
+    first = client.get("/users/getReview", params={"user_id": "u1", "limit": 3}).json()
+    assert [pr["pull_request_id"] for pr in first["pull_requests"]] == ["pr-5", "pr-4", "pr-3"]
+
+    # Сливаются PR и с уже полученной страницы, и со следующей
+    client.post("/pullRequest/mergeBatch", json={"pull_request_ids": ["pr-4", "pr-1"]})
+
+    second = client.get("/users/getReview", params={"user_id": "u1", "limit": 3, "cursor": first["next_cursor"]}).json()
+    assert [(pr["pull_request_id"], pr["status"]) for pr in second["pull_requests"]] == [
+        ("pr-2", "OPEN"), ("pr-1", "MERGED"), ("pr-0", "OPEN"),
+    ]
+    assert second["next_cursor"] is None
+
+    # С фильтром по статусу слитый PR пропадает со следующей страницы
+    first_open = client.get("/users/getReview", params={"user_id": "u1", "limit": 2, "status": "OPEN"}).json()
+    client.post("/pullRequest/merge", json={"pull_request_id": "pr-2"})
+    rest = pages(client, "u1", limit=2, status="OPEN", cursor=first_open["next_cursor"])
+    assert [pr["pull_request_id"] for pr in first_open["pull_requests"]] == ["pr-5", "pr-3"]
+    assert rest == [["pr-0"]]
+
+
+def test_invalid_review_cursor(client: TestClient):
+    seed(client, 1)
+    for cursor in (
+        "not a cursor",
+        base64.urlsafe_b64encode(b"[1]").decode(),
+        base64.urlsafe_b64encode(b'["yesterday", "pr-0"]').decode(),
+    ):
+        response = client.get("/users/getReview", params={"user_id": "u1", "cursor": cursor})
+        assert response.status_code == 400, cursor
+        assert response.json()["error"]["code"] == "INVALID_CURSOR"
+
+
+def test_reviews_are_matched_by_exact_user_id(client: TestClient):
+    # u1 — префикс u10 и u11: ревью одного не попадают в список другого
+    client.post("/team/add", json={"team_name": "backend", "members": [
+        {"user_id": user_id, "username": user_id, "is_active": True} for user_id in ("u0", "u10", "u11")
+    ]})
+    client.post("/team/add", json={"team_name": "frontend", "members": [
+        {"user_id": user_id, "username": user_id, "is_active": True} for user_id in ("f0", "u1", "f2")
+    ]})
+    client.post("/pullRequest/create", json={"pull_request_id": "pr-b", "pull_request_name": "PR", "author_id": "u0"})
+    client.post("/pullRequest/create", json={"pull_request_id": "pr-f", "pull_request_name": "PR", "author_id": "f0"})
+
+    assert pages(client, "u1", limit=10) == [["pr-f"]]
+    assert pages(client, "u10", limit=10) == [["pr-b"]]
+    assert pages(client, "u11", limit=10, status="OPEN") == [["pr-b"]]
+
+
+def test_without_limit_and_cursor_all_reviews_are_returned(client: TestClient, monkeypatch):
+    seed(client, 5)
+    monkeypatch.setattr(crud, "REVIEW_PAGE_SIZE", 2)
+
+    # Прежний контракт: без параметров пагинации — весь список
+    body = client.get("/users/getReview", params={"user_id": "u1"}).json()
+    assert [pr["pull_request_id"] for pr in body["pull_requests"]] == ["pr-4", "pr-3", "pr-2", "pr-1", "pr-0"]
+    assert body["next_cursor"] is None
+
+    # Курсор без limit листает страницами по умолчанию
+    first = client.get("/users/getReview", params={"user_id": "u1", "limit": 1}).json()
+    assert pages(client, "u1", limit=None, cursor=first["next_cursor"]) == [["pr-3", "pr-2"], ["pr-1", "pr-0"]]
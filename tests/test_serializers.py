@@ -0,0 +1,70 @@
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+
+from src import schemas, serializers
+from src.memory_store import PullRequestRecord
+
+
+def schema_bytes(model, body: bytes) -> bytes:
+    # Так ответ сериализовал FastAPI по response_model до перехода на serializers
+    adapter = TypeAdapter(model)
+    return adapter.dump_json(adapter.validate_json(body), by_alias=True)
+
+
+def test_responses_match_schema_serialization(client: TestClient):
+    members = [{"user_id": f"u{i}", "username": f"Пользователь «{i}»", "is_active": i != 5} for i in range(6)]
+    calls = [
+        (schemas.TeamResponse, "POST", "/team/add", {"json": {"team_name": "backend", "members": members}}),
+        (schemas.TeamResponse, "POST", "/team/addMembers", {"json": {"team_name": "backend", "members": [
+            {"user_id": "u6", "username": "U6", "is_active": True},
+        ]}}),
+        (schemas.TeamSyncResponse, "POST", "/team/sync", {"json": {"teams": [{"team_name": "frontend", "members": []}]}}),
+        (schemas.Team, "GET", "/team/get", {"params": {"team_name": "backend"}}),
+        (schemas.UserResponse, "POST", "/users/setIsActive", {"json": {"user_id": "u6", "is_active": False}}),
+        (schemas.PullRequestResponse, "POST", "/pullRequest/create", {"json": {
+            "pull_request_id": "pr-0", "pull_request_name": "Fix \"quotes\"  ", "author_id": "u0",
+        }}),
+        (schemas.PullRequestBatchResponse, "POST", "/pullRequest/createBatch", {"json": {"pull_requests": [
+            {"pull_request_id": "pr-1", "pull_request_name": "PR 1", "author_id": "u1"},
+            {"pull_request_id": "pr-2", "pull_request_name": "PR 2", "author_id": "nobody"},
+        ]}}),
+        (schemas.PullRequestResponse, "POST", "/pullRequest/merge", {"json": {"pull_request_id": "pr-0"}}),
+        (schemas.PullRequestBatchResponse, "POST", "/pullRequest/mergeBatch", {"json": {"pull_request_ids": ["pr-1", "pr-9"]}}),
+        (schemas.UserReviewResponse, "GET", "/users/getReview", {"params": {"user_id": "u2", "limit": 1}}),
+        (schemas.AssignmentStatsResponse, "GET", "/stats/assignments", {"params": {"date_from": "2000-01-01"}}),
+        (schemas.TeamStatsResponse, "GET", "/stats/teams", {}),
+        (schemas.PullRequestHistoryResponse, "GET", "/pullRequest/history", {"params": {"pull_request_id": "pr-0"}}),
+        (schemas.TimeToMergeResponse, "GET", "/stats/timeToMerge", {}),
+        (schemas.ReassignmentRateResponse, "GET", "/stats/reassignmentRate", {"params": {"team_name": "backend"}}),
+        (schemas.DeactivationResponse, "POST", "/team/deactivateMembers", {"json": {"team_name": "backend", "user_ids": ["u3"]}}),
+    ]
+    for model, method, path, kwargs in calls:
+        response = client.request(method, path, **kwargs)
+        assert response.status_code < 300, (path, response.text)
+        assert response.headers["content-type"] == "application/json"
+        assert response.content == schema_bytes(model, response.content), path
+
+    job = client.post("/team/deactivateMembersAsync", json={"team_name": "backend", "user_ids": ["u4"]})
+    assert job.content == schema_bytes(schemas.JobResponse, job.content)
+    job_id = job.json()["job"]["job_id"]
+    assert client.get(f"/jobs/{job_id}").content == job.content
+
+
+def test_pull_request_matches_schema_for_memory_records():
+    record = PullRequestRecord(
+        pull_request_id="pr-1", pull_request_name="PR", author_id="u0", status="MERGED", reviewers=("u1", "u2"),
+        created_at=datetime(2024, 1, 2, 3, 4, 5, 600), merged_at=datetime(2024, 1, 3, tzinfo=timezone.utc),
+    )
+    expected = TypeAdapter(schemas.PullRequest).dump_json(schemas.PullRequest(
+        pull_request_id=record.pull_request_id,
+        pull_request_name=record.pull_request_name,
+        author_id=record.author_id,
+        status=record.status,
+        assigned_reviewers=record.reviewer_ids,
+        createdAt=record.created_at,
+        mergedAt=record.merged_at,
+    ), by_alias=True)
+
+    assert serializers.ORJSONResponse(serializers.pull_request(record)).body == expected
@@ -0,0 +1,97 @@
+from fastapi.testclient import TestClient
+
+from src import cache
+
+
+def members(team) -> dict[str, bool]:
+    return {m["user_id"]: m["is_active"] for m in team["members"]}
+
+
+def test_sync_creates_teams_and_moves_members(client: TestClient):
+    client.post("/team/add", json={"team_name": "backend", "members": [
+        {"user_id": f"u{i}", "username": f"User {i}", "is_active": True} for i in range(3)
+    ]})
+
+    response = client.post("/team/sync", json={"teams": [
+        {"team_name": "platform", "members": [
+            {"user_id": "u1", "username": "User 1", "is_active": True},
+            {"user_id": "p0", "username": "Platform 0", "is_active": True},
+        ]},
+        {"team_name": "backend", "members": [{"user_id": "u0", "username": "Renamed", "is_active": True}]},
+    ]})
+
+    assert response.status_code == 200
+    platform, backend = response.json()["teams"]
+    # Участники, которых нет в запросе, остаются; u1 переходит в новую команду
+    assert members(backend) == {"u0": True, "u2": True}
+    assert members(platform) == {"u1": True, "p0": True}
+    assert members(client.get("/team/get", params={"team_name": "backend"}).json()) == {"u0": True, "u2": True}
+    assert members(client.get("/team/get", params={"team_name": "platform"}).json()) == {"u1": True, "p0": True}
+    assert {"user_id": "u0", "username": "Renamed", "is_active": True} in backend["members"]
+
+
+def test_user_listed_in_several_teams_ends_in_the_last(client: TestClient):
+    response = client.post("/team/sync", json={"teams": [
+        {"team_name": "a", "members": [{"user_id": "x", "username": "X", "is_active": True}]},
+        {"team_name": "b", "members": [{"user_id": "x", "username": "X", "is_active": False}]},
+    ]})
+
+    # Ответ по команде — ее состав после ее шага синхронизации
+    assert [members(team) for team in response.json()["teams"]] == [{"x": True}, {"x": False}]
+    assert members(client.get("/team/get", params={"team_name": "a"}).json()) == {}
+    assert members(client.get("/team/get", params={"team_name": "b"}).json()) == {"x": False}
+
+
+def test_sync_deactivation_stops_new_assignments(client: TestClient):
+    client.post("/team/add", json={"team_name": "backend", "members": [
+        {"user_id": f"u{i}", "username": f"User {i}", "is_active": True} for i in range(4)
+    ]})
+    # Индекс выбора ревьюеров прогрет первым PR
+    client.post("/pullRequest/create", json={"pull_request_id": "pr-0", "pull_request_name": "PR", "author_id": "u0"})
+
+    client.post("/team/sync", json={"teams": [{"team_name": "backend", "members": [
+        {"user_id": "u1", "username": "User 1", "is_active": False},
+        {"user_id": "u2", "username": "User 2", "is_active": False},
+    ]}]})
+
+    for i in range(1, 4):
+        pr = client.post("/pullRequest/create", json={
+            "pull_request_id": f"pr-{i}", "pull_request_name": "PR", "author_id": "u0",
+        }).json()["pr"]
+        assert pr["assigned_reviewers"] == ["u3"]
+    assert members(client.get("/team/get", params={"team_name": "backend"}).json()) == {
+        "u0": True, "u1": False, "u2": False, "u3": True,
+    }
+
+
+def test_sync_invalidates_cached_teams_and_users(client: TestClient):
+    client.post("/team/add", json={"team_name": "backend", "members": [
+        {"user_id": f"u{i}", "username": f"User {i}", "is_active": True} for i in range(3)
+    ]})
+    client.post("/team/add", json={"team_name": "frontend", "members": [
+        {"user_id": "f0", "username": "F 0", "is_active": True},
+    ]})
+    client.post("/pullRequest/create", json={"pull_request_id": "pr-0", "pull_request_name": "PR", "author_id": "u0"})
+    # Кэш прогрет: обе команды и пользователь u1 (проверка существования в getReview)
+    client.get("/team/get", params={"team_name": "backend"})
+    client.get("/team/get", params={"team_name": "frontend"})
+    assert client.get("/users/getReview", params={"user_id": "u1"}).status_code == 200
+    assert client.get("/users/getReview", params={"user_id": "n0"}).status_code == 404
+    assert cache.teams.get("backend") is not None and cache.users.get("u1") is not None
+
+    client.post("/team/sync", json={"teams": [{"team_name": "frontend", "members": [
+        {"user_id": "u1", "username": "User 1", "is_active": False},
+        {"user_id": "n0", "username": "New", "is_active": True},
+    ]}]})
+
+    # Сброшены и прежняя, и новая команда перешедшего участника
+    assert cache.teams.get("backend") is None and cache.teams.get("frontend") is None
+    assert cache.users.get("u1") is None
+    assert members(client.get("/team/get", params={"team_name": "backend"}).json()) == {"u0": True, "u2": True}
+    assert members(client.get("/team/get", params={"team_name": "frontend"}).json()) == {
+        "f0": True, "u1": False, "n0": True,
+    }
+    # Ревью u1 сохраняются; новый пользователь сразу виден getReview
+    reviews = client.get("/users/getReview", params={"user_id": "u1"}).json()["pull_requests"]
+    assert [pr["pull_request_id"] for pr in reviews] == ["pr-0"]
+    assert client.get("/users/getReview", params={"user_id": "n0"}).json()["pull_requests"] == []
@@ -0,0 +1,89 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql
+
+from src import crud, database, transfer
+from src.memory_store import MemoryStore
+
+
+def seed(client: TestClient):
+    members = [{"user_id": f"u{i}", "username": f"User {i}", "is_active": i != 4} for i in range(5)]
+    client.post("/team/add", json={"team_name": "backend", "members": members})
+    for i in range(6):
+        pr = {"pull_request_id": f"pr-{i}", "pull_request_name": f"PR {i}", "author_id": "u0"}
+        client.post("/pullRequest/create", json=pr)
+    client.post("/pullRequest/mergeBatch", json={"pull_request_ids": ["pr-0", "pr-1"]})
+
+
+def test_export_import_roundtrip(client: TestClient, db):
+    seed(client)
+    exported = client.get("/export")
+    assert exported.headers["content-type"] == "application/x-ndjson"
+    lines = exported.content.splitlines()
+    assert [json.loads(line)["table"] for line in lines].count("pull_requests") == 6
+
+    for table in reversed(database.Base.metadata.sorted_tables):
+        db.execute(table.delete())
+    db.commit()
+    # Тело отправляется потоком небольшими кусками, строки режутся на границах
+    chunks = (exported.content[i:i + 100] for i in range(0, len(exported.content), 100))
+    response = client.post("/import", content=chunks)
+    assert response.status_code == 200
+    assert response.json()["imported"]["pr_reviewers"] == 12
+    assert sorted(client.get("/export").content.splitlines()) == sorted(lines)
+
+    # Повторный импорт пропускает существующие записи
+    assert client.post("/import", content=exported.content).status_code == 200
+    assert len(client.get("/export").content.splitlines()) == len(lines)
+
+
+def test_import_into_memory_store(client: TestClient):
+    seed(client)
+    exported = client.get("/export").content
+
+    async def body():
+        yield exported
+
+    store = MemoryStore(data_dir="", snapshot_interval=0)
+    asyncio.run(transfer.import_ndjson(store, body()))
+    assert store.get_pr_by_id("pr-0").status == "MERGED"
+    assert len(store.get_pr_by_id("pr-5").reviewers) == 2
+    assert store.get_user_by_id("u4").is_active is False
+    assert [row.prs_merged for row in store.get_assignment_stats("backend") if row.user_id == "u0"] == [2]
+
+
+def test_import_rejects_malformed_lines(client: TestClient):
+    response = client.post("/import", content=b'{"table": "teams", "team_name": "a"}\nnot json\n')
+    assert response.status_code == 400
+    assert response.json()["error"] == {"code": "INVALID_IMPORT", "message": "line 2: invalid JSON"}
+
+
+def test_import_keeps_event_ids_unique(client: TestClient, db):
+    seed(client)
+    exported = client.get("/export").content
+    for table in reversed(database.Base.metadata.sorted_tables):
+        db.execute(table.delete())
+    db.commit()
+    assert client.post("/import", content=exported).status_code == 200
+    imported = db.scalar(select(func.max(database.PrEvent.event_id)))
+
+    # Новые события получают ключи после импортированных
+    pr = {"pull_request_id": "pr-new", "pull_request_name": "New", "author_id": "u0"}
+    assert client.post("/pullRequest/create", json=pr).status_code == 201
+    assert client.post("/pullRequest/merge", json={"pull_request_id": "pr-new"}).status_code == 200
+    new_ids = db.scalars(
+        select(database.PrEvent.event_id).where(database.PrEvent.pull_request_id == "pr-new")
+    ).all()
+    assert new_ids and min(new_ids) > imported
+
+
+def test_import_advances_postgres_sequences():
+    statements = crud._sequence_resets(database.PrEvent.__table__)
+    compiled = [str(statement.compile(dialect=postgresql.dialect())) for statement in statements]
+    assert len(compiled) == 1
+    assert "setval(pg_get_serial_sequence(" in compiled[0]
+    assert "max(pr_events.event_id)" in compiled[0]
+    assert crud._sequence_resets(database.User.__table__) == []